@@ -0,0 +1,216 @@
+"""Virtual waiting room for high-demand on-sales.
+
+Events with an ``admission_rate`` (buyers per minute) put buyers in a queue.
+Joining hands out a sequence number inside a signed queue token; buyer ``n``
+is admitted once ``burst + minutes_since_open * rate`` exceeds ``n``, so
+admission needs no background worker, only the queue's open time and rate.
+Admitted buyers get a short-lived signed pass that the booking views check
+via ``require_admission``.
+
+Queue state lives in a backend chosen by ``settings.ADMISSION_QUEUE``: the
+in-memory one (single process, tests) or the Redis one (shared by workers).
+"""
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from .invalidation import on_change
+from .models import Event
+from .recurrence import split_occurrence_id
+
+QUEUE_SALT = "backend.admission.queue"
+PASS_SALT = "backend.admission.pass"
+PASS_HEADER = "HTTP_X_ADMISSION_PASS"
+CONFIG_CACHE_SECONDS = 30
+
+
+class InMemoryQueueBackend:
+    """Queue state in process memory; for single-worker setups and tests"""
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def open(self, event_id, rate, now):
+        with self._lock:
+            queue = self._queues.setdefault(
+                event_id, {"opened_at": now, "rate": rate, "seq": 0, "users": {}}
+            )
+            return queue["opened_at"], queue["rate"]
+
+    def state(self, event_id):
+        queue = self._queues.get(event_id)
+        if queue is None:
+            return None
+        return queue["opened_at"], queue["rate"]
+
+    def join(self, event_id, user_key):
+        with self._lock:
+            queue = self._queues[event_id]
+            if user_key not in queue["users"]:
+                queue["users"][user_key] = queue["seq"]
+                queue["seq"] += 1
+            return queue["users"][user_key]
+
+    def close(self, event_id):
+        with self._lock:
+            self._queues.pop(event_id, None)
+
+
+class RedisQueueBackend:
+    """Queue state in Redis so every worker sees the same line"""
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="admission", client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, event_id, part):
+        return f"{self.prefix}:{event_id}:{part}"
+
+    def open(self, event_id, rate, now):
+        key = self._key(event_id, "state")
+        self.client.hsetnx(key, "opened_at", now)
+        self.client.hsetnx(key, "rate", rate)
+        return self.state(event_id)
+
+    def state(self, event_id):
+        opened_at, rate = self.client.hmget(self._key(event_id, "state"), "opened_at", "rate")
+        if opened_at is None:
+            return None
+        return float(opened_at), int(rate)
+
+    def join(self, event_id, user_key):
+        users = self._key(event_id, "users")
+        seq = self.client.hget(users, user_key)
+        if seq is None:
+            candidate = self.client.incr(self._key(event_id, "seq")) - 1
+            # Another worker may have enqueued the same user meanwhile; first write wins
+            self.client.hsetnx(users, user_key, candidate)
+            seq = self.client.hget(users, user_key)
+        return int(seq)
+
+    def close(self, event_id):
+        self.client.delete(*(self._key(event_id, p) for p in ("state", "seq", "users")))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                conf = getattr(settings, "ADMISSION_QUEUE", {})
+                backend_cls = import_string(conf.get("BACKEND", "backend.admission.InMemoryQueueBackend"))
+                _backend = backend_cls(**conf.get("OPTIONS", {}))
+    return _backend
+
+
+def rate_key(event_id):
+    return f"admission:rate:{event_id}"
+
+
+@on_change("events")
+def event_written(message):
+    cache.delete(rate_key(message["id"]))
+
+
+def admission_rate(event_id):
+    """Configured buyers-per-minute rate of an event (0 when it has no queue)"""
+    key = rate_key(event_id)
+    rate = cache.get(key)
+    if rate is None:
+        # Occurrences of a series queue at the series' rate
+        occurrence = split_occurrence_id(event_id)
+        event = Event.objects(id=occurrence[0] if occurrence else event_id).only("admission_rate").first()
+        rate = (event.admission_rate or 0) if event else 0
+        cache.set(key, rate, CONFIG_CACHE_SECONDS)
+    return rate
+
+
+def admitted_count(opened_at, rate, now):
+    burst = getattr(settings, "ADMISSION_QUEUE", {}).get("BURST", 50)
+    return burst + int(max(0.0, now - opened_at) * rate / 60.0)
+
+
+def queue_status(event_id, seq, user_key, now=None):
+    """Position and, once admitted, a booking pass for a queued buyer"""
+    now = time.time() if now is None else now
+    backend = get_backend()
+    state = backend.state(event_id)
+    if state is None:
+        state = backend.open(event_id, admission_rate(event_id), now)
+    opened_at, rate = state
+    admitted = admitted_count(opened_at, rate, now)
+    if not rate or seq < admitted:
+        return {
+            "admitted": True,
+            "position": 0,
+            "pass": signing.dumps({"e": event_id, "u": user_key}, salt=PASS_SALT),
+        }
+    ahead = seq - admitted + 1
+    return {
+        "admitted": False,
+        "position": ahead,
+        "estimated_wait": int(ahead * 60 / rate) + 1,
+    }
+
+
+def issue_queue_token(event_id, seq, user_key):
+    return signing.dumps({"e": event_id, "s": seq, "u": user_key}, salt=QUEUE_SALT)
+
+
+def read_queue_token(token, event_id, user_key):
+    """Sequence number stored in a queue token, or None if it is not valid here"""
+    try:
+        data = signing.loads(token, salt=QUEUE_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get("e") != event_id or data.get("u") != user_key:
+        return None
+    return data["s"]
+
+
+def has_valid_pass(request, event_id, user_key):
+    token = request.META.get(PASS_HEADER)
+    if not token:
+        return False
+    max_age = getattr(settings, "ADMISSION_QUEUE", {}).get("PASS_TTL", 600)
+    try:
+        data = signing.loads(token, salt=PASS_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return data.get("e") == event_id and data.get("u") == user_key
+
+
+def require_admission(view):
+    """Reject buyers without an admission pass while an event's queue is active.
+
+    The event id is taken from the ``event_id`` URL argument or request body.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        event_id = kwargs.get("event_id") or (args[0] if args else request.data.get("event_id"))
+        if event_id:
+            rate = admission_rate(event_id)
+            if rate and not has_valid_pass(request, event_id, str(request.user.id)):
+                get_backend().open(event_id, rate, time.time())
+                return Response({
+                    "error": "This event has a waiting room, join the queue first",
+                    "queue": f"/api/events/{event_id}/queue/",
+                }, status=403)
+        return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,47 @@
+"""Best-available seat allocation over a seat index occupancy bitmap."""
+
+TAKEN = b"\x01"
+
+
+def best_run_in_row(bits, start, length, quantity):
+    """Start ordinal of the free window of ``quantity`` seats closest to the
+    row centre, or None. ``bits`` is an occupancy bitmap (0 = free).
+    """
+    end = start + length
+    needle = bytes(quantity)
+    ideal = start + (length - quantity) / 2
+
+    best = None
+    best_distance = None
+    pos = bits.find(needle, start, end)
+    while pos != -1:
+        run_end = bits.find(TAKEN, pos, end)
+        if run_end == -1:
+            run_end = end
+        # Any window starting in [pos, run_end - quantity] is free; take the most central one
+        window = min(max(round(ideal), pos), run_end - quantity)
+        distance = abs(window - ideal)
+        if best is None or distance < best_distance:
+            best, best_distance = window, distance
+        pos = bits.find(needle, run_end, end)
+    return best
+
+
+def find_best_seats(index, bits, quantity, section=None):
+    """Ordinals of the best ``quantity`` adjacent free seats, or None.
+
+    Rows are visited in ``index.rank`` order (section score, then front to
+    back) and the first row with a large enough free run wins.
+    """
+    if quantity < 1:
+        return None
+    for row in index.rank:
+        if section is not None and index.section_names[index.row_sections[row]] != section:
+            continue
+        length = index.row_lengths[row]
+        if length < quantity:
+            continue
+        start = best_run_in_row(bits, index.row_offsets[row], length, quantity)
+        if start is not None:
+            return list(range(start, start + quantity))
+    return None
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class BackendConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend'
+
+    def ready(self):
+        from .startup import configure_indexes, connect
+
+        # Registers the connection only; see backend/startup.py
+        connect()
+        configure_indexes()
+        # Connects the signal receivers, change handlers and job handlers
+        from . import admission, feed, recommendations, tasks, versions  # noqa: F401
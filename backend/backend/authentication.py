@@ -1,12 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from mongoengine import DoesNotExist
 from backend.models import User
+from backend.invalidation import subscribe
+
+
+class UserCache:
+    """Process-local LRU of users by id; entries are dropped on user changes"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id, ttl):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, stored_at = entry
+            if time.monotonic() - stored_at > ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_cache = UserCache()
+subscribe("users", lambda message: user_cache.forget(message["id"]))
+
 
 class MongoJWTAuthentication(JWTAuthentication):
     def get_user(self, validated_token):
-        user_id = validated_token.get("user_id")
+        user_id = str(validated_token.get("user_id"))
+        ttl = getattr(settings, "INVALIDATION", {}).get("USER_CACHE_SECONDS", 0)
+        if ttl:
+            user = user_cache.get(user_id, ttl)
+            if user is not None:
+                return user
 
         try:
-            return User.objects.get(id=user_id)
+            user = User.objects.get(id=user_id)
         except DoesNotExist:
             return None
+        if ttl:
+            user_cache.set(user_id, user)
+        return user
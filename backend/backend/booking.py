@@ -0,0 +1,128 @@
+"""Booking writes that must succeed or fail together."""
+from datetime import datetime
+
+from bson import ObjectId
+
+from .hall import seat_index_for
+from .inventory import claim_seats, release_seats
+from .jobs import enqueue
+from .models import Booking, Event, EventBooking
+from .signals import seats_claimed, seats_released
+from .transactions import run_in_transaction
+
+
+class SeatsUnavailable(Exception):
+    pass
+
+
+class NotCancellable(Exception):
+    pass
+
+
+def event_booking(doc, ordinals):
+    """The ``event_bookings`` document of a booking document"""
+    return {
+        "_id": doc["_id"],
+        "event_id": doc["event_id"],
+        "user_email": doc["user_email"],
+        "num_tickets": doc.get("num_tickets", 1),
+        "total_price": doc.get("total_price"),
+        "ordinals": list(ordinals),
+        "booking_status": doc.get("booking_status", "Confirmed"),
+        "created_at": doc.get("created_at") or datetime.utcnow(),
+    }
+
+
+def place_booking(event, booking, ordinals):
+    """Claim seats, insert the booking and bump ``attendees_count`` atomically.
+
+    Returns False (and writes nothing) if any seat is already taken.
+    """
+    booking.validate()
+    doc = booking.to_mongo()
+    # Assigned up front: the event_bookings copy shares it
+    doc.setdefault("_id", ObjectId())
+    event_id = str(event.id)
+
+    def write(session):
+        if not claim_seats(event_id, ordinals, session=session):
+            raise SeatsUnavailable()
+        Booking._get_collection().insert_one(doc, session=session)
+        EventBooking._get_collection().insert_one(event_booking(doc, ordinals), session=session)
+        Event._get_collection().update_one(
+            {"_id": event.pk},
+            {"$inc": {"attendees_count": booking.num_tickets}, "$set": {"updated_at": datetime.utcnow()}},
+            session=session,
+        )
+        # Emails and related-list refreshes run in the background, for committed bookings only
+        enqueue("booking_confirmed", {
+            "booking_id": str(doc["_id"]), "event_id": event_id, "user_email": booking.user_email,
+        }, session=session)
+
+    try:
+        run_in_transaction(write)
+    except SeatsUnavailable:
+        return False
+
+    booking.id = doc["_id"]
+    seats_claimed.send_robust(
+        sender=Booking, event_id=event_id, booking_id=str(booking.id),
+        user_email=booking.user_email, ordinals=ordinals,
+    )
+    return True
+
+
+def cancel_and_release(booking, event):
+    """Cancel a Confirmed booking, free its seats and decrement ``attendees_count``.
+
+    The status flip is conditional on the booking still being Confirmed, so
+    concurrent cancellations release the seats only once. Returns False if
+    the booking was not Confirmed.
+    """
+    index = seat_index_for(event)
+    ordinals = [
+        o for o in (index.ordinal(s.row, s.column) for s in booking.seats) if o is not None
+    ]
+    event_id = str(event.id)
+    refund = booking.total_price or 0
+    now = datetime.utcnow()
+
+    def write(session):
+        result = Booking._get_collection().update_one(
+            {"_id": booking.pk, "user_email": booking.user_email, "booking_status": "Confirmed"},
+            {"$set": {
+                "booking_status": "Cancelled",
+                "cancelled_at": now,
+                "refund_amount": refund,
+                "refund_status": "Pending" if refund else "Not required",
+                "updated_at": now,
+            }},
+            session=session,
+        )
+        if result.modified_count != 1:
+            raise NotCancellable()
+        release_seats(event_id, ordinals, session=session)
+        EventBooking._get_collection().update_one(
+            {"_id": booking.pk, "event_id": event_id},
+            {"$set": {"booking_status": "Cancelled", "cancelled_at": now}},
+            session=session,
+        )
+        Event._get_collection().update_one(
+            {"_id": event.pk},
+            {"$inc": {"attendees_count": -booking.num_tickets}, "$set": {"updated_at": now}},
+            session=session,
+        )
+        enqueue("booking_cancelled", {
+            "booking_id": str(booking.id), "event_id": event_id, "user_email": booking.user_email,
+        }, session=session)
+
+    try:
+        run_in_transaction(write)
+    except NotCancellable:
+        return False
+
+    seats_released.send_robust(
+        sender=Booking, event_id=event_id, booking_id=str(booking.id),
+        user_email=booking.user_email, ordinals=ordinals,
+    )
+    return True
@@ -0,0 +1,173 @@
+"""Door check-in against an in-memory bitmap per event.
+
+Tickets are verified offline (backend/tickets.py) and admitted against a
+``CheckInBoard``: one byte per seat ordinal plus the ids of cancelled
+bookings, so a scan never waits on the database. Admissions are queued and
+written to ``check_ins`` by ``sync()``, which also pulls in the admissions
+of other workers and bookings cancelled since the previous sync. A daemon
+thread syncs every board each ``TICKETS["SYNC_SECONDS"]`` and drops boards
+idle for ``IDLE_SECONDS``.
+
+Between two syncs, two workers could each admit the same seat once. Route
+an event's scanners to one worker where that matters; the unique index on
+``(event_id, ordinal)`` keeps a single record and the repeat is logged.
+A board is loaded on the first scan (or ``GET`` of the check-in endpoint,
+which door staff can use to warm it up before doors open).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .hall import seat_index_for
+from .models import CheckIn, Event, EventBooking
+from .tickets import conf
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+# Other workers' clocks and in-flight writes: re-read this far back on every sync
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+class CheckInBoard:
+    def __init__(self, event_id, index, organizer):
+        self.event_id = event_id
+        self.index = index
+        self.organizer = organizer
+        self.bits = bytearray(index.size)
+        self.revoked = set()
+        self.pending = []
+        self.synced_at = None
+        self.used_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def admit(self, booking_id, ordinal, by=None, at=None):
+        """"ok", or why not: "invalid" (no such seat), "revoked" or "duplicate" """
+        self.used_at = time.monotonic()
+        if not 0 <= ordinal < self.index.size or self.index.base[ordinal]:
+            return "invalid"
+        with self.lock:
+            if booking_id in self.revoked:
+                return "revoked"
+            if self.bits[ordinal]:
+                return "duplicate"
+            self.bits[ordinal] = 1
+            self.pending.append({
+                "event_id": self.event_id,
+                "ordinal": ordinal,
+                "booking_id": booking_id,
+                "checked_in_by": by,
+                "checked_in_at": at or datetime.utcnow(),
+            })
+        return "ok"
+
+    def stats(self):
+        return {
+            "event_id": self.event_id,
+            "capacity": self.index.capacity,
+            "checked_in": sum(self.bits),
+            "pending": len(self.pending),
+            "synced_at": self.synced_at,
+        }
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+        now = datetime.utcnow()
+        for doc in pending:
+            doc["recorded_at"] = now
+        try:
+            CheckIn._get_collection().insert_many(pending, ordered=False)
+        except BulkWriteError as exc:
+            retry = []
+            for error in exc.details.get("writeErrors", []):
+                doc = pending[error["index"]]
+                if error["code"] == DUPLICATE_KEY:
+                    logger.warning("Seat %s of event %s was admitted twice", doc["ordinal"], self.event_id)
+                else:
+                    retry.append(doc)
+            self._requeue(retry)
+        except PyMongoError:
+            logger.exception("Could not store check-ins of event %s; will retry", self.event_id)
+            self._requeue(pending)
+
+    def _requeue(self, docs):
+        if docs:
+            with self.lock:
+                self.pending[:0] = docs
+
+    def sync(self):
+        """Store queued admissions, then merge admissions and cancellations from Mongo"""
+        self.flush()
+        now = datetime.utcnow()
+        ordinals, booking_ids = changes_since(self.event_id, self.synced_at)
+        with self.lock:
+            for ordinal in ordinals:
+                if 0 <= ordinal < self.index.size:
+                    self.bits[ordinal] = 1
+            self.revoked |= booking_ids
+            self.synced_at = now
+
+
+def changes_since(event_id, since=None):
+    """Ordinals admitted and ids of bookings cancelled since ``since`` (everything if None)"""
+    window = {"$gte": since - SYNC_OVERLAP} if since else {"$exists": True}
+    admitted = CheckIn._get_collection().find(
+        {"event_id": event_id, "recorded_at": window}, {"ordinal": 1, "_id": 0}
+    )
+    cancelled = EventBooking._get_collection().find(
+        {"event_id": event_id, "booking_status": "Cancelled", "cancelled_at": window}, {"_id": 1}
+    )
+    return [doc["ordinal"] for doc in admitted], {str(doc["_id"]) for doc in cancelled}
+
+
+_boards = {}
+_boards_lock = threading.Lock()
+_syncer = None
+
+
+def get_board(event_id):
+    """The check-in board of an event, loaded on first use; raises Event.DoesNotExist"""
+    board = _boards.get(event_id)
+    if board is not None:
+        return board
+    # Loaded outside the lock so a slow event never holds up the others'
+    # scans; of two concurrent first loads the first stored wins, and the
+    # other, freshly synced with nothing pending, is dropped
+    event = Event.objects.only("hall_layout", "created_by").get(id=event_id)
+    loaded = CheckInBoard(event_id, seat_index_for(event), event.created_by)
+    loaded.sync()
+    with _boards_lock:
+        board = _boards.setdefault(event_id, loaded)
+        _start_syncer()
+    return board
+
+
+def sync_boards():
+    idle = conf()["IDLE_SECONDS"]
+    for event_id, board in list(_boards.items()):
+        try:
+            board.sync()
+        except PyMongoError:
+            logger.exception("Check-in sync of event %s failed", event_id)
+            continue
+        if not board.pending and time.monotonic() - board.used_at > idle:
+            _boards.pop(event_id, None)
+
+
+def _run_syncer():
+    while True:
+        time.sleep(conf()["SYNC_SECONDS"])
+        sync_boards()
+
+
+def _start_syncer():
+    global _syncer
+    if _syncer is None:
+        _syncer = threading.Thread(target=_run_syncer, name="checkin-sync", daemon=True)
+        _syncer.start()
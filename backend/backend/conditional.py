@@ -0,0 +1,55 @@
+"""Conditional GET (ETag / Last-Modified) and Cache-Control for read views.
+
+A view decorated with ``conditional(validators, cache_control)`` first asks
+``validators(request, *args, **kwargs)`` for a cheap version of what it would
+return: ``(version, last_modified)``. If the client already has that
+version (If-None-Match / If-Modified-Since) it gets a 304 and the view never
+runs, so nothing is fetched in full or serialized.
+"""
+import calendar
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(request, version):
+    # The same version renders differently per URL and negotiated format
+    raw = "|".join((request.get_full_path(), request.META.get("HTTP_ACCEPT", ""), str(version)))
+    return '"%s"' % hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def conditional(validators, cache_control):
+    """``cache_control`` is a dict for patch_cache_control or a callable taking the request"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            version, last_modified = validators(request, *args, **kwargs)
+            if version is None:
+                return view(request, *args, **kwargs)
+
+            etag = make_etag(request, version)
+            timestamp = None
+            if isinstance(last_modified, datetime):
+                timestamp = calendar.timegm(last_modified.utctimetuple())
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+            directives = cache_control(request) if callable(cache_control) else cache_control
+            patch_cache_control(response, **directives)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,48 @@
+"""Favorite events as single atomic updates.
+
+Adding is an ``$addToSet`` and removing a ``$pull``, each guarded by a
+filter on the current membership so ``modified_count`` says whether the list
+changed. The user document is never loaded and concurrent toggles (two tabs)
+cannot lose each other's changes. ``Event.favorites_count`` moves only when
+the user's list actually changed, in the same transaction.
+"""
+from datetime import datetime
+
+from bson import ObjectId
+
+from .models import Event, User
+from .transactions import run_in_transaction
+
+
+def _toggle(user_id, event_id, add):
+    now = datetime.utcnow()
+    if add:
+        match = {"_id": ObjectId(str(user_id)), "favorite_events": {"$ne": event_id}}
+        change = {"$addToSet": {"favorite_events": event_id}, "$set": {"updated_at": now}}
+    else:
+        match = {"_id": ObjectId(str(user_id)), "favorite_events": event_id}
+        change = {"$pull": {"favorite_events": event_id}, "$set": {"updated_at": now}}
+
+    def write(session):
+        result = User._get_collection().update_one(match, change, session=session)
+        if result.modified_count != 1:
+            return False
+        Event._get_collection().update_one(
+            {"_id": ObjectId(event_id)},
+            # updated_at moves so event ETags and Last-Modified see the new count
+            {"$inc": {"favorites_count": 1 if add else -1}, "$set": {"updated_at": now}},
+            session=session,
+        )
+        return True
+
+    return run_in_transaction(write)
+
+
+def add_favorite(user_id, event_id):
+    """True if the event was not a favorite yet"""
+    return _toggle(user_id, event_id, add=True)
+
+
+def remove_favorite(user_id, event_id):
+    """True if the event was a favorite"""
+    return _toggle(user_id, event_id, add=False)
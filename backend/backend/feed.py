@@ -0,0 +1,271 @@
+"""Personalized event feed.
+
+Upcoming published events are kept in process as a sparse feature matrix
+(one row per event: category, city and tag columns, stored as CSR arrays so
+memory grows with the features events actually have, not with events times
+the tag vocabulary) next to their listing dicts. A
+user's taste is a sparse weight vector over the same feature names, built
+from ``favorite_categories``, ``favorite_events``, their city and their
+Confirmed bookings, and cached per user. A feed request is one
+matrix-vector product plus popularity and soonness boosts, so it needs no
+Mongo query once both are warm.
+
+The matrix is rebuilt when an event is created, edited or deleted (a shared
+generation value in the Django cache, so every worker notices; direct Mongo
+writes reach it through backend/invalidation.py), when the day changes and
+at most every ``FEED_MAX_AGE`` seconds for attendance counts. Only the first
+feed request of a worker waits for a build: later rebuilds run on a
+background thread while requests keep using the previous matrix, which is
+swapped out when the new one is ready.
+"""
+import logging
+import math
+import threading
+import time
+import uuid
+from datetime import date
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+
+from .models import Booking, Event
+from .routing import tolerant
+from .invalidation import on_change
+from .signals import events_changed, seats_claimed, seats_released
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "feed:generation"
+PROFILE_KEY = "feed:profile:%s"
+PROFILE_SECONDS = 10 * 60
+MAX_AGE = 5 * 60
+
+# Taste weights by where a signal comes from
+FAVORITE_CATEGORY = 2.0
+FAVORITE_EVENT = 1.5
+BOOKED_EVENT = 1.0
+HOME_CITY = 1.0
+# Boosts added to every event's taste score
+POPULARITY_BOOST = 0.3
+SOONNESS_BOOST = 0.2
+SOONNESS_DAYS = 30.0
+
+
+def event_features(category, city, tags):
+    """Feature name -> value of one event; tags share a unit of weight"""
+    features = {}
+    if category:
+        features["category:" + category] = 1.0
+    if city:
+        features["city:" + city.lower()] = 1.0
+    tags = {t.lower() for t in tags or () if t}
+    for tag in tags:
+        features["tag:" + tag] = 1.0 / math.sqrt(len(tags))
+    return features
+
+
+class FeatureMatrix:
+    """Upcoming published events as a float32 CSR matrix"""
+
+    def __init__(self, events, generation=None, built_on=None):
+        # numpy is imported on first use, so workers that never serve a feed skip it
+        import numpy as np
+
+        self.generation = generation
+        self.built_on = built_on or date.today()
+        self.built_at = time.monotonic()
+        self.ids = []
+        self.cards = []
+        rows = []
+        popularity = []
+        days = []
+        for event in events:
+            self.ids.append(str(event.id))
+            self.cards.append(event.to_json_safe())
+            rows.append(event_features(event.category, event.city, event.tags))
+            capacity = event.capacity or 0
+            popularity.append(min((event.attendees_count or 0) / capacity, 1.0) if capacity else 0.0)
+            days.append(max((event.date - self.built_on).days, 0) if event.date else SOONNESS_DAYS)
+
+        self.columns = {}
+        indptr, indices, values = [0], [], []
+        for row in rows:
+            for name, value in row.items():
+                indices.append(self.columns.setdefault(name, len(self.columns)))
+                values.append(value)
+            indptr.append(len(indices))
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.values = np.asarray(values, dtype=np.float32)
+        # Row of each stored value, for the product
+        self.row_index = np.repeat(np.arange(len(rows), dtype=np.int32), np.diff(indptr))
+
+        self.row_of = {event_id: i for i, event_id in enumerate(self.ids)}
+        self.boost = (
+            POPULARITY_BOOST * np.asarray(popularity, dtype=np.float32)
+            + SOONNESS_BOOST * np.exp(-np.asarray(days, dtype=np.float32) / SOONNESS_DAYS)
+        )
+
+    def is_current(self, generation):
+        max_age = getattr(settings, "FEED_MAX_AGE", MAX_AGE)
+        return (
+            self.generation == generation
+            and self.built_on == date.today()
+            and time.monotonic() - self.built_at < max_age
+        )
+
+    def profile_vector(self, profile):
+        import numpy as np
+
+        vector = np.zeros(len(self.columns), dtype=np.float32)
+        for name, weight in profile.items():
+            column = self.columns.get(name)
+            if column is not None:
+                vector[column] = weight
+        return vector
+
+    def top(self, profile, limit, exclude=()):
+        """Row indices of the best ``limit`` events for a taste profile"""
+        import numpy as np
+
+        if not self.ids:
+            return []
+        weighted = self.values * self.profile_vector(profile)[self.indices]
+        scores = np.bincount(self.row_index, weights=weighted, minlength=len(self.ids)).astype(np.float32)
+        scores += self.boost
+        for event_id in exclude:
+            row = self.row_of.get(event_id)
+            if row is not None:
+                scores[row] = -np.inf
+        limit = min(limit, len(scores))
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [int(i) for i in best if np.isfinite(scores[i])]
+
+
+_matrix = None
+_lock = threading.Lock()
+_rebuilding = None
+
+
+def current_generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def build_matrix(generation):
+    events = tolerant(Event.objects(status="Published", date__gte=date.today())).exclude("hall_layout")
+    return FeatureMatrix(events, generation)
+
+
+def get_matrix():
+    """The current matrix; a stale one is served while it is rebuilt in the background"""
+    global _matrix
+    generation = current_generation()
+    matrix = _matrix
+    if matrix is not None:
+        if not matrix.is_current(generation):
+            rebuild_in_background(generation)
+        return matrix
+    with _lock:
+        if _matrix is None:
+            _matrix = build_matrix(generation)
+        return _matrix
+
+
+def rebuild_in_background(generation):
+    global _rebuilding
+    with _lock:
+        if _rebuilding is not None:
+            return
+        _rebuilding = threading.Thread(target=_rebuild, args=(generation,), name="feed-rebuild", daemon=True)
+        _rebuilding.start()
+
+
+def _rebuild(generation):
+    global _matrix, _rebuilding
+    try:
+        _matrix = build_matrix(generation)
+    except Exception:
+        logger.exception("Feed matrix rebuild failed")
+    finally:
+        _rebuilding = None
+
+
+def build_profile(user):
+    """(taste weights by feature name, ids of events already booked)"""
+    profile = {}
+
+    def add(features, weight):
+        for name, value in features.items():
+            profile[name] = profile.get(name, 0.0) + weight * value
+
+    for category in user.favorite_categories or ():
+        add({"category:" + category: 1.0}, FAVORITE_CATEGORY)
+    if user.city:
+        add({"city:" + user.city.lower(): 1.0}, HOME_CITY)
+
+    booked = Booking.objects(user_email=user.email, booking_status="Confirmed").distinct("event_id")
+    favorites = [e for e in user.favorite_events or () if ObjectId.is_valid(e)]
+    history = set(booked) | set(favorites)
+    if history:
+        weights = {}
+        for event_id in booked:
+            weights[event_id] = weights.get(event_id, 0.0) + BOOKED_EVENT
+        for event_id in favorites:
+            weights[event_id] = weights.get(event_id, 0.0) + FAVORITE_EVENT
+        # Spread so a long history does not drown out explicit favorites
+        scale = 1.0 / math.sqrt(len(history))
+        for event in Event.objects(id__in=list(history)).only("id", "category", "city", "tags"):
+            add(event_features(event.category, event.city, event.tags), weights[str(event.id)] * scale)
+
+    return profile, sorted(booked)
+
+
+def get_profile(user):
+    key = PROFILE_KEY % user.email
+    cached = cache.get(key)
+    if cached is None:
+        cached = build_profile(user)
+        cache.set(key, cached, PROFILE_SECONDS)
+    return cached
+
+
+def personalized_feed(user, limit):
+    """Listing dicts of the best upcoming events for ``user``, best first"""
+    profile, booked = get_profile(user)
+    matrix = get_matrix()
+    return [matrix.cards[i] for i in matrix.top(profile, limit, exclude=booked)]
+
+
+def forget_profile(email):
+    cache.delete(PROFILE_KEY % email)
+
+
+def new_generation(token=None):
+    # Any fresh value works: matrices only compare generations for equality
+    cache.set(GENERATION_KEY, token or uuid.uuid4().hex, None)
+
+
+@receiver(events_changed)
+def bump_generation(sender, **kwargs):
+    new_generation()
+
+
+@receiver(seats_claimed)
+@receiver(seats_released)
+def booking_changed(sender, user_email, **kwargs):
+    forget_profile(user_email)
+
+
+@on_change("events")
+def event_written(message):
+    new_generation(message["token"])
+
+
+@on_change("bookings")
+@on_change("users")
+def owner_written(message):
+    email = message["doc"].get("user_email") or message["doc"].get("email")
+    if email:
+        forget_profile(email)
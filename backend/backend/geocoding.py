@@ -0,0 +1,129 @@
+"""Address geocoding for event locations.
+
+``get_geocoder()`` returns the backend named in ``settings.GEOCODER``
+wrapped in a Django-cache layer, so each distinct address is looked up
+once (misses included). Backends implement ``geocode(query)`` and return
+``(longitude, latitude)`` or None:
+
+* ``NullGeocoder``: never resolves anything (default; events then need
+  explicit coordinates)
+* ``StaticGeocoder``: a fixed ``{"query": [lng, lat]}`` table, for tests and
+  offline setups
+* ``NominatimGeocoder``: OpenStreetMap Nominatim over HTTP
+
+Requests never wait on a geocoder: events created without coordinates are
+geocoded by the ``geocode_event`` job (backend/tasks.py), and ``manage.py
+geocode_events`` fills in whatever it missed.
+"""
+import hashlib
+import json
+import logging
+import math
+import threading
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+CACHE_SECONDS = 30 * 24 * 60 * 60
+# Cached in place of None so unresolvable addresses are not retried every time
+MISS = "miss"
+
+
+def normalize(query):
+    return " ".join(query.lower().replace(",", " ").split())
+
+
+def haversine_km(a, b):
+    """Great-circle distance between two (lng, lat) points"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def valid_point(lng, lat):
+    return -180 <= lng <= 180 and -90 <= lat <= 90
+
+
+class NullGeocoder:
+    def geocode(self, query):
+        return None
+
+
+class StaticGeocoder:
+    def __init__(self, table=None):
+        self.table = {normalize(k): tuple(v) for k, v in (table or {}).items()}
+
+    def geocode(self, query):
+        return self.table.get(normalize(query))
+
+
+class NominatimGeocoder:
+    def __init__(self, url="https://nominatim.openstreetmap.org/search", user_agent="eventbookingapp", timeout=5):
+        self.url = url
+        self.user_agent = user_agent
+        self.timeout = timeout
+
+    def geocode(self, query):
+        params = urllib.parse.urlencode({"q": query, "format": "json", "limit": 1})
+        request = urllib.request.Request(f"{self.url}?{params}", headers={"User-Agent": self.user_agent})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            results = json.load(response)
+        if not results:
+            return None
+        return float(results[0]["lon"]), float(results[0]["lat"])
+
+
+class CachedGeocoder:
+    """Caches another geocoder's answers; lookup errors are logged, not cached"""
+
+    def __init__(self, inner, timeout=CACHE_SECONDS):
+        self.inner = inner
+        self.timeout = timeout
+
+    def geocode(self, query):
+        query = normalize(query or "")
+        if not query:
+            return None
+        key = "geocode:" + hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+        cached = cache.get(key)
+        if cached is not None:
+            return None if cached == MISS else tuple(cached)
+        try:
+            point = self.inner.geocode(query)
+        except Exception:
+            logger.warning("Geocoding failed for %r", query, exc_info=True)
+            return None
+        cache.set(key, list(point) if point else MISS, self.timeout)
+        return point
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                conf = getattr(settings, "GEOCODER", {})
+                inner = import_string(conf.get("BACKEND", "backend.geocoding.NullGeocoder"))(**conf.get("OPTIONS", {}))
+                _geocoder = CachedGeocoder(inner, conf.get("CACHE_SECONDS", CACHE_SECONDS))
+    return _geocoder
+
+
+def geocode_event(event):
+    """(lng, lat) of an event from its address, falling back to venue and city"""
+    geocoder = get_geocoder()
+    for parts in ((event.address, event.city), (event.location, event.city), (event.city,)):
+        if all(parts):
+            point = geocoder.geocode(", ".join(parts))
+            if point is not None:
+                return point
+    return None
@@ -0,0 +1,246 @@
+"""Hall layouts and the compact seat index derived from them.
+
+A layout is stored on ``Event.hall_layout`` as sections of rows. Rows are
+numbered globally (1..N) across sections in layout order, so a ``Seat`` keeps
+its plain ``(row, column)`` shape. The seat index gives every seat position a
+dense integer ordinal, which is what the seat inventory and the availability
+endpoints work with.
+"""
+import hashlib
+import json
+import math
+from array import array
+from bisect import bisect_right
+
+from .models import HallLayout, HallSection, HallRow
+
+DEFAULT_ROWS = 8
+DEFAULT_COLUMNS = 10
+MAX_ROW_SEATS = 65535
+DEFAULT_FINGERPRINT = "default"
+
+# layout fingerprint -> SeatIndex
+_index_cache = {}
+_INDEX_CACHE_SIZE = 256
+
+
+def default_layout_dict():
+    """The 8x10 single-section hall used for events without a layout"""
+    return {
+        "name": "Standard hall",
+        "price_tiers": {},
+        "sections": [{
+            "name": "Main",
+            "price_tier": None,
+            "score": 0,
+            "rows": [
+                {"label": str(r + 1), "seats": DEFAULT_COLUMNS, "seat_type": "standard",
+                 "price_tier": None, "blocked": []}
+                for r in range(DEFAULT_ROWS)
+            ],
+        }],
+    }
+
+
+def layout_to_dict(layout):
+    if layout is None:
+        return default_layout_dict()
+    return {
+        "name": layout.name,
+        "price_tiers": dict(layout.price_tiers or {}),
+        "sections": [{
+            "name": section.name,
+            "price_tier": section.price_tier,
+            "score": section.score or 0,
+            "rows": [{
+                "label": row.label,
+                "seats": row.seats,
+                "seat_type": row.seat_type,
+                "price_tier": row.price_tier,
+                "blocked": list(row.blocked or []),
+            } for row in section.rows],
+        } for section in layout.sections],
+    }
+
+
+def layout_fingerprint(layout_dict):
+    return hashlib.sha1(json.dumps(layout_dict, sort_keys=True).encode()).hexdigest()
+
+
+def layout_from_dict(data):
+    """Validate client-supplied layout data and build a HallLayout.
+
+    Raises ValueError with a message suitable for a 400 response.
+    """
+    if not isinstance(data, dict) or not data.get("sections"):
+        raise ValueError("hall_layout must contain at least one section")
+
+    price_tiers = data.get("price_tiers") or {}
+    try:
+        price_tiers = {str(k): float(v) for k, v in price_tiers.items()}
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError("price_tiers must map tier names to prices")
+    if any(not math.isfinite(p) or p < 0 for p in price_tiers.values()):
+        raise ValueError("Tier prices must be positive")
+
+    def check_tier(tier):
+        if tier and price_tiers and tier not in price_tiers:
+            raise ValueError(f"Unknown price tier '{tier}'")
+        return tier or None
+
+    sections = []
+    for s in data["sections"]:
+        if not s.get("name") or not s.get("rows"):
+            raise ValueError("Every section needs a name and at least one row")
+        rows = []
+        for r in s["rows"]:
+            seats = int(r.get("seats", 0))
+            if seats < 1 or seats > MAX_ROW_SEATS:
+                raise ValueError(f"Row seat count must be between 1 and {MAX_ROW_SEATS}")
+            blocked = sorted({int(c) for c in r.get("blocked") or []})
+            if blocked and (blocked[0] < 1 or blocked[-1] > seats):
+                raise ValueError("Blocked seats must be inside the row")
+            rows.append(HallRow(
+                label=r.get("label"),
+                seats=seats,
+                seat_type=r.get("seat_type") or "standard",
+                price_tier=check_tier(r.get("price_tier")),
+                blocked=blocked,
+            ))
+        try:
+            score = float(s.get("score") or 0)
+        except (TypeError, ValueError):
+            raise ValueError("Section score must be a number")
+        if not math.isfinite(score):
+            raise ValueError("Section score must be a number")
+        sections.append(HallSection(
+            name=s["name"], price_tier=check_tier(s.get("price_tier")), score=score, rows=rows
+        ))
+
+    layout = HallLayout(name=data.get("name"), sections=sections, price_tiers=price_tiers)
+    layout.fingerprint = layout_fingerprint(layout_to_dict(layout))
+    return layout
+
+
+class SeatIndex:
+    """Flat, precomputed view of a layout.
+
+    Per global row it keeps the ordinal of its first seat, its length, its
+    section and its effective price tier / seat type; blocked positions are
+    pre-marked in ``base``, a bytearray with one byte per ordinal. Everything
+    else (validation, ordinal <-> seat mapping, availability bitmaps) is
+    arithmetic over these arrays. ``rank`` lists rows best first: by section
+    score, then front to back.
+    """
+
+    def __init__(self, layout_dict):
+        self.layout = layout_dict
+        self.row_offsets = array("I")
+        self.row_lengths = array("H")
+        self.row_sections = array("H")
+        self.row_tiers = []
+        self.row_types = []
+        self.section_names = []
+        blocked = []
+
+        offset = 0
+        for section_idx, section in enumerate(layout_dict["sections"]):
+            self.section_names.append(section["name"])
+            for row in section["rows"]:
+                self.row_offsets.append(offset)
+                self.row_lengths.append(row["seats"])
+                self.row_sections.append(section_idx)
+                self.row_tiers.append(row.get("price_tier") or section.get("price_tier"))
+                self.row_types.append(row.get("seat_type") or "standard")
+                blocked.extend(offset + c - 1 for c in row.get("blocked") or [])
+                offset += row["seats"]
+
+        self.size = offset
+        self.base = bytearray(offset)
+        for ordinal in blocked:
+            self.base[ordinal] = 1
+        self.capacity = offset - len(blocked)
+
+        scores = [layout_dict["sections"][s].get("score") or 0 for s in self.row_sections]
+        self.rank = sorted(range(len(scores)), key=lambda r: (-scores[r], r))
+
+    @property
+    def num_rows(self):
+        return len(self.row_offsets)
+
+    def ordinal(self, row, column):
+        """Ordinal of a sellable seat, or None if it is not part of the hall"""
+        try:
+            row, column = int(row), int(column)
+        except (TypeError, ValueError):
+            return None
+        if row < 1 or row > self.num_rows:
+            return None
+        if column < 1 or column > self.row_lengths[row - 1]:
+            return None
+        ordinal = self.row_offsets[row - 1] + column - 1
+        if self.base[ordinal]:
+            return None
+        return ordinal
+
+    def seat(self, ordinal):
+        row = bisect_right(self.row_offsets, ordinal)
+        return row, ordinal - self.row_offsets[row - 1] + 1
+
+    def tier(self, ordinal):
+        return self.row_tiers[self.seat(ordinal)[0] - 1]
+
+    def bitmap(self, taken):
+        """Occupancy bytearray (1 = blocked or taken) for the given ordinals"""
+        bits = bytearray(self.base)
+        size = self.size
+        for ordinal in taken:
+            if 0 <= ordinal < size:
+                bits[ordinal] = 1
+        return bits
+
+    def packed(self, taken):
+        """Taken ordinals as a bitmap with one bit per ordinal, MSB first"""
+        bits = bytearray((self.size + 7) // 8)
+        for ordinal in taken:
+            if 0 <= ordinal < self.size:
+                bits[ordinal >> 3] |= 0x80 >> (ordinal & 7)
+        return bits
+
+    def describe(self):
+        """Layout as served to clients, with global row numbers filled in"""
+        row = 0
+        sections = []
+        for section in self.layout["sections"]:
+            rows = []
+            for r in section["rows"]:
+                row += 1
+                rows.append({**r, "row": row, "price_tier": self.row_tiers[row - 1]})
+            sections.append({"name": section["name"], "score": section.get("score") or 0, "rows": rows})
+        return {
+            "name": self.layout.get("name"),
+            "capacity": self.capacity,
+            "price_tiers": self.layout.get("price_tiers") or {},
+            "sections": sections,
+        }
+
+
+def seat_index_for(event):
+    """Seat index of an event, shared by every request that sees the same layout.
+
+    The index is looked up by the fingerprint stored with the layout, so a
+    request does not walk the layout. Layouts saved before fingerprints
+    existed are fingerprinted on each call until ``reconcile_counters
+    --layout-fingerprints`` has stored theirs.
+    """
+    layout = getattr(event, "hall_layout", None)
+    key = DEFAULT_FINGERPRINT if layout is None else layout.fingerprint
+    index = _index_cache.get(key) if key else None
+    if index is None:
+        layout_dict = layout_to_dict(layout)
+        key = key or layout_fingerprint(layout_dict)
+        index = _index_cache.get(key) or SeatIndex(layout_dict)
+        if len(_index_cache) >= _INDEX_CACHE_SIZE:
+            _index_cache.clear()
+        _index_cache[key] = index
+    return index
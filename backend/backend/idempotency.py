@@ -0,0 +1,100 @@
+"""``Idempotency-Key`` support for write endpoints.
+
+The first request with a key records an in-progress marker, runs the view and
+stores its response; retries with the same key and body get that response
+replayed (``Idempotent-Replayed: true``) instead of running the view again.
+Records expire through a TTL index after a day. 5xx responses and the
+transient refusals in ``RETRYABLE_STATUSES`` (no admission pass yet, seats
+or prices that changed meanwhile, throttling) are not recorded, so those
+requests can be retried for real.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from mongoengine.errors import NotUniqueError
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 255
+# An in-progress marker older than this belongs to a crashed request and may be taken over
+LOCK_TIMEOUT = timedelta(seconds=60)
+# Outcomes that may differ on a retry with the same body
+RETRYABLE_STATUSES = {403, 409, 429}
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _acquire(key, user_id, endpoint, request_hash):
+    """Create the in-progress record, or return the existing one"""
+    try:
+        record = IdempotencyRecord(
+            key=key, user_id=user_id, endpoint=endpoint, request_hash=request_hash
+        )
+        record.save(force_insert=True)
+        return record, True
+    except NotUniqueError:
+        existing = IdempotencyRecord.objects(user_id=user_id, endpoint=endpoint, key=key).first()
+        if existing is None or existing.state != "in_progress":
+            return existing, False
+        if existing.created_at < datetime.utcnow() - LOCK_TIMEOUT and existing.request_hash == request_hash:
+            taken_over = IdempotencyRecord.objects(
+                id=existing.id, state="in_progress", created_at=existing.created_at
+            ).update_one(set__created_at=datetime.utcnow())
+            if taken_over:
+                return existing, True
+        return existing, False
+
+
+def idempotent(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": "Idempotency-Key is too long"}, status=400)
+
+        request_hash = request_fingerprint(request)
+        record, owner = _acquire(key, str(request.user.id), view.__name__, request_hash)
+
+        if not owner:
+            if record is None:
+                return Response({"error": "Idempotency-Key conflict, retry"}, status=409)
+            if record.request_hash != request_hash:
+                return Response(
+                    {"error": "Idempotency-Key was already used for a different request"}, status=422
+                )
+            if record.state == "in_progress":
+                response = Response(
+                    {"error": "A request with this Idempotency-Key is still in progress"}, status=409
+                )
+                response["Retry-After"] = "1"
+                return response
+            response = Response(record.response, status=record.status_code)
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+            record.delete()
+        else:
+            record.update(
+                set__state="completed",
+                set__status_code=response.status_code,
+                set__response=dict(response.data or {}),
+            )
+        return response
+
+    return wrapper
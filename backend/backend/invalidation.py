@@ -0,0 +1,191 @@
+"""Cache invalidation driven by MongoDB change streams.
+
+One consumer (``manage.py watch_changes``) follows the change streams of
+``events``, ``bookings`` and ``users``, so writes from other workers, admin
+scripts or the Mongo shell are seen as well as the app's own. For every
+change it:
+
+1. runs the *shared* handlers once (``on_change``): they fix state kept in
+   the shared cache or in Mongo, such as feed generations and related-event
+   lists;
+2. publishes an invalidation message on the bus, and every worker runs its
+   *local* handlers (``subscribe``) for in-process caches such as the JWT
+   user cache.
+
+Messages are ``{"collection", "op", "id", "doc", "token"}``. ``doc`` holds the
+few fields handlers need, when the change stream has them. ``token`` is
+unique per change. The bus is chosen by ``settings.INVALIDATION["BUS"]``:
+``LocalBus`` delivers in process (single worker, tests); ``RedisBus`` uses
+Redis pub/sub to reach every worker. The resume token is saved after each
+change, so a restarted consumer continues where it stopped.
+"""
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = ("events", "bookings", "users")
+# Fields copied from the changed document into the message
+MESSAGE_FIELDS = ("email", "user_email", "event_id", "category", "city")
+# Fields that bookings and favorites update on every write; updates touching
+# only these (and updated_at) do not change what the handlers derive from
+COUNTER_FIELDS = {"events": {"attendees_count", "favorites_count", "updated_at"}}
+STATE_COLLECTION = "change_stream_state"
+CHANNEL = "invalidation"
+
+_local_handlers = defaultdict(list)
+_shared_handlers = defaultdict(list)
+
+
+def subscribe(collection, handler):
+    """Run ``handler(message)`` in every worker for changes to ``collection``"""
+    _local_handlers[collection].append(handler)
+
+
+def on_change(collection):
+    """Decorator: run once per change, in the consumer, for ``collection``"""
+    def decorator(handler):
+        _shared_handlers[collection].append(handler)
+        return handler
+    return decorator
+
+
+def _run(handlers, message):
+    for handler in handlers.get(message["collection"], ()):
+        try:
+            handler(message)
+        except Exception:
+            logger.exception("Invalidation handler %r failed", handler)
+
+
+def deliver(message):
+    """Run the local handlers for a message received from the bus"""
+    _run(_local_handlers, message)
+
+
+class LocalBus:
+    """Delivers to this process only; for single-worker setups and tests"""
+
+    def __init__(self, **options):
+        pass
+
+    def publish(self, message):
+        deliver(message)
+
+
+class RedisBus:
+    """Redis pub/sub; every worker listens on a daemon thread"""
+
+    def __init__(self, url="redis://localhost:6379/0", channel=CHANNEL, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.channel = channel
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{channel: self._receive})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _receive(self, raw):
+        deliver(json.loads(raw["data"]))
+
+    def publish(self, message):
+        self.client.publish(self.channel, json.dumps(message, default=str))
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                conf = getattr(settings, "INVALIDATION", {})
+                bus_cls = import_string(conf.get("BUS", "backend.invalidation.LocalBus"))
+                _bus = bus_cls(**conf.get("OPTIONS", {}))
+    return _bus
+
+
+def publish(collection, op, doc_id, doc=None, token=None):
+    """Announce a change the app made itself, without waiting for the change stream"""
+    get_bus().publish({
+        "collection": collection, "op": op, "id": str(doc_id), "doc": doc or {}, "token": token,
+    })
+
+
+def counters_only(collection, change):
+    if change.get("operationType") != "update" or collection not in COUNTER_FIELDS:
+        return False
+    description = change.get("updateDescription") or {}
+    changed = set(description.get("updatedFields") or ()) | set(description.get("removedFields") or ())
+    return changed <= COUNTER_FIELDS[collection]
+
+
+def to_message(change):
+    """Invalidation message for one change stream event, or None to skip it"""
+    collection = change.get("ns", {}).get("coll")
+    if collection not in COLLECTIONS or counters_only(collection, change):
+        return None
+    key = change.get("documentKey", {})
+    # fullDocument is looked up for updates; deletes only carry the key (and shard key fields)
+    source = {**key, **(change.get("fullDocument") or {})}
+    token = change.get("_id", {}).get("_data")
+    return {
+        "collection": collection,
+        "op": change["operationType"],
+        "id": str(key.get("_id")),
+        "doc": {f: str(source[f]) for f in MESSAGE_FIELDS if source.get(f) is not None},
+        "token": token,
+    }
+
+
+def handle(message):
+    """Consumer side of one change: shared handlers once, then the bus"""
+    _run(_shared_handlers, message)
+    get_bus().publish(message)
+
+
+class ChangeStreamConsumer:
+    def __init__(self, db, collections=COLLECTIONS, name="invalidation"):
+        self.db = db
+        self.collections = list(collections)
+        self.name = name
+        self.state = db[STATE_COLLECTION]
+
+    def pipeline(self):
+        projection = {"operationType": 1, "ns": 1, "documentKey": 1, "updateDescription": 1}
+        projection.update({f"fullDocument.{f}": 1 for f in MESSAGE_FIELDS})
+        return [
+            {"$match": {
+                "ns.coll": {"$in": self.collections},
+                "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+            }},
+            {"$project": projection},
+        ]
+
+    def resume_token(self):
+        state = self.state.find_one({"_id": self.name})
+        return state["token"] if state else None
+
+    def run(self, stop=None):
+        """Follow the change streams until ``stop`` (a threading.Event) is set"""
+        with self.db.watch(
+            self.pipeline(), full_document="updateLookup", resume_after=self.resume_token(),
+            max_await_time_ms=1000,
+        ) as stream:
+            while stop is None or not stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                message = to_message(change)
+                if message is not None:
+                    handle(message)
+                self.state.update_one({"_id": self.name}, {"$set": {"token": stream.resume_token}}, upsert=True)
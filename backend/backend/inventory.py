@@ -0,0 +1,97 @@
+"""Per-event seat inventory: claiming and releasing seats by ordinal."""
+from datetime import datetime
+
+from .models import EventBooking, SeatInventory
+
+# (event_id, kind) -> (seat index, inventory version, derived bitmap)
+_occupancy_cache = {}
+_OCCUPANCY_CACHE_SIZE = 1024
+
+
+def seat_ordinals(index, seats):
+    """Map booking seats (dicts or Seat documents) to ordinals.
+
+    Returns (ordinals, invalid_seat); invalid_seat is the first seat that is
+    not part of the hall or is requested twice.
+    """
+    ordinals = []
+    seen = set()
+    for s in seats:
+        row = s["row"] if isinstance(s, dict) else s.row
+        column = s["column"] if isinstance(s, dict) else s.column
+        ordinal = index.ordinal(row, column)
+        if ordinal is None or ordinal in seen:
+            return None, s
+        seen.add(ordinal)
+        ordinals.append(ordinal)
+    return ordinals, None
+
+
+def get_inventory(event_id, index):
+    """Load the inventory of an event, backfilling it from its bookings on first use"""
+    inventory = SeatInventory.objects(event_id=event_id).first()
+    if inventory is not None:
+        return inventory
+
+    taken = set()
+    confirmed = EventBooking._get_collection().find(
+        {"event_id": event_id, "booking_status": "Confirmed"}, {"ordinals": 1, "_id": 0}
+    )
+    for doc in confirmed:
+        taken.update(o for o in doc.get("ordinals", ()) if 0 <= o < index.size)
+
+    SeatInventory.objects(event_id=event_id).update_one(
+        upsert=True,
+        set_on_insert__taken=sorted(taken),
+        set_on_insert__version=0,
+        set_on_insert__updated_at=datetime.utcnow(),
+    )
+    return SeatInventory.objects.get(event_id=event_id)
+
+
+def claim_seats(event_id, ordinals, session=None):
+    """Atomically mark ordinals as taken; False if any of them already is"""
+    result = SeatInventory._get_collection().update_one(
+        {"event_id": event_id, "taken": {"$nin": ordinals}},
+        {
+            "$push": {"taken": {"$each": ordinals}},
+            "$inc": {"version": 1},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+        session=session,
+    )
+    return result.modified_count == 1
+
+
+def release_seats(event_id, ordinals, session=None):
+    SeatInventory._get_collection().update_one(
+        {"event_id": event_id},
+        {
+            "$pullAll": {"taken": ordinals},
+            "$inc": {"version": 1},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+        session=session,
+    )
+
+
+def _derived(index, inventory, kind, build):
+    key = (inventory.event_id, kind)
+    cached = _occupancy_cache.get(key)
+    if cached and cached[0] is index and cached[1] == inventory.version:
+        return cached[2]
+    value = build(inventory.taken)
+    if len(_occupancy_cache) >= _OCCUPANCY_CACHE_SIZE:
+        _occupancy_cache.clear()
+    _occupancy_cache[key] = (index, inventory.version, value)
+    return value
+
+
+def occupancy(index, inventory):
+    """Occupancy bitmap for an inventory, rebuilt only when its version moves"""
+    return _derived(index, inventory, "bitmap", index.bitmap)
+
+
+def packed_taken(index, inventory):
+    """Bit-packed taken seats (see SeatBitmapRenderer), cached like occupancy()"""
+    return _derived(index, inventory, "packed", index.packed)
@@ -0,0 +1,144 @@
+"""Durable background jobs stored in Mongo.
+
+``enqueue(name, payload, session=...)`` inserts a job, inside the caller's
+transaction when given its session, so a job exists exactly when the write
+that caused it committed. ``manage.py run_jobs`` workers claim due jobs one
+at a time with ``find_one_and_update``, holding a lease (``locked_until``)
+that another worker may take over if the holder dies. A failing job is
+retried with exponential backoff and jitter; after ``max_attempts`` it is
+parked as ``dead`` with its last error for someone to look at
+(``run_jobs --retry-dead`` requeues them).
+
+Jobs run at least once, so handlers must tolerate repeats. Handlers are
+registered with ``@job("name")``; see backend/tasks.py.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from .models import Job
+from .slowlog import operation
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 60 * 60
+MAX_ATTEMPTS = 5
+
+_handlers = {}
+
+
+def job(name):
+    """Register the decorated function as the handler of job ``name``"""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, session=None, delay=None, max_attempts=MAX_ATTEMPTS):
+    now = datetime.utcnow()
+    doc = {
+        "name": name,
+        "payload": payload or {},
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": now + (delay or timedelta()),
+        "created_at": now,
+    }
+    return Job._get_collection().insert_one(doc, session=session).inserted_id
+
+
+def backoff(attempts):
+    seconds = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=seconds * (0.5 + random.random() / 2))
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker, now=None):
+    """Lease the next due job (or one whose lease expired) to ``worker``"""
+    now = now or datetime.utcnow()
+    return Job._get_collection().find_one_and_update(
+        {"$or": [
+            {"status": "queued", "run_at": {"$lte": now}},
+            {"status": "running", "locked_until": {"$lt": now}},
+        ]},
+        {
+            "$set": {"status": "running", "locked_by": worker, "locked_until": now + LEASE},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def execute(doc, worker, now=None):
+    """Run one claimed job and record the outcome; returns its new status"""
+    jobs = Job._get_collection()
+    lease = {"_id": doc["_id"], "locked_by": worker}
+    handler = _handlers.get(doc["name"])
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job {doc['name']!r}")
+        with operation(f"job:{doc['name']}"):
+            handler(**doc.get("payload", {}))
+    except Exception as exc:
+        now = now or datetime.utcnow()
+        error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        if doc["attempts"] >= doc.get("max_attempts", MAX_ATTEMPTS) or handler is None:
+            logger.error("Job %s (%s) is dead: %s", doc["_id"], doc["name"], error)
+            jobs.update_one(lease, {
+                "$set": {"status": "dead", "last_error": error, "finished_at": now},
+                "$unset": {"locked_by": "", "locked_until": ""},
+            })
+            return "dead"
+        logger.warning("Job %s (%s) failed, retrying: %s", doc["_id"], doc["name"], error)
+        jobs.update_one(lease, {
+            "$set": {"status": "queued", "last_error": error, "run_at": now + backoff(doc["attempts"])},
+            "$unset": {"locked_by": "", "locked_until": ""},
+        })
+        return "queued"
+
+    jobs.update_one(lease, {
+        "$set": {"status": "done", "finished_at": datetime.utcnow()},
+        "$unset": {"locked_by": "", "locked_until": ""},
+    })
+    return "done"
+
+
+def run_worker(stop=None, poll_seconds=1.0, once=False):
+    """Process jobs until ``stop`` (a threading.Event) is set, or the queue is empty with ``once``"""
+    worker = worker_id()
+    processed = 0
+    while stop is None or not stop.is_set():
+        doc = claim(worker)
+        if doc is None:
+            if once:
+                break
+            time.sleep(poll_seconds)
+            continue
+        execute(doc, worker)
+        processed += 1
+    return processed
+
+
+def retry_dead(name=None):
+    query = {"status": "dead"}
+    if name:
+        query["name"] = name
+    result = Job._get_collection().update_many(query, {
+        "$set": {"status": "queued", "attempts": 0, "run_at": datetime.utcnow()},
+        "$unset": {"finished_at": ""},
+    })
+    return result.modified_count
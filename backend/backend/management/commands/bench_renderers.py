@@ -0,0 +1,72 @@
+import random
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from backend.hall import SeatIndex
+from backend.renderers import ORJSONRenderer, MessagePackRenderer, msgpack
+
+
+class Command(BaseCommand):
+    help = "Compare response size and serialization time of the API renderers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=200, help="Events in the listing payload")
+        parser.add_argument("--rows", type=int, default=200, help="Rows of 100 seats in the hall payload")
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        listing = [self.fake_event(i) for i in range(options["events"])]
+
+        index = SeatIndex({
+            "name": "Arena",
+            "price_tiers": {},
+            "sections": [{"name": "Main", "rows": [{"seats": 100}] * options["rows"]}],
+        })
+        taken = sorted(random.sample(range(index.size), index.size // 2))
+        reserved = [dict(zip(("row", "column"), index.seat(o))) for o in taken]
+
+        renderers = [("drf-json", JSONRenderer()), ("orjson", ORJSONRenderer())]
+        if msgpack is not None:
+            renderers.append(("msgpack", MessagePackRenderer()))
+
+        self.stdout.write(f"fetch_events ({len(listing)} events)")
+        for name, renderer in renderers:
+            self.report(name, lambda r=renderer: r.render(listing))
+
+        self.stdout.write(f"get_reserved_seats ({len(taken)} of {index.size} seats taken)")
+        for name, renderer in renderers:
+            self.report(name, lambda r=renderer: r.render(reserved))
+        self.report("bitmap", lambda: bytes(index.packed(taken)))
+
+    def report(self, name, render):
+        body = render()
+        start = time.perf_counter()
+        for _ in range(self.repeat):
+            render()
+        elapsed = (time.perf_counter() - start) / self.repeat
+        self.stdout.write(f"  {name:<10} {len(body):>10} bytes {elapsed * 1000:>9.3f} ms")
+
+    def fake_event(self, i):
+        return {
+            "id": f"{i:024x}",
+            "title": f"Event {i}",
+            "description": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20,
+            "category": random.choice(["Music", "Sports", "Arts", "Technology"]),
+            "date": datetime(2026, 1, 1 + i % 28),
+            "time": "19:00",
+            "location": "Main Hall",
+            "city": "Warsaw",
+            "price": 49.99,
+            "ticket_type": "Paid",
+            "capacity": 500,
+            "tags": ["live", "indoor"],
+            "status": "Published",
+            "featured": False,
+            "attendees_count": i,
+            "created_at": datetime(2025, 12, 1),
+            "updated_at": datetime(2025, 12, 2),
+        }
@@ -0,0 +1,73 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: load the WSGI app and serve one request
+CHILD = r"""
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+from eventbookingapp.wsgi import application
+loaded = time.perf_counter()
+
+environ = {"PATH_INFO": "/api/health/", "REQUEST_METHOD": "GET"}
+setup_testing_defaults(environ)
+status = []
+body = b"".join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+served = time.perf_counter()
+json.dump({"status": status[0], "load": loaded - start, "request": served - loaded}, sys.stdout)
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure how long a new worker takes from process start to its first response"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--imports", type=int, default=10, help="Show the N slowest imports (0 to skip)")
+        parser.add_argument("--budget", type=float, help="Fail if the median exceeds this many seconds")
+
+    def run_child(self, *flags):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "eventbookingapp.settings")}
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, *flags, "-c", CHILD], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True,
+        )
+        total = time.perf_counter() - start
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else "worker failed")
+        return total, json.loads(result.stdout), result.stderr
+
+    def handle(self, *args, **options):
+        runs = []
+        for _ in range(options["runs"]):
+            total, child, _ = self.run_child()
+            runs.append((total, child))
+            self.stdout.write(
+                f"{child['status']}: total {total * 1000:.0f} ms "
+                f"(app load {child['load'] * 1000:.0f} ms, first request {child['request'] * 1000:.0f} ms)"
+            )
+        median = statistics.median(total for total, _ in runs)
+        self.stdout.write(f"median {median * 1000:.0f} ms, max {max(t for t, _ in runs) * 1000:.0f} ms")
+
+        if options["imports"]:
+            _, _, stderr = self.run_child("-X", "importtime")
+            rows = []
+            for line in stderr.splitlines():
+                if line.startswith("import time:") and "|" in line and "self" not in line:
+                    own, _, name = line[len("import time:"):].split("|")
+                    rows.append((int(own), name.strip()))
+            self.stdout.write("slowest imports (self time):")
+            for own, name in sorted(rows, reverse=True)[:options["imports"]]:
+                self.stdout.write(f"  {own / 1000:7.1f} ms  {name}")
+
+        if options["budget"] is not None and median > options["budget"]:
+            raise CommandError(f"Median startup {median:.2f}s is over the {options['budget']:.2f}s budget")
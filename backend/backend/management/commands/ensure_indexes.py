@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from backend.startup import documents
+
+
+class Command(BaseCommand):
+    help = "Create the indexes declared on every Mongo document (run on deploy)"
+
+    def handle(self, *args, **options):
+        for document in documents():
+            document.ensure_indexes()
+            self.stdout.write(f"{document._get_collection_name()}: ok")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine.errors import DoesNotExist
+
+from backend.checkin import changes_since
+from backend.hall import seat_index_for
+from backend.models import Event
+from backend.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write the signed check-in snapshot of an event for offline scanners"
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id")
+        parser.add_argument("-o", "--output", help="File to write (default checkin-<event_id>.bin)")
+
+    def handle(self, *args, **options):
+        event_id = options["event_id"]
+        try:
+            event = Event.objects.only("hall_layout").get(id=event_id)
+        except DoesNotExist:
+            raise CommandError(f"Event {event_id} not found")
+        cursor = time.time()
+        admitted, _ = changes_since(event_id)
+        data = build_snapshot(event_id, seat_index_for(event), admitted, cursor=cursor)
+        path = options["output"] or f"checkin-{event_id}.bin"
+        with open(path, "wb") as f:
+            f.write(data)
+        self.stdout.write(f"wrote {len(data)} bytes to {path}")
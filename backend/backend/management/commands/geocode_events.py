@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from backend.geocoding import geocode_event
+from backend.models import Event
+
+
+class Command(BaseCommand):
+    help = "Fill Event.geo_point from addresses for events that have none"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-geocode events that already have a point")
+        parser.add_argument("--dry-run", action="store_true", help="Report results without writing")
+
+    def handle(self, *args, **options):
+        events = Event.objects.only("address", "location", "city")
+        if not options["all"]:
+            events = events.filter(geo_point=None)
+
+        found = missed = 0
+        for event in events:
+            point = geocode_event(event)
+            if point is None:
+                missed += 1
+                continue
+            found += 1
+            if not options["dry_run"]:
+                Event.objects(id=event.id).update_one(set__geo_point=list(point), set__updated_at=datetime.utcnow())
+        self.stdout.write(f"geocoded {found} event(s), {missed} without a match")
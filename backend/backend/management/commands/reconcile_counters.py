@@ -0,0 +1,164 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from pymongo import ReplaceOne, UpdateOne
+
+from backend.booking import event_booking
+from backend.hall import layout_fingerprint, layout_to_dict, seat_index_for
+from backend.models import Booking, Event, EventBooking, SeatInventory, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Event.attendees_count (and optionally seat inventories) from Confirmed bookings "
+        "and Event.favorites_count from users' favorites"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--inventory", action="store_true", help="Also rebuild seat inventories")
+        parser.add_argument("--favorites", action="store_true", help="Also recount favorites_count")
+        parser.add_argument(
+            "--event-bookings", action="store_true",
+            help="Also rebuild the per-event booking copies (event_bookings) from bookings",
+        )
+        parser.add_argument(
+            "--layout-fingerprints", action="store_true",
+            help="Also store the fingerprint of hall layouts saved without one",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report differences without writing")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.dry_run = options["dry_run"]
+        self.batch_size = options["batch_size"]
+
+        fixed = self.reconcile_attendees()
+        self.stdout.write(f"attendees_count: {fixed} event(s) corrected")
+        if options["inventory"]:
+            fixed = self.reconcile_inventories()
+            self.stdout.write(f"seat inventory: {fixed} event(s) corrected")
+        if options["favorites"]:
+            fixed = self.reconcile_favorites()
+            self.stdout.write(f"favorites_count: {fixed} event(s) corrected")
+        if options["event_bookings"]:
+            fixed = self.reconcile_event_bookings()
+            self.stdout.write(f"event_bookings: {fixed} booking(s) corrected")
+        if options["layout_fingerprints"]:
+            fixed = self.reconcile_layout_fingerprints()
+            self.stdout.write(f"layout fingerprints: {fixed} event(s) corrected")
+
+    def flush(self, collection, ops):
+        if ops and not self.dry_run:
+            collection.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    def reconcile_attendees(self):
+        pipeline = [
+            {"$match": {"booking_status": "Confirmed"}},
+            {"$group": {"_id": "$event_id", "tickets": {"$sum": "$num_tickets"}}},
+        ]
+        tickets = {
+            doc["_id"]: doc["tickets"]
+            for doc in Booking._get_collection().aggregate(pipeline, allowDiskUse=True)
+        }
+
+        events = Event._get_collection()
+        now = datetime.utcnow()
+        ops, fixed = [], 0
+        for doc in events.find({}, {"attendees_count": 1}):
+            expected = tickets.get(str(doc["_id"]), 0)
+            if doc.get("attendees_count", 0) != expected:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"attendees_count": expected, "updated_at": now}}))
+            if len(ops) >= self.batch_size:
+                fixed += self.flush(events, ops)
+                ops = []
+        return fixed + self.flush(events, ops)
+
+    def reconcile_favorites(self):
+        pipeline = [
+            {"$unwind": "$favorite_events"},
+            {"$group": {"_id": "$favorite_events", "count": {"$sum": 1}}},
+        ]
+        counts = {
+            doc["_id"]: doc["count"]
+            for doc in User._get_collection().aggregate(pipeline, allowDiskUse=True)
+        }
+
+        events = Event._get_collection()
+        now = datetime.utcnow()
+        ops, fixed = [], 0
+        for doc in events.find({}, {"favorites_count": 1}):
+            expected = counts.get(str(doc["_id"]), 0)
+            if doc.get("favorites_count", 0) != expected:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"favorites_count": expected, "updated_at": now}}))
+            if len(ops) >= self.batch_size:
+                fixed += self.flush(events, ops)
+                ops = []
+        return fixed + self.flush(events, ops)
+
+    def reconcile_inventories(self):
+        pipeline = [
+            {"$match": {"booking_status": "Confirmed"}},
+            {"$unwind": "$seats"},
+            {"$group": {"_id": "$event_id", "seats": {"$push": "$seats"}}},
+        ]
+        booked = {
+            doc["_id"]: doc["seats"]
+            for doc in Booking._get_collection().aggregate(pipeline, allowDiskUse=True)
+        }
+
+        inventories = SeatInventory._get_collection()
+        ops, fixed = [], 0
+        for event in Event.objects.only("hall_layout"):
+            event_id = str(event.id)
+            index = seat_index_for(event)
+            expected = {
+                index.ordinal(s["row"], s["column"]) for s in booked.get(event_id, [])
+            } - {None}
+            current = inventories.find_one({"event_id": event_id}, {"taken": 1})
+            if current is None or set(current.get("taken", [])) != expected:
+                ops.append(UpdateOne(
+                    {"event_id": event_id},
+                    {"$set": {"taken": sorted(expected)}, "$inc": {"version": 1}},
+                    upsert=True,
+                ))
+            if len(ops) >= self.batch_size:
+                fixed += self.flush(inventories, ops)
+                ops = []
+        return fixed + self.flush(inventories, ops)
+
+    def reconcile_event_bookings(self):
+        copies = EventBooking._get_collection()
+        fields = {
+            "event_id": 1, "user_email": 1, "num_tickets": 1, "total_price": 1, "seats": 1,
+            "booking_status": 1, "created_at": 1, "cancelled_at": 1,
+        }
+        ops, fixed = [], 0
+        for event in Event.objects.only("hall_layout"):
+            event_id = str(event.id)
+            index = seat_index_for(event)
+            current = {doc["_id"]: doc for doc in copies.find({"event_id": event_id})}
+            for doc in Booking._get_collection().find({"event_id": event_id}, fields):
+                ordinals = [
+                    o for o in (index.ordinal(s["row"], s["column"]) for s in doc.get("seats", ())) if o is not None
+                ]
+                expected = event_booking(doc, ordinals)
+                if doc.get("cancelled_at"):
+                    expected["cancelled_at"] = doc["cancelled_at"]
+                if current.get(doc["_id"]) != expected:
+                    ops.append(ReplaceOne({"_id": doc["_id"], "event_id": event_id}, expected, upsert=True))
+                if len(ops) >= self.batch_size:
+                    fixed += self.flush(copies, ops)
+                    ops = []
+        return fixed + self.flush(copies, ops)
+
+    def reconcile_layout_fingerprints(self):
+        events = Event._get_collection()
+        ops, fixed = [], 0
+        for event in Event.objects(hall_layout__ne=None, hall_layout__fingerprint=None).only("hall_layout"):
+            fingerprint = layout_fingerprint(layout_to_dict(event.hall_layout))
+            ops.append(UpdateOne({"_id": event.id}, {"$set": {"hall_layout.fingerprint": fingerprint}}))
+            if len(ops) >= self.batch_size:
+                fixed += self.flush(events, ops)
+                ops = []
+        return fixed + self.flush(events, ops)
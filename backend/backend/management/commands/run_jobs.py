@@ -0,0 +1,30 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from backend.jobs import retry_dead, run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (emails, related-list refreshes) until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when no job is due")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument(
+            "--retry-dead", nargs="?", const="", metavar="NAME",
+            help="Requeue dead jobs (of NAME only, if given) and exit",
+        )
+
+    def handle(self, *args, **options):
+        if options["retry_dead"] is not None:
+            count = retry_dead(options["retry_dead"] or None)
+            self.stdout.write(f"requeued {count} dead job(s)")
+            return
+        stop = threading.Event()
+        try:
+            processed = run_worker(stop, poll_seconds=options["poll"], once=options["once"])
+        except KeyboardInterrupt:
+            stop.set()
+            return
+        self.stdout.write(f"processed {processed} job(s)")
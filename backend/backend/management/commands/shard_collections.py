@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine.connection import get_db
+from pymongo.errors import OperationFailure
+
+from backend.sharding import HOT_QUERIES, shard_commands
+
+# Commands that fail this way were already applied
+ALREADY_DONE = {20, 23}  # IllegalOperation (already sharded), AlreadyInitialized
+
+
+class Command(BaseCommand):
+    help = "Shard the high-volume collections (run against mongos) and check hot queries stay on one shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Print the admin commands without running them")
+        parser.add_argument(
+            "--check", action="store_true", help="Explain the hot queries instead and fail unless each hits one shard",
+        )
+
+    def handle(self, *args, **options):
+        db = get_db()
+        if options["check"]:
+            return self.check(db)
+
+        admin = db.client.admin
+        for command in shard_commands(db.name):
+            self.stdout.write(str(command))
+            if options["dry_run"]:
+                continue
+            try:
+                admin.command(command)
+            except OperationFailure as exc:
+                if exc.code not in ALREADY_DONE:
+                    raise
+                self.stdout.write(f"  already done: {exc.details.get('errmsg', exc)}")
+
+    def check(self, db):
+        if not db.client.is_mongos:
+            raise CommandError("--check explains queries through mongos; point MONGO_HOST at a mongos")
+        scattered = []
+        for collection, query in HOT_QUERIES:
+            plan = db.command("explain", {"find": collection, "filter": query}, verbosity="queryPlanner")
+            stage = plan.get("queryPlanner", {}).get("winningPlan", {}).get("stage")
+            self.stdout.write(f"{collection} {sorted(query)}: {stage}")
+            if stage != "SINGLE_SHARD":
+                scattered.append(collection)
+        if scattered:
+            raise CommandError(f"{len(scattered)} hot query(ies) not routed to a single shard: {', '.join(scattered)}")
@@ -0,0 +1,22 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from mongoengine.connection import get_db
+
+from backend.invalidation import COLLECTIONS, ChangeStreamConsumer
+
+
+class Command(BaseCommand):
+    help = "Follow Mongo change streams and publish cache invalidations to every worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--name", default="invalidation", help="Resume-token slot (one per consumer)")
+
+    def handle(self, *args, **options):
+        consumer = ChangeStreamConsumer(get_db(), COLLECTIONS, name=options["name"])
+        self.stdout.write(f"watching {', '.join(COLLECTIONS)}")
+        stop = threading.Event()
+        try:
+            consumer.run(stop)
+        except KeyboardInterrupt:
+            stop.set()
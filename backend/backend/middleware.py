@@ -0,0 +1,166 @@
+"""Response compression middleware.
+
+Compresses responses with Brotli (when the ``brotli`` package is installed)
+or gzip, whichever the client gives the higher q-value (Brotli on a tie),
+following ``settings.COMPRESSION``:
+
+* ``MIN_SIZE``: smaller bodies are sent as is, compression would not pay off
+* ``TYPES``: content-type prefixes worth compressing
+* ``BROTLI_QUALITY`` / ``GZIP_LEVEL``: speed vs size trade-off
+* ``CACHE_BYTES``: budget for reusing compressed GET bodies; identical
+  bodies (cached listings, repeated detail views) are compressed once
+
+Streaming responses are compressed chunk by chunk.
+"""
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULTS = {
+    "MIN_SIZE": 860,
+    "TYPES": (
+        "application/json",
+        "application/msgpack",
+        "application/javascript",
+        "image/svg+xml",
+        "text/",
+    ),
+    "BROTLI_QUALITY": 5,
+    "GZIP_LEVEL": 6,
+    "CACHE_BYTES": 8 * 1024 * 1024,
+}
+
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header mapped to their non-zero q-values"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return {name: q for name, q in accepted.items() if q > 0}
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by encoding and body digest, bounded in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.conf = {**DEFAULTS, **getattr(settings, "COMPRESSION", {})}
+        self.types = tuple(self.conf["TYPES"])
+        self.cache = CompressedBodyCache(self.conf["CACHE_BYTES"])
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def choose_encoding(self, request):
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        # Listed by preference on a tie; max() keeps the first of equal q-values
+        candidates = [e for e in ("br", "gzip") if e in accepted and (e != "br" or brotli is not None)]
+        if not candidates:
+            return None
+        return max(candidates, key=accepted.get)
+
+    def compress(self, data, encoding):
+        if encoding == "br":
+            return brotli.compress(data, quality=self.conf["BROTLI_QUALITY"])
+        compressor = zlib.compressobj(self.conf["GZIP_LEVEL"], zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, chunks, encoding):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.conf["BROTLI_QUALITY"])
+            process, finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.conf["GZIP_LEVEL"], zlib.DEFLATED, 31)
+            process, finish = compressor.compress, compressor.flush
+        for chunk in chunks:
+            data = process(chunk)
+            if data:
+                yield data
+        yield finish()
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(self.types):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = self.choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response.streaming_content, encoding)
+            del response.headers["Content-Length"]
+        else:
+            content = response.content
+            if len(content) < self.conf["MIN_SIZE"]:
+                return response
+
+            key = None
+            if request.method == "GET" and response.status_code == 200:
+                key = (encoding, hashlib.blake2b(content, digest_size=16).digest())
+                compressed = self.cache.get(key)
+            else:
+                compressed = None
+            if compressed is None:
+                compressed = self.compress(content, encoding)
+                if key is not None:
+                    self.cache.set(key, compressed)
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # The compressed representation is no longer byte-identical to a strong ETag
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
@@ -9,7 +9,10 @@ from mongoengine import (
     IntField,
     BooleanField,
     EmbeddedDocumentListField,
+    EmbeddedDocumentField,
     EmbeddedDocument,
+    DictField,
+    PointField,
 )
 from mongoengine.fields import DateTimeField
 from datetime import datetime
@@ -39,6 +42,50 @@ class User(Document):
         return super(User, self).save(*args, **kwargs)
 
 
+class HallRow(EmbeddedDocument):
+    label = StringField()
+    seats = IntField(required=True, min_value=1)
+    seat_type = StringField(default="standard")
+    price_tier = StringField()
+    # Seat numbers in this row that are not sellable (aisles, pillars, tech desks)
+    blocked = ListField(IntField())
+
+
+class HallSection(EmbeddedDocument):
+    name = StringField(required=True)
+    price_tier = StringField()
+    # Higher scores are offered first by best-available allocation
+    score = FloatField(default=0)
+    rows = EmbeddedDocumentListField(HallRow)
+
+
+class HallLayout(EmbeddedDocument):
+    name = StringField()
+    sections = EmbeddedDocumentListField(HallSection)
+    # price tier name -> ticket price
+    price_tiers = DictField()
+    # Hash of the contents, set when the layout is saved; keys the shared seat index
+    fingerprint = StringField()
+
+
+class PriceStep(EmbeddedDocument):
+    # From this share of the hall sold (0-1), every seat costs price * multiplier
+    sold_ratio = FloatField(required=True, min_value=0, max_value=1)
+    multiplier = FloatField(required=True, min_value=0)
+
+
+class Recurrence(EmbeddedDocument):
+    """Repeat rule of an event series; see backend/recurrence.py"""
+    freq = StringField(choices=["daily", "weekly", "monthly"], required=True)
+    interval = IntField(default=1, min_value=1)
+    # Weekly only: 0 = Monday .. 6 = Sunday; defaults to the first date's weekday
+    weekdays = ListField(IntField(min_value=0, max_value=6))
+    until = DateField()
+    count = IntField(min_value=1)
+    # Cancelled dates
+    exdates = ListField(DateField())
+
+
 class Event(Document):
     title = StringField(required=True)
     description = StringField()
@@ -53,6 +100,8 @@ class Event(Document):
     location = StringField(required=True)
     city = StringField(required=True)
     address = StringField()
+    # GeoJSON point [lng, lat]; PointField creates the 2dsphere index
+    geo_point = PointField()
 
     price = FloatField(default=0)
 
@@ -75,13 +124,35 @@ class Event(Document):
 
     featured = BooleanField(default=False)
     attendees_count = IntField(default=0)
+    # Maintained by backend/favorites.py next to User.favorite_events
+    favorites_count = IntField(default=0)
+
+    hall_layout = EmbeddedDocumentField(HallLayout)
+    # Demand pricing steps, see backend/pricing.py; empty means fixed prices
+    demand_pricing = EmbeddedDocumentListField(PriceStep)
+    # Set on a series: the event is the template and ``date`` its first occurrence
+    recurrence = EmbeddedDocumentField(Recurrence)
+    # Set on a materialized occurrence of a series
+    series_id = StringField()
+    # Buyers admitted per minute through the waiting room; unset means no queue
+    admission_rate = IntField(min_value=0)
 
     created_by = StringField()
 
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
 
-    meta = {"collection": "events", "ordering": ["-created_at"], "strict": False}
+    meta = {
+        "collection": "events",
+        "ordering": ["-created_at"],
+        "strict": False,
+        "indexes": [
+            ("status", "-updated_at"),
+            ("created_by", "-updated_at"),
+            ("date", "time"),
+            {"fields": ("series_id", "date"), "partialFilterExpression": {"series_id": {"$exists": True}}},
+        ],
+    }
 
     def to_json_safe(self):
         def safe_date(value):
@@ -120,6 +191,7 @@ class Event(Document):
         self.updated_at = datetime.utcnow()
         return super(Event, self).save(*args, **kwargs)
 
+
 class Seat(EmbeddedDocument):
     row = IntField(required=True)
     column = IntField(required=True)
@@ -143,11 +215,159 @@ class Booking(Document):
         choices=["Confirmed", "Cancelled", "Pending"], default="Confirmed"
     )
 
+    cancelled_at = DateTimeField()
+    refund_amount = FloatField()
+    refund_status = StringField(choices=["Pending", "Refunded", "Not required"])
+
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
 
-    meta = {"collection": "bookings", "ordering": ["-created_at"], "strict": False}
+    meta = {
+        "collection": "bookings",
+        "ordering": ["-created_at"],
+        "strict": False,
+        # See backend/sharding.py; mongoengine adds it to save/update/delete filters
+        "shard_key": ("user_email",),
+        "indexes": [("user_email", "-created_at"), "event_id"],
+    }
 
     def save(self, *args, **kwargs):
         self.updated_at = datetime.utcnow()
         return super().save(*args, **kwargs)
+
+
+class EventBooking(Document):
+    """Per-event copy of a booking, sharded by ``event_id`` (see backend/sharding.py).
+
+    ``bookings`` is sharded by owner, so per-event questions (sold seats,
+    cancellations since a check-in sync, bookers of an event) read this
+    instead and stay on one shard. It shares the booking's ``_id`` and is
+    written in the booking's transaction (backend/booking.py).
+    """
+    event_id = StringField(required=True)
+    user_email = StringField(required=True)
+    num_tickets = IntField(default=1)
+    total_price = FloatField()
+    # Seat-index ordinals of the booked seats
+    ordinals = ListField(IntField())
+    booking_status = StringField(choices=["Confirmed", "Cancelled", "Pending"], default="Confirmed")
+    created_at = DateTimeField(default=datetime.utcnow)
+    cancelled_at = DateTimeField()
+
+    meta = {
+        "collection": "event_bookings",
+        "strict": False,
+        "shard_key": ("event_id",),
+        "indexes": [
+            ("event_id", "booking_status"),
+            ("event_id", "created_at"),
+            {"fields": ["event_id", "cancelled_at"], "partialFilterExpression": {"cancelled_at": {"$exists": True}}},
+        ],
+    }
+
+
+class SeatInventory(Document):
+    """Taken seats of an event as seat-index ordinals, one document per event.
+
+    Seat claims are conditional single-document updates, so two buyers can
+    never hold the same ordinal and no bookings scan is needed to answer
+    availability.
+    """
+    event_id = StringField(required=True, unique=True)
+    taken = ListField(IntField())
+    version = IntField(default=0)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {"collection": "seat_inventory", "strict": False, "shard_key": ("event_id",)}
+
+
+class IdempotencyRecord(Document):
+    """First response of a write request, replayed for retries with the same key"""
+    key = StringField(required=True)
+    user_id = StringField(required=True)
+    endpoint = StringField(required=True)
+    request_hash = StringField()
+    state = StringField(choices=["in_progress", "completed"], default="in_progress")
+    status_code = IntField()
+    response = DictField()
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "collection": "idempotency_keys",
+        "strict": False,
+        "shard_key": ("user_id",),
+        "indexes": [
+            {"fields": ["user_id", "endpoint", "key"], "unique": True},
+            {"fields": ["created_at"], "expireAfterSeconds": 24 * 60 * 60},
+        ],
+    }
+
+
+class RelatedEvents(Document):
+    """Precomputed top related events of one event, best first"""
+    event_id = StringField(required=True, unique=True)
+    # [{"event_id": ..., "score": ...}]
+    related = ListField(DictField())
+    # Copied from the event so new or edited events can invalidate matching lists
+    category = StringField()
+    city = StringField()
+    stale = BooleanField(default=False)
+    computed_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "collection": "related_events",
+        "strict": False,
+        "shard_key": ("event_id",),
+        "indexes": ["category", "city", "related.event_id"],
+    }
+
+
+class Job(Document):
+    """A unit of background work; see backend/jobs.py"""
+    name = StringField(required=True)
+    payload = DictField()
+    status = StringField(choices=["queued", "running", "done", "dead"], default="queued")
+    attempts = IntField(default=0)
+    max_attempts = IntField(default=5)
+    run_at = DateTimeField(default=datetime.utcnow)
+    locked_by = StringField()
+    locked_until = DateTimeField()
+    last_error = StringField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    finished_at = DateTimeField()
+
+    meta = {
+        "collection": "jobs",
+        "strict": False,
+        "indexes": [
+            ("status", "run_at"),
+            ("status", "locked_until"),
+            # Finished jobs are kept a week for inspection; dead ones until handled
+            {
+                "fields": ["finished_at"],
+                "expireAfterSeconds": 7 * 24 * 60 * 60,
+                "partialFilterExpression": {"status": "done"},
+            },
+        ],
+    }
+
+
+class CheckIn(Document):
+    """A seat admitted at the door; see backend/checkin.py"""
+    event_id = StringField(required=True)
+    ordinal = IntField(required=True)
+    booking_id = StringField(required=True)
+    checked_in_by = StringField()
+    checked_in_at = DateTimeField(default=datetime.utcnow)
+    # When the server stored it; scans made offline arrive later than they happened
+    recorded_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "collection": "check_ins",
+        "strict": False,
+        "indexes": [
+            # A seat is admitted once, whichever worker scanned it
+            {"fields": ("event_id", "ordinal"), "unique": True},
+            ("event_id", "recorded_at"),
+        ],
+    }
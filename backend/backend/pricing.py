@@ -0,0 +1,113 @@
+"""Server-side ticket prices.
+
+A seat costs the price of its row's tier (``HallLayout.price_tiers``), or
+the event's flat ``price`` when the row has no priced tier. Free events
+cost nothing. ``Event.demand_pricing`` optionally adds steps such as
+"from 80% sold, x1.25": the multiplier of the highest step reached applies
+to every seat.
+
+The price of each row only depends on the seat index (which already
+carries the tier table), the flat price and the multiplier, so the table
+is built once per combination and shared by every request. Demand only
+picks the multiplier from the inventory the booking path loads anyway,
+which makes pricing a checkout a few tuple lookups.
+"""
+import math
+from functools import lru_cache
+
+from .models import PriceStep
+
+# Client totals within this of the server's are the same price
+TOLERANCE = 0.005
+
+
+class PriceChanged(Exception):
+    """The client was shown another price than the server computes now"""
+
+    def __init__(self, expected):
+        super().__init__(f"Ticket prices have changed, the total is now {expected:.2f}")
+        self.expected = expected
+
+
+def steps_from_list(data):
+    """Validate demand pricing steps from request data"""
+    if not isinstance(data, list):
+        raise ValueError("demand_pricing must be a list of steps")
+    steps = []
+    for step in data:
+        try:
+            sold_ratio, multiplier = float(step["sold_ratio"]), float(step["multiplier"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each demand pricing step needs a sold_ratio and a multiplier")
+        if not 0 <= sold_ratio <= 1 or not math.isfinite(multiplier) or multiplier <= 0:
+            raise ValueError("sold_ratio must be between 0 and 1 and multiplier positive")
+        steps.append(PriceStep(sold_ratio=sold_ratio, multiplier=multiplier))
+    return sorted(steps, key=lambda s: s.sold_ratio)
+
+
+def demand_multiplier(event, index, inventory):
+    steps = getattr(event, "demand_pricing", None)
+    if not steps or inventory is None or not index.capacity:
+        return 1.0
+    sold = len(inventory.taken) / index.capacity
+    multiplier = 1.0
+    for step in sorted(steps, key=lambda s: s.sold_ratio):
+        if sold >= step.sold_ratio:
+            multiplier = step.multiplier
+    return multiplier
+
+
+@lru_cache(maxsize=1024)
+def row_prices(index, flat_price, multiplier=1.0):
+    """Price of a seat in each global row (position 0 is row 1)"""
+    tiers = index.layout.get("price_tiers") or {}
+    return tuple(
+        round(float(tiers.get(tier, flat_price) if tier else flat_price) * multiplier, 2)
+        for tier in index.row_tiers
+    )
+
+
+def price_table(event, index, inventory=None):
+    """``(row prices, multiplier)`` of an event right now"""
+    if event.ticket_type == "Free":
+        return (0.0,) * index.num_rows, 1.0
+    multiplier = demand_multiplier(event, index, inventory)
+    return row_prices(index, float(event.price or 0), multiplier), multiplier
+
+
+def seats_total(event, index, ordinals, inventory=None):
+    rows = price_table(event, index, inventory)[0]
+    return round(sum(rows[index.seat(o)[0] - 1] for o in ordinals), 2)
+
+
+def checkout_total(event, index, ordinals, inventory=None, offered=None):
+    """The amount to charge for ``ordinals``.
+
+    ``offered`` is the total the client showed the buyer; PriceChanged is
+    raised when it differs. Donation events take any offer of at least the
+    computed price.
+    """
+    expected = seats_total(event, index, ordinals, inventory)
+    if offered is None:
+        return expected
+    offered = round(float(offered), 2)
+    if event.ticket_type == "Donation" and offered >= expected - TOLERANCE:
+        return offered
+    if abs(offered - expected) > TOLERANCE:
+        raise PriceChanged(expected)
+    return expected
+
+
+def describe(event, index, inventory=None):
+    """Prices as served to clients"""
+    rows, multiplier = price_table(event, index, inventory)
+    tiers = index.layout.get("price_tiers") or {}
+    if event.ticket_type == "Free":
+        tiers = {name: 0.0 for name in tiers}
+    return {
+        "ticket_type": event.ticket_type,
+        "default": 0.0 if event.ticket_type == "Free" else round(float(event.price or 0) * multiplier, 2),
+        "tiers": {name: round(float(price) * multiplier, 2) for name, price in tiers.items()},
+        "multiplier": multiplier,
+        "rows": list(rows),
+    }
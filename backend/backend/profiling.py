@@ -0,0 +1,239 @@
+"""Opt-in sampling profiler for live workers.
+
+An admin starts a session with ``POST /api/admin/profile/``. The session
+has a duration, a per-request sampling ``rate``, a sampling interval and
+optionally the views to watch. It is kept in the shared cache, so every
+worker picks it up within a second. ``ProfilingMiddleware`` then marks a
+``rate`` share of the requests to ``backend.views`` views. While such a
+request runs, a sampler thread in that worker reads its stack from
+``sys._current_frames()`` every interval. There is no tracing hook, and
+requests that are not sampled pay one dictionary lookup.
+
+Each worker adds its counts under its own slot in the cache about once a
+second. ``GET /api/admin/profile/`` merges them: ``?output=collapsed``
+returns collapsed stacks (``view;module:function;... count``) for
+flamegraph.pl or speedscope, and the default JSON adds the top functions
+by self samples. Nothing runs unless ``PROFILING["ENABLED"]`` is set, and
+the endpoint refuses sessions unless ``PROFILING["SHARED_CACHE"]`` says the
+default cache is shared by the workers (a per-process cache would only
+reach the worker that answered the request).
+"""
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULTS = {
+    "ENABLED": False,
+    "SHARED_CACHE": False,
+    "MAX_SECONDS": 300,
+    "INTERVAL_MS": 10,
+    "MAX_DEPTH": 96,
+    "RESULT_SECONDS": 60 * 60,
+    "MAX_WORKERS": 64,
+}
+
+SESSION_KEY = "profiling:session"
+LAST_KEY = "profiling:last"
+SLOT_KEY = "profiling:%s:slot:%d"
+STACKS_KEY = "profiling:%s:stacks:%d"
+# How often a worker looks for a new session
+CHECK_SECONDS = 1.0
+
+
+def conf():
+    return {**DEFAULTS, **getattr(settings, "PROFILING", {})}
+
+
+def start(seconds, rate, interval_ms=None, views=()):
+    c = conf()
+    now = time.time()
+    session = {
+        "id": uuid.uuid4().hex[:12],
+        "started_at": now,
+        "until": now + seconds,
+        "rate": rate,
+        "interval": (interval_ms or c["INTERVAL_MS"]) / 1000,
+        "views": list(views),
+    }
+    cache.set(SESSION_KEY, session, seconds)
+    cache.set(LAST_KEY, session, c["RESULT_SECONDS"])
+    return session
+
+
+def stop():
+    cache.delete(SESSION_KEY)
+
+
+def last_session():
+    return cache.get(LAST_KEY)
+
+
+def collapse(frame, root, max_depth):
+    names = []
+    while frame is not None and len(names) < max_depth:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    names.append(root)
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """Samples the threads of watched requests until its session ends"""
+
+    def __init__(self, session, worker=None):
+        self.session = session
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self.threads = {}
+        self.counts = Counter()
+        self.requests = 0
+        self.slot = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+
+    def watch(self, ident, view):
+        with self.lock:
+            self.threads[ident] = view
+            self.requests += 1
+
+    def unwatch(self, ident):
+        with self.lock:
+            self.threads.pop(ident, None)
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            watched = list(self.threads.items())
+        max_depth = conf()["MAX_DEPTH"]
+        for ident, view in watched:
+            frame = frames.get(ident)
+            if frame is not None:
+                self.counts[collapse(frame, view, max_depth)] += 1
+
+    def run(self):
+        last_flush = time.monotonic()
+        while time.time() < self.session["until"] and not self.stopped.is_set():
+            time.sleep(self.session["interval"])
+            self.sample()
+            if time.monotonic() - last_flush >= CHECK_SECONDS:
+                self.flush()
+                last_flush = time.monotonic()
+                current = cache.get(SESSION_KEY)
+                if current is None or current["id"] != self.session["id"]:
+                    # Stopped, or replaced by a newer session
+                    break
+        self.flush()
+
+    def flush(self):
+        c = conf()
+        session_id = self.session["id"]
+        if self.slot is None:
+            for slot in range(c["MAX_WORKERS"]):
+                if cache.add(SLOT_KEY % (session_id, slot), self.worker, c["RESULT_SECONDS"]):
+                    self.slot = slot
+                    break
+            else:
+                return
+        cache.set(
+            STACKS_KEY % (session_id, self.slot),
+            {"requests": self.requests, "stacks": dict(self.counts)},
+            c["RESULT_SECONDS"],
+        )
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+_session = None
+_checked_at = 0.0
+
+
+def active_session():
+    """The running session, looked up in the cache at most once per CHECK_SECONDS"""
+    global _session, _checked_at
+    now = time.monotonic()
+    if now - _checked_at >= CHECK_SECONDS:
+        _checked_at = now
+        _session = cache.get(SESSION_KEY)
+    if _session is not None and time.time() >= _session["until"]:
+        _session = None
+    return _session
+
+
+def sampler_for(session):
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None or _sampler.session["id"] != session["id"]:
+            if _sampler is not None:
+                _sampler.stopped.set()
+            _sampler = Sampler(session)
+            _sampler.thread.start()
+        return _sampler
+
+
+def results(session_id):
+    """Merged samples of every worker that took part in a session"""
+    requests = 0
+    stacks = Counter()
+    workers = 0
+    for slot in range(conf()["MAX_WORKERS"]):
+        if cache.get(SLOT_KEY % (session_id, slot)) is None:
+            break
+        data = cache.get(STACKS_KEY % (session_id, slot)) or {}
+        workers += 1
+        requests += data.get("requests", 0)
+        stacks.update(data.get("stacks", {}))
+    return {"workers": workers, "requests": requests, "stacks": stacks}
+
+
+def collapsed(stacks):
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks, limit=25):
+    """Functions by self samples (the leaf of each stack)"""
+    own = Counter()
+    for stack, count in stacks.items():
+        own[stack.rsplit(";", 1)[-1]] += count
+    total = sum(stacks.values()) or 1
+    return [
+        {"function": name, "samples": count, "percent": round(100 * count / total, 1)}
+        for name, count in own.most_common(limit)
+    ]
+
+
+class ProfilingMiddleware:
+    """Hands a sampled share of ``backend.views`` requests to the worker's sampler"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            sampler = getattr(request, "_profiler", None)
+            if sampler is not None:
+                sampler.unwatch(threading.get_ident())
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not conf()["ENABLED"]:
+            return None
+        session = active_session()
+        if session is None:
+            return None
+        view = getattr(view_func, "view_class", view_func)
+        if view.__module__ != "backend.views" or (session["views"] and view.__name__ not in session["views"]):
+            return None
+        if random.random() >= session["rate"]:
+            return None
+        request._profiler = sampler_for(session)
+        request._profiler.watch(threading.get_ident(), view.__name__)
+        return None
@@ -0,0 +1,172 @@
+"""Related events, precomputed per event.
+
+Similarity between two events adds up:
+
+* same category / subcategory / city
+* tag overlap (Jaccard)
+* co-booking: users with Confirmed bookings for both events
+
+The top ``RELATED_TOP_K`` candidates of an event are stored in a
+``RelatedEvents`` document. Bookings and event writes only mark the affected
+documents stale, from background jobs (backend/tasks.py) and change-stream
+handlers. Reads keep serving a stale (or older than ``RELATED_MAX_AGE``) list
+and queue a ``refresh_related`` job for it, at most once per
+``RELATED_REFRESH_INTERVAL`` per event, so a hot event's detail views never
+pay for the co-booking aggregation. Only an event without any list yet is
+computed inline.
+"""
+import heapq
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from mongoengine.queryset.visitor import Q
+
+from .jobs import enqueue
+from .models import Booking, Event, EventBooking, RelatedEvents
+from .routing import tolerant
+from .invalidation import on_change
+
+TOP_K = 12
+MAX_AGE = timedelta(hours=6)
+REFRESH_INTERVAL = timedelta(minutes=1)
+WEIGHTS = {
+    "category": 3.0,
+    "subcategory": 1.0,
+    "city": 1.5,
+    "tags": 2.0,
+    "co_booking": 4.0,
+}
+
+FEATURE_FIELDS = ("id", "category", "subcategory", "city", "tags")
+
+
+def _conf(name, default):
+    return getattr(settings, name, default)
+
+
+def similarity(event, other, co_bookers=0, bookers=0):
+    weights = _conf("RELATED_WEIGHTS", WEIGHTS)
+    score = 0.0
+    if event.category and other.category == event.category:
+        score += weights["category"]
+        if event.subcategory and other.subcategory == event.subcategory:
+            score += weights["subcategory"]
+    if event.city and other.city and other.city.lower() == event.city.lower():
+        score += weights["city"]
+    tags, other_tags = set(event.tags or ()), set(other.tags or ())
+    if tags and other_tags:
+        score += weights["tags"] * len(tags & other_tags) / len(tags | other_tags)
+    if co_bookers and bookers:
+        # Share of this event's bookers who also booked the other one
+        score += weights["co_booking"] * co_bookers / bookers
+    return score
+
+
+def co_bookings(event_id):
+    """(number of bookers of ``event_id``, {other event id: shared bookers})"""
+    # Bookers per event come from the copy sharded by event; their other
+    # bookings are then looked up by the bookings shard key
+    bookers = tolerant(EventBooking.objects(event_id=event_id, booking_status="Confirmed")).distinct("user_email")
+    if not bookers:
+        return 0, {}
+    rows = tolerant(Booking.objects(
+        user_email__in=bookers, event_id__ne=event_id, booking_status="Confirmed"
+    )).aggregate([
+        {"$group": {"_id": {"event": "$event_id", "user": "$user_email"}}},
+        {"$group": {"_id": "$_id.event", "count": {"$sum": 1}}},
+    ])
+    return len(bookers), {row["_id"]: row["count"] for row in rows}
+
+
+def upcoming_published():
+    return tolerant(Event.objects(status="Published", date__gte=date.today()))
+
+
+def compute_related(event):
+    """Top-K [(event id, score)] for ``event`` among upcoming published events"""
+    event_id = str(event.id)
+    bookers, shared = co_bookings(event_id)
+
+    match = Q(category=event.category) | Q(city=event.city) | Q(id__in=list(shared))
+    if event.tags:
+        match |= Q(tags__in=event.tags)
+    candidates = upcoming_published().filter(match).exclude("hall_layout").only(*FEATURE_FIELDS)
+
+    scored = []
+    for other in candidates:
+        other_id = str(other.id)
+        if other_id == event_id:
+            continue
+        score = similarity(event, other, shared.get(other_id, 0), bookers)
+        if score > 0:
+            scored.append((score, other_id))
+    top = heapq.nlargest(_conf("RELATED_TOP_K", TOP_K), scored)
+    return [(other_id, round(score, 4)) for score, other_id in top]
+
+
+def refresh_related(event):
+    related = compute_related(event)
+    RelatedEvents.objects(event_id=str(event.id)).update_one(
+        set__related=[{"event_id": other_id, "score": score} for other_id, score in related],
+        set__category=event.category,
+        set__city=event.city,
+        set__stale=False,
+        set__computed_at=datetime.utcnow(),
+        upsert=True,
+    )
+    return related
+
+
+def needs_refresh(record):
+    max_age = _conf("RELATED_MAX_AGE", MAX_AGE)
+    return record.stale or record.computed_at < datetime.utcnow() - max_age
+
+
+def schedule_refresh(event_id):
+    """Queue a recompute, unless one was queued for this event within the interval"""
+    interval = _conf("RELATED_REFRESH_INTERVAL", REFRESH_INTERVAL)
+    if cache.add(f"related:refresh:{event_id}", True, int(interval.total_seconds())):
+        enqueue("refresh_related", {"event_id": event_id})
+
+
+def related_event_ids(event):
+    """Related event ids, best first; a stale list is served while it is recomputed"""
+    event_id = str(event.id)
+    record = RelatedEvents.objects(event_id=event_id).first()
+    if record is None:
+        return [other_id for other_id, _ in refresh_related(event)]
+    if needs_refresh(record):
+        schedule_refresh(event_id)
+    return [entry["event_id"] for entry in record.related]
+
+
+def mark_stale(event_ids):
+    if event_ids:
+        RelatedEvents.objects(event_id__in=list(event_ids)).update(set__stale=True)
+
+
+def event_changed(event_id, category=None, city=None):
+    """An event was created, edited or deleted: lists it may enter or leave go stale"""
+    RelatedEvents.objects(
+        Q(category=category) | Q(city=city) | Q(related__event_id=event_id)
+    ).update(set__stale=True)
+    mark_stale([event_id])
+
+
+def booking_changed(event_id, user_email):
+    # Co-booking scores move for every event this user has booked
+    booked = Booking.objects(user_email=user_email, booking_status="Confirmed").distinct("event_id")
+    mark_stale(set(booked) | {event_id})
+
+
+@on_change("events")
+def event_written(message):
+    event_changed(message["id"], message["doc"].get("category"), message["doc"].get("city"))
+
+
+@on_change("bookings")
+def booking_written(message):
+    doc = message["doc"]
+    if doc.get("user_email") and doc.get("event_id"):
+        booking_changed(doc["event_id"], doc["user_email"])
@@ -0,0 +1,242 @@
+"""Event series: recurrence rules and lazily expanded occurrences.
+
+A series is an Event with a ``recurrence`` rule. Its fields (title, hall,
+prices, time) are the template of every occurrence and its ``date`` is the
+first one. Occurrences are not stored: ``occurrences()`` is a generator
+over the rule that starts at the queried window, and listings only expand
+the dates inside it. An occurrence is addressed as ``<series id>:<date>``.
+
+The first booking of an occurrence materializes it: ``materialize``
+inserts a regular Event with ``series_id`` and ``date`` set, which the
+booking, seat inventory and tickets then use like any other event. The
+booking is validated first against ``occurrence_event``, the same Event
+unsaved, so a rejected booking stores nothing. Its
+``_id`` is derived from the series id and date, so concurrent first
+bookings insert the same document (the loser reads it back) and the
+insert stays on the shard of that id. Listings show a materialized
+occurrence instead of expanding its date again.
+"""
+import hashlib
+import heapq
+from datetime import date, datetime, time as dt_time, timedelta
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from .models import Event, Recurrence
+from .versions import bump
+
+SEPARATOR = ":"
+# 0 = Monday, as in date.weekday()
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+
+def as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def recurrence_from_dict(data):
+    """Validate a recurrence rule from request data"""
+    if not isinstance(data, dict):
+        raise ValueError("recurrence must be an object")
+    freq = data.get("freq")
+    if freq not in ("daily", "weekly", "monthly"):
+        raise ValueError("recurrence.freq must be daily, weekly or monthly")
+    try:
+        interval = int(data.get("interval", 1))
+        count = int(data["count"]) if data.get("count") else None
+        until = as_date(data["until"]) if data.get("until") else None
+        exdates = [as_date(d) for d in data.get("exdates") or []]
+        weekdays = [
+            WEEKDAYS.index(d) if isinstance(d, str) else int(d)
+            for d in data.get("weekdays") or []
+        ]
+    except (TypeError, ValueError):
+        raise ValueError("recurrence has an invalid interval, count, until, exdates or weekdays")
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("recurrence.interval and recurrence.count must be positive")
+    if any(not 0 <= d <= 6 for d in weekdays):
+        raise ValueError("recurrence.weekdays must be MO..SU or 0..6")
+    if weekdays and freq != "weekly":
+        raise ValueError("recurrence.weekdays only applies to weekly series")
+    return Recurrence(
+        freq=freq, interval=interval, weekdays=sorted(set(weekdays)),
+        until=until, count=count, exdates=exdates,
+    )
+
+
+def _daily(start, rule, first):
+    step = rule.interval or 1
+    # Jump straight to the window; k stays the index of the occurrence in the series
+    k = max(0, -(-(first - start).days // step))
+    while True:
+        yield k, start + timedelta(days=k * step)
+        k += 1
+
+
+def _weekly(start, rule, first):
+    step = rule.interval or 1
+    days = sorted(set(rule.weekdays or [start.weekday()]))
+    first_week = [d for d in days if d >= start.weekday()]
+    monday = start - timedelta(days=start.weekday())
+    period = max(0, (first - monday).days // (7 * step))
+    k = len(first_week) + (period - 1) * len(days) if period else 0
+    while True:
+        week = monday + timedelta(weeks=period * step)
+        for d in first_week if period == 0 else days:
+            yield k, week + timedelta(days=d)
+            k += 1
+        period += 1
+
+
+def _monthly(start, rule, first):
+    # Months without the start's day of month are skipped, so no jumping ahead
+    step = rule.interval or 1
+    k = 0
+    month = start.year * 12 + start.month - 1
+    while True:
+        try:
+            day = date(month // 12, month % 12 + 1, start.day)
+        except ValueError:
+            pass
+        else:
+            yield k, day
+            k += 1
+        month += step
+
+
+FREQUENCIES = {"daily": _daily, "weekly": _weekly, "monthly": _monthly}
+
+
+def occurrences(start, rule, window_start=None, window_end=None):
+    """Dates of a series from ``window_start`` on, in order; unbounded without an end"""
+    start = as_date(start)
+    first = max(start, window_start) if window_start else start
+    exdates = set(rule.exdates or ())
+    for k, day in FREQUENCIES[rule.freq](start, rule, first):
+        if rule.count and k >= rule.count:
+            return
+        if (rule.until and day > rule.until) or (window_end and day > window_end):
+            return
+        if day >= first and day not in exdates:
+            yield day
+
+
+def is_occurrence(series, day):
+    return next(occurrences(series.date, series.recurrence, day, day), None) == day
+
+
+def occurrence_id(series_id, day):
+    return f"{series_id}{SEPARATOR}{day.isoformat()}"
+
+
+def split_occurrence_id(event_id):
+    """``(series id, date)`` of an occurrence id, or None for a plain event id"""
+    series_id, sep, day = str(event_id or "").partition(SEPARATOR)
+    if not sep:
+        return None
+    try:
+        return series_id, date.fromisoformat(day)
+    except ValueError:
+        return None
+
+
+def materialized_id(series_id, day):
+    """The ``_id`` an occurrence gets when it is materialized"""
+    return ObjectId(hashlib.sha1(occurrence_id(series_id, day).encode()).digest()[:12])
+
+
+def occurrence_document(series_doc, day):
+    """A series' raw document turned into one of its occurrences"""
+    doc = dict(series_doc)
+    doc.pop("recurrence", None)
+    first = as_date(doc["date"])
+    doc["date"] = datetime.combine(day, dt_time())
+    if doc.get("end_date"):
+        doc["end_date"] = datetime.combine(as_date(doc["end_date"]) + (day - first), dt_time())
+    doc["series_id"] = str(doc.pop("_id"))
+    return doc
+
+
+def get_series(series_id, queryset=None):
+    series = None
+    if ObjectId.is_valid(series_id):
+        series = (queryset or Event.objects).filter(id=series_id, recurrence__ne=None).first()
+    if series is None:
+        raise Event.DoesNotExist(f"No series {series_id}")
+    return series
+
+
+def _occurrence_son(event_id):
+    """The document an occurrence id is materialized as"""
+    series_id, day = split_occurrence_id(event_id)
+    series = get_series(series_id)
+    if not is_occurrence(series, day):
+        raise Event.DoesNotExist(f"{series.title} does not take place on {day}")
+
+    now = datetime.utcnow()
+    doc = occurrence_document(series.to_mongo().to_dict(), day)
+    doc.update(
+        _id=materialized_id(series_id, day), attendees_count=0, favorites_count=0,
+        created_at=now, updated_at=now,
+    )
+    return doc
+
+
+def occurrence_event(event_id):
+    """``(Event, stored)`` of an occurrence id; an unbooked one is built unsaved, writing nothing"""
+    parts = split_occurrence_id(event_id)
+    stored = Event.objects(id=materialized_id(*parts)).first()
+    if stored is not None:
+        return stored, True
+    return Event._from_son(_occurrence_son(event_id)), False
+
+
+def materialize(event_id):
+    """The stored Event of an occurrence id, inserted on first use"""
+    doc = _occurrence_son(event_id)
+    try:
+        Event._get_collection().insert_one(doc)
+        bump("events")
+    except DuplicateKeyError:
+        # Another booking materialized it first
+        pass
+    return Event.objects.get(id=doc["_id"])
+
+
+def stored_event_id(event_id):
+    """What to load for an event id: the occurrence once materialized, else its series"""
+    parts = split_occurrence_id(event_id)
+    if parts is None:
+        return event_id
+    series_id, day = parts
+    oid = materialized_id(series_id, day)
+    if Event.objects(id=oid).only("id").first() is not None:
+        return str(oid)
+    return series_id
+
+
+def expand(series_list, window_start, window_end, materialized=()):
+    """Raw occurrence documents of the series within the window, by date and time.
+
+    ``materialized`` holds the ``(series id, date)`` pairs that are stored
+    events; they come from the listing query and are skipped here.
+    """
+    def stream(series):
+        doc = series.to_mongo().to_dict()
+        series_id = str(series.id)
+        for day in occurrences(series.date, series.recurrence, window_start, window_end):
+            if (series_id, day) not in materialized:
+                occurrence = occurrence_document(doc, day)
+                occurrence["_id"] = occurrence_id(series_id, day)
+                yield occurrence
+
+    return heapq.merge(*(stream(s) for s in series_list), key=listing_key)
+
+
+def listing_key(doc):
+    return as_date(doc["date"]), doc.get("time") or ""
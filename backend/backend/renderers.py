@@ -0,0 +1,88 @@
+"""Fast and compact response renderers.
+
+``ORJSONRenderer`` is the default JSON renderer; it falls back to DRF's
+encoder when orjson is not installed. Dates and times are handed back to
+DRF's encoder, so clients see the same strings (``Z`` for UTC) either way. ``MessagePackRenderer`` (needs
+msgpack) and ``SeatBitmapRenderer`` are picked through the Accept header
+(or ``?format=msgpack`` / ``?format=bitmap``) by views that list them.
+"""
+import datetime
+import decimal
+import uuid
+
+from bson import ObjectId
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_drf_encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    if isinstance(obj, (ObjectId, uuid.UUID, Promise)):
+        return force_str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return _drf_encoder.default(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        return orjson.dumps(
+            data, default=encode_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class SeatBitmapRenderer(BaseRenderer):
+    """Reserved seats as a packed bitmap, one bit per seat-index ordinal.
+
+    Bit ``i`` (most significant bit first) is set when ordinal ``i`` is taken;
+    ordinals follow the row order of the layout endpoint. Views hand over the
+    packed bytes; anything else (errors) is sent as JSON.
+    """
+    media_type = "application/x-seat-bitmap"
+    format = "bitmap"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, bytearray)):
+            return bytes(data)
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = "application/json"
+        return ORJSONRenderer().render(data)
+
+
+COMPACT_RENDERERS = [ORJSONRenderer] + ([MessagePackRenderer] if msgpack is not None else [])
@@ -0,0 +1,74 @@
+"""Read routing between the primary and secondaries.
+
+Everything reads from the primary unless it opts in with ``tolerant()``:
+listings, search, recommendations and analytics that are fine a few
+seconds behind. Those go to a secondary (``secondaryPreferred``), bounded
+by ``READ_ROUTING["MAX_STALENESS_SECONDS"]``, so the primary keeps its
+capacity for booking writes during on-sales. Booking, seat inventory, auth
+and idempotency reads never opt in.
+
+Read-your-writes: after a signed-in user's successful write,
+``ReadYourWritesMiddleware`` keeps that user's tolerant reads on the
+primary for ``STICKY_SECONDS``, so a new event or booking is visible to its
+author right away.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from pymongo.read_preferences import SecondaryPreferred
+
+STICKY_KEY = "routing:primary:%s"
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+DEFAULTS = {
+    "ENABLED": False,
+    # The server rejects values under 90 seconds
+    "MAX_STALENESS_SECONDS": 90,
+    "STICKY_SECONDS": 120,
+}
+
+_preference = None
+
+
+def conf():
+    return {**DEFAULTS, **getattr(settings, "READ_ROUTING", {})}
+
+
+def secondary_preference():
+    global _preference
+    max_staleness = conf()["MAX_STALENESS_SECONDS"]
+    if _preference is None or _preference.max_staleness != max_staleness:
+        _preference = SecondaryPreferred(max_staleness=max_staleness)
+    return _preference
+
+
+def _user_key(request):
+    user = getattr(request, "user", None)
+    if user is None or not getattr(user, "is_authenticated", False):
+        return None
+    return STICKY_KEY % user.id
+
+
+def wants_primary(request):
+    key = _user_key(request) if request is not None else None
+    return key is not None and cache.get(key) is not None
+
+
+def tolerant(queryset, request=None):
+    """``queryset`` read from a secondary, unless routing is off or ``request``'s user just wrote"""
+    if not conf()["ENABLED"] or wants_primary(request):
+        return queryset
+    return queryset.read_preference(secondary_preference())
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method in UNSAFE_METHODS and response.status_code < 400:
+            # DRF sets request.user on the underlying request once it authenticates
+            key = _user_key(request)
+            if key is not None:
+                cache.set(key, 1, conf()["STICKY_SECONDS"])
+        return response
@@ -0,0 +1,91 @@
+"""Shard keys of the collections that grow with booking volume.
+
+``settings.SHARDING["COLLECTIONS"]`` maps a collection to its shard key.
+Bookings are sharded by a hashed ``user_email``: an on-sale spike for one
+event then spreads its inserts over every shard, and the hottest booking
+reads ("my bookings", a booking of the signed-in user, cancellation) carry
+the owner's email. Per-event reads of bookings (sold seats for check-in
+snapshots and inventory backfills, cancellations for check-in syncs, an
+event's bookers) go to ``event_bookings``, a copy written in the booking
+transaction and sharded by ``event_id`` like seat inventories and
+related-event lists.
+
+Every hot query names its collection's shard key, so mongos sends it to a
+single shard; ``targets_single_shard`` checks a filter against the
+configured key and is what the tests use to keep it that way.
+``HOT_QUERIES`` are the shapes of those reads, which ``manage.py
+shard_collections --check`` explains against mongos. ``shard_commands``
+lists the admin commands for ``manage.py shard_collections``, including
+optional zones (``ZONES``) for range keys.
+"""
+from datetime import datetime
+
+from bson import ObjectId
+from django.conf import settings
+
+DEFAULT_COLLECTIONS = {
+    "bookings": {"user_email": "hashed"},
+    "event_bookings": {"event_id": "hashed"},
+    "seat_inventory": {"event_id": "hashed"},
+    "events": {"_id": "hashed"},
+    "related_events": {"event_id": "hashed"},
+    "idempotency_keys": {"user_id": "hashed"},
+}
+
+# (collection, sample filter) of the hot reads, with placeholder values
+HOT_QUERIES = [
+    # My bookings; a booking of the signed-in user
+    ("bookings", {"user_email": "fan@example.com"}),
+    ("bookings", {"_id": ObjectId(), "user_email": "fan@example.com"}),
+    # Check-in snapshots, inventory backfills, bookers, deleting an event
+    ("event_bookings", {"event_id": "sample", "booking_status": "Confirmed"}),
+    # Check-in syncs: seats sold and bookings cancelled since the cursor
+    ("event_bookings", {
+        "event_id": "sample", "booking_status": "Confirmed", "created_at": {"$gte": datetime(2000, 1, 1)},
+    }),
+    ("event_bookings", {
+        "event_id": "sample", "booking_status": "Cancelled", "cancelled_at": {"$gte": datetime(2000, 1, 1)},
+    }),
+    ("seat_inventory", {"event_id": "sample"}),
+    ("related_events", {"event_id": "sample"}),
+    ("events", {"_id": ObjectId()}),
+]
+
+
+def shard_keys():
+    return getattr(settings, "SHARDING", {}).get("COLLECTIONS", DEFAULT_COLLECTIONS)
+
+
+def targets_single_shard(collection, query):
+    """True if ``query`` pins every field of the collection's shard key to one value.
+
+    Unsharded collections always live on a single shard.
+    """
+    key = shard_keys().get(collection)
+    if key is None:
+        return True
+    for field in key:
+        value = query.get(field)
+        if value is None or (isinstance(value, dict) and set(value) - {"$eq"}):
+            return False
+    return True
+
+
+def shard_commands(db_name, conf=None):
+    """Admin commands that shard the configured collections and set up zones"""
+    conf = conf or getattr(settings, "SHARDING", {})
+    collections = conf.get("COLLECTIONS", DEFAULT_COLLECTIONS)
+    commands = [{"enableSharding": db_name}]
+    for collection, key in collections.items():
+        commands.append({"shardCollection": f"{db_name}.{collection}", "key": key})
+    for zone in conf.get("ZONES", ()):
+        for shard in zone["shards"]:
+            commands.append({"addShardToZone": shard, "zone": zone["name"]})
+        for key_range in zone["ranges"]:
+            commands.append({
+                "updateZoneKeyRange": f"{db_name}.{key_range['collection']}",
+                "min": key_range["min"],
+                "max": key_range["max"],
+                "zone": zone["name"],
+            })
+    return commands
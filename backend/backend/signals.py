@@ -0,0 +1,16 @@
+"""Seat inventory and event change notifications.
+
+Sent after the transaction that changed the inventory has committed, with
+``event_id``, ``booking_id``, ``user_email`` and ``ordinals`` (seat index
+ordinals).
+Receivers use them to refresh live seat maps and caches incrementally; they
+are sent with ``send_robust`` so a failing receiver never fails a committed
+booking.
+"""
+from django.dispatch import Signal
+
+seats_claimed = Signal()
+seats_released = Signal()
+
+# Sent with ``event`` after an event is created, edited or deleted
+events_changed = Signal()
@@ -0,0 +1,345 @@
+"""Slow Mongo operation log.
+
+``SlowQueryListener`` is a pymongo command listener registered before the
+client opens (see backend/startup.py). Every command slower than
+``SLOW_QUERIES["THRESHOLD_MS"]`` is written as one JSON line to the
+``backend.slowlog`` logger: when, from which view or job, the command and
+collection, and the *shape* of its filter and sort (values replaced by 1,
+so ``fetch_events`` filter combinations group together).
+
+The first slow read of each shape, and again every
+``EXPLAIN_INTERVAL_SECONDS``, is re-run as ``explain`` with
+``executionStats`` on a background thread; the record then also carries
+the winning plan and the keys/documents examined. Explains are skipped
+when their queue is full rather than slowing requests down.
+
+``getMore`` on awaitData cursors (the change-stream consumer's, see
+backend/invalidation.py) is not timed: it blocks for up to its
+``maxTimeMS`` whenever nothing changed.
+
+Settings LOGGING sends the logger to a rotating file (``LOG_FILE``), which
+``GET /api/admin/slow-queries/`` reads back grouped by shape. Several
+workers on one host share the file; rotation is best-effort between them.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "THRESHOLD_MS": 100,
+    "EXPLAIN": True,
+    "EXPLAIN_INTERVAL_SECONDS": 10 * 60,
+    "LOG_FILE": None,
+    "BACKUP_COUNT": 5,
+}
+
+# Commands worth explaining, and the field that holds their filter
+EXPLAINABLE = {"find": "filter", "aggregate": None, "count": "query", "distinct": "query"}
+FILTER_FIELDS = {"findAndModify": "query", "update": "updates", "delete": "deletes", **EXPLAINABLE}
+IGNORED = {
+    "explain", "hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions", "killCursors",
+    "saslStart", "saslContinue", "abortTransaction", "commitTransaction",
+}
+# Command fields that belong to the session or transaction, not the query
+SESSION_FIELDS = {
+    "lsid", "$db", "$clusterTime", "txnNumber", "autocommit", "startTransaction",
+    "$readPreference", "readConcern", "writeConcern",
+}
+MAX_IN_FLIGHT = 10_000
+
+current_operation = contextvars.ContextVar("slowlog_operation", default=None)
+
+
+def conf():
+    return {**DEFAULTS, **getattr(settings, "SLOW_QUERIES", {})}
+
+
+def awaits_data(name, command):
+    """A getMore that blocks up to its maxTimeMS for new data (change streams, tailable cursors)"""
+    return name == "getMore" and "maxTimeMS" in command
+
+
+@contextmanager
+def operation(name):
+    """Attribute the Mongo commands run inside the block to ``name``"""
+    token = current_operation.set(name)
+    try:
+        yield
+    finally:
+        current_operation.reset(token)
+
+
+def query_shape(value):
+    """``value`` with every literal replaced by 1; operators and field names are kept"""
+    if isinstance(value, dict):
+        return {
+            key: 1 if key in ("$in", "$nin", "$all") else query_shape(v)
+            for key, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [query_shape(v) for v in value]
+    return 1
+
+
+def command_shape(name, command):
+    """Filter (and sort) shape of a command, or of the first statement of a batch"""
+    if name == "aggregate":
+        stages = []
+        for stage in command.get("pipeline", ()):
+            op = next(iter(stage), None)
+            stages.append({op: query_shape(stage[op])} if op in ("$match", "$sort") else op)
+        return {"pipeline": stages}
+    field = FILTER_FIELDS.get(name)
+    if field is None:
+        return {}
+    if name in ("update", "delete"):
+        statements = command.get(field) or [{}]
+        return {"filter": query_shape(statements[0].get("q", {}))}
+    shape = {"filter": query_shape(command.get(field) or {})}
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    if name == "distinct":
+        shape["key"] = command.get("key")
+    return shape
+
+
+def plan_stages(plan):
+    """Winning plan as "STAGE(index) <- ..." from the root stage down"""
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+def _find(document, key):
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_explain(explain):
+    planner = _find(explain, "queryPlanner") or {}
+    stats = _find(explain, "executionStats") or {}
+    return {
+        "plan": plan_stages(planner.get("winningPlan", {})),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "millis": stats.get("executionTimeMillis"),
+    }
+
+
+def write(record):
+    logger.warning(json.dumps(record, default=str, sort_keys=True))
+
+
+class Explainer:
+    """Runs explains one at a time on a daemon thread"""
+
+    def __init__(self, size=100):
+        self.queue = queue.Queue(maxsize=size)
+        self._thread = None
+
+    def submit(self, database, command, record):
+        try:
+            self.queue.put_nowait((database, command, record))
+        except queue.Full:
+            write(record)
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slowlog-explain", daemon=True)
+            self._thread.start()
+
+    def explain(self, database, command):
+        from mongoengine.connection import get_connection
+
+        query = {k: v for k, v in command.items() if k not in SESSION_FIELDS}
+        return get_connection()[database].command({"explain": query, "verbosity": "executionStats"})
+
+    def _run(self):
+        while True:
+            database, command, record = self.queue.get()
+            try:
+                record["explain"] = summarize_explain(self.explain(database, command))
+            except Exception as exc:
+                record["explain"] = {"error": str(exc)}
+            write(record)
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms=None, explain=None, explain_interval=None, explainer=None):
+        c = conf()
+        self.threshold_us = 1000 * (c["THRESHOLD_MS"] if threshold_ms is None else threshold_ms)
+        self.explain = c["EXPLAIN"] if explain is None else explain
+        self.explain_interval = c["EXPLAIN_INTERVAL_SECONDS"] if explain_interval is None else explain_interval
+        self.explainer = explainer or Explainer()
+        self.in_flight = {}
+        self.explained_at = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED or awaits_data(event.command_name, event.command):
+            return
+        if len(self.in_flight) > MAX_IN_FLIGHT:
+            self.in_flight.clear()
+        self.in_flight[(event.connection_id, event.request_id)] = (event.command, current_operation.get())
+
+    def succeeded(self, event):
+        started = self.in_flight.pop((event.connection_id, event.request_id), None)
+        if started is None or event.duration_micros < self.threshold_us:
+            return
+        command, origin = started
+        name = event.command_name
+        collection = command.get(name)
+        record = {
+            "at": datetime.utcnow().isoformat(timespec="milliseconds"),
+            "view": origin,
+            "command": name,
+            "database": event.database_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "shape": command_shape(name, command),
+            "ms": round(event.duration_micros / 1000, 1),
+        }
+        if self.explain and self._explain_due(name, command, record):
+            self.explainer.submit(event.database_name, command, record)
+        else:
+            write(record)
+
+    def failed(self, event):
+        self.in_flight.pop((event.connection_id, event.request_id), None)
+
+    def _explain_due(self, name, command, record):
+        if name not in EXPLAINABLE:
+            return False
+        if name == "aggregate" and any("$out" in s or "$merge" in s for s in command.get("pipeline", ())):
+            return False
+        key = shape_key(record)
+        now = time.monotonic()
+        with self.lock:
+            last = self.explained_at.get(key)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self.explained_at[key] = now
+        return True
+
+
+def shape_key(record):
+    return json.dumps([record.get("collection"), record.get("command"), record.get("shape")], sort_keys=True)
+
+
+_listener = None
+
+
+def install():
+    """Register the listener with pymongo; must run before the client is created"""
+    global _listener
+    if _listener is None and conf()["ENABLED"]:
+        _listener = SlowQueryListener()
+        monitoring.register(_listener)
+    return _listener
+
+
+class SlowQueryMiddleware:
+    """Tags the Mongo commands of a request with the view that ran them"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_operation.set(request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            current_operation.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF's @api_view wraps the function in a class named after it
+        view = getattr(view_func, "view_class", view_func)
+        current_operation.set(f"{view.__module__}.{view.__name__}")
+
+
+def log_files():
+    path = conf()["LOG_FILE"]
+    if not path:
+        return []
+    candidates = [path] + [f"{path}.{i}" for i in range(1, conf()["BACKUP_COUNT"] + 1)]
+    return [p for p in candidates if os.path.exists(p)]
+
+
+def read_records(limit):
+    """Up to ``limit`` most recent records, newest first"""
+    records = []
+    for path in log_files():
+        with open(path, encoding="utf-8") as f:
+            lines = deque(f, maxlen=limit - len(records))
+        for line in reversed(lines):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        if len(records) >= limit:
+            break
+    return records
+
+
+def group_by_shape(records):
+    """One row per query shape, the most total time first"""
+    groups = {}
+    for record in records:
+        key = shape_key(record)
+        group = groups.setdefault(key, {
+            "collection": record.get("collection"),
+            "command": record.get("command"),
+            "shape": record.get("shape"),
+            "views": set(),
+            "durations": [],
+            "explain": None,
+            "last_at": record.get("at"),
+        })
+        group["durations"].append(record.get("ms") or 0)
+        if record.get("view"):
+            group["views"].add(record["view"])
+        # Records are newest first: keep the latest explain
+        if group["explain"] is None and record.get("explain"):
+            group["explain"] = record["explain"]
+
+    rows = []
+    for group in groups.values():
+        durations = sorted(group.pop("durations"))
+        rows.append({
+            **group,
+            "views": sorted(group["views"]),
+            "count": len(durations),
+            "total_ms": round(sum(durations), 1),
+            "p50_ms": durations[len(durations) // 2],
+            "max_ms": durations[-1],
+        })
+    rows.sort(key=lambda row: -row["total_ms"])
+    return rows
@@ -0,0 +1,99 @@
+"""Signed check-in snapshots for scanners that keep working offline.
+
+``build_snapshot`` streams an event's Confirmed bookings (their seat
+ordinals only, from the per-event ``event_bookings`` copy) and packs them,
+big-endian, as::
+
+    header    4s magic b"CHK1", 12s event ObjectId, Q generated_at (ms),
+              I cursor (epoch seconds), I seat count, I record count
+    records   I ordinal, 12s booking ObjectId    -- sorted by ordinal
+    admitted  one bit per seat ordinal, MSB first (already checked in)
+    trailer   32 bytes HMAC-SHA256 of everything above
+
+A scanner validates a ticket by binary search on the records: the seat
+must be sold to the booking named in the ticket, which also rejects
+tickets of cancelled bookings whose seat was sold again. The HMAC key is
+``TICKETS["SNAPSHOT_KEY"]``, provisioned on scanner devices; it is not the
+ticket signing key, so a lost scanner cannot mint tickets.
+
+Scanners then exchange deltas with the check-in sync endpoint, passing
+back the snapshot's ``cursor``: admissions, cancelled bookings and the
+seats sold since, as ``(ordinal, booking id)`` pairs that replace the
+scanner's record for the seat.
+"""
+import hashlib
+import hmac
+import struct
+import time
+
+from bson import ObjectId
+from django.conf import settings
+
+from .checkin import SYNC_OVERLAP
+from .models import EventBooking
+from .tickets import conf
+
+MAGIC = b"CHK1"
+HEADER = struct.Struct(">4s12sQIII")
+RECORD = struct.Struct(">I12s")
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+
+def snapshot_key():
+    return (conf()["SNAPSHOT_KEY"] or settings.SECRET_KEY).encode()
+
+
+def sold_seats(event_id, index, since=None):
+    """``(ordinal, booking ObjectId)`` of every Confirmed seat (booked since ``since``), streamed from Mongo"""
+    query = {"event_id": event_id, "booking_status": "Confirmed"}
+    if since is not None:
+        query["created_at"] = {"$gte": since - SYNC_OVERLAP}
+    cursor = EventBooking._get_collection().find(query, {"ordinals": 1}, batch_size=1000)
+    for doc in cursor:
+        for ordinal in doc.get("ordinals", ()):
+            if 0 <= ordinal < index.size:
+                yield ordinal, doc["_id"]
+
+
+def build_snapshot(event_id, index, admitted=(), cursor=None):
+    """The packed, signed snapshot of an event.
+
+    ``admitted`` are the ordinals already checked in and ``cursor`` the time
+    (epoch seconds) they are current as of; the first delta sync starts there.
+    """
+    now = time.time()
+    records = sorted(sold_seats(event_id, index))
+    body = bytearray(HEADER.pack(
+        MAGIC, ObjectId(event_id).binary, int(now * 1000), int(now if cursor is None else cursor),
+        index.size, len(records),
+    ))
+    for ordinal, booking_id in records:
+        body += RECORD.pack(ordinal, ObjectId(booking_id).binary)
+    body += index.packed(admitted)
+    body += hmac.new(snapshot_key(), body, hashlib.sha256).digest()
+    return bytes(body)
+
+
+def read_snapshot(data):
+    """Verify and unpack a snapshot, as a scanner would; raises ValueError if it was altered"""
+    body, digest = data[:-DIGEST_SIZE], data[-DIGEST_SIZE:]
+    if not hmac.compare_digest(digest, hmac.new(snapshot_key(), body, hashlib.sha256).digest()):
+        raise ValueError("Snapshot signature does not match")
+    magic, event_id, generated_ms, cursor, size, count = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Not a check-in snapshot")
+    offset = HEADER.size
+    seats = {}
+    for _ in range(count):
+        ordinal, booking_id = RECORD.unpack_from(body, offset)
+        seats[ordinal] = str(ObjectId(booking_id))
+        offset += RECORD.size
+    bits = body[offset:offset + (size + 7) // 8]
+    admitted = [o for o in range(size) if bits[o >> 3] & (0x80 >> (o & 7))]
+    return {
+        "event_id": str(ObjectId(event_id)),
+        "generated_at": generated_ms,
+        "cursor": cursor,
+        "seats": seats,
+        "admitted": admitted,
+    }
@@ -0,0 +1,124 @@
+"""Worker startup: lazy Mongo connection, pre-fork preparation, post-fork warmup.
+
+Workers are added while an on-sale is already hot, so a new one should take
+traffic right away. Settings only describe the connection (``MONGODB``);
+``connect()`` registers it when the app loads and pymongo opens the client
+on first use, so importing the app does no network I/O and is safe before
+a fork.
+
+Under gunicorn (gunicorn.conf.py) the master imports the app once and
+``prepare()`` loads everything that needs no I/O, shared copy-on-write by
+the workers. Each forked worker then runs ``warm_up()`` before accepting
+requests: it opens the pool, resolves the primary and fills the caches the
+hot endpoints read. ``manage.py bench_startup`` measures the result.
+"""
+import logging
+import time
+
+from django.conf import settings
+from mongoengine import Document
+from mongoengine.connection import get_connection, register_connection
+
+from . import slowlog
+
+logger = logging.getLogger(__name__)
+
+
+def connect():
+    # Command listeners only reach clients created after they are registered
+    slowlog.install()
+    register_connection("default", **settings.MONGODB)
+
+
+def documents():
+    from . import models
+
+    return [
+        obj for obj in vars(models).values()
+        if isinstance(obj, type) and issubclass(obj, Document) and obj is not Document
+        and not obj._meta.get("abstract")
+    ]
+
+
+def configure_indexes():
+    """Apply ``MONGO_AUTO_CREATE_INDEXES``; without it indexes come from ``manage.py ensure_indexes``"""
+    for document in documents():
+        document._meta["auto_create_index"] = settings.MONGO_AUTO_CREATE_INDEXES
+
+
+def _timed(steps):
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A worker that could not warm up still serves, just slower at first
+            logger.exception("Startup step %s failed", name)
+        timings[name] = time.perf_counter() - start
+    logger.info("Startup: %s", ", ".join(f"{name} {t * 1000:.0f} ms" for name, t in timings.items()))
+    return timings
+
+
+def _load_urls():
+    from django.urls import get_resolver
+
+    # Imports the views and everything they use
+    get_resolver().url_patterns
+
+
+def _load_api_settings():
+    from rest_framework.settings import api_settings
+
+    for name in (
+        "DEFAULT_AUTHENTICATION_CLASSES", "DEFAULT_PERMISSION_CLASSES", "DEFAULT_THROTTLE_CLASSES",
+        "DEFAULT_RENDERER_CLASSES", "DEFAULT_PARSER_CLASSES",
+    ):
+        getattr(api_settings, name)
+
+
+def _load_numpy():
+    import numpy  # noqa: F401
+
+
+def _default_hall():
+    from .hall import seat_index_for
+
+    seat_index_for(None)
+
+
+def prepare():
+    """Import and build what needs no I/O; safe before fork"""
+    return _timed([
+        ("urls", _load_urls),
+        ("api settings", _load_api_settings),
+        ("numpy", _load_numpy),
+        ("default hall", _default_hall),
+    ])
+
+
+def _open_pool():
+    get_connection().admin.command("ping")
+    for document in documents():
+        document._get_collection()
+
+
+def _start_bus():
+    from .invalidation import get_bus
+
+    get_bus()
+
+
+def _build_feed():
+    from .feed import get_matrix
+
+    get_matrix()
+
+
+def warm_up():
+    """Open connections and fill caches in a freshly forked worker; never raises"""
+    return _timed([
+        ("mongo", _open_pool),
+        ("invalidation bus", _start_bus),
+        ("feed matrix", _build_feed),
+    ])
@@ -0,0 +1,115 @@
+"""Side effects of bookings and event writes, run by ``manage.py run_jobs``.
+
+Bookings enqueue their jobs inside the booking transaction (see
+backend/booking.py), so a confirmation is sent exactly for bookings that
+committed and never slows down the booking request. Jobs run at least
+once: emails may rarely be sent twice, the other handlers are idempotent.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.dispatch import receiver
+
+from . import recommendations
+from .geocoding import geocode_event
+from .jobs import enqueue, job
+from .models import Booking, Event, RelatedEvents
+from .signals import events_changed
+from .tickets import booking_tickets, conf as tickets_conf, forget_tickets
+
+
+EVENT_FIELDS = ("title", "date", "time", "location", "city", "organizer_email", "hall_layout")
+
+
+def event_details(booking, event):
+    """Title and "date at time, place" of a booking, from its event when it still exists"""
+    if event is None:
+        return booking.event_title or "your event", (
+            f"{booking.event_date} at {booking.event_time}, {booking.event_location}"
+        )
+    place = ", ".join(p for p in (event.location, event.city) if p)
+    return event.title, f"{event.date} at {event.time}, {place}"
+
+
+@job("booking_confirmed")
+def booking_confirmed(booking_id, event_id, user_email):
+    booking = Booking.objects(pk=booking_id, user_email=user_email).first()
+    if booking is None:
+        return
+    event = Event.objects(pk=event_id).only(*EVENT_FIELDS).first()
+    if event is not None and tickets_conf()["PRERENDER"]:
+        # Render the QR codes now so the tickets page is served from cache
+        booking_tickets(booking, event)
+    title, when = event_details(booking, event)
+    seats = ", ".join(f"row {s.row} seat {s.column}" for s in booking.seats) or "general admission"
+    send_mail(
+        f"Your booking for {title}",
+        f"Hi {booking.user_name or user_email},\n\n"
+        f"You booked {booking.num_tickets} ticket(s) for {title} on {when}.\n"
+        f"Seats: {seats}\nTotal: {booking.total_price:.2f}\nBooking reference: {booking_id}\n"
+        "Your tickets are in the app under My bookings.\n",
+        settings.DEFAULT_FROM_EMAIL,
+        [user_email],
+    )
+    if event is not None and event.organizer_email:
+        send_mail(
+            f"New booking for {event.title}",
+            f"{booking.num_tickets} ticket(s) were booked for {event.title} (booking {booking_id}).\n",
+            settings.DEFAULT_FROM_EMAIL,
+            [event.organizer_email],
+        )
+    recommendations.booking_changed(event_id, user_email)
+
+
+@job("booking_cancelled")
+def booking_cancelled(booking_id, event_id, user_email):
+    booking = Booking.objects(pk=booking_id, user_email=user_email).first()
+    if booking is None:
+        return
+    forget_tickets(booking_id)
+    title, when = event_details(booking, Event.objects(pk=event_id).only(*EVENT_FIELDS).first())
+    refund = booking.refund_amount or 0
+    send_mail(
+        f"Your booking for {title} was cancelled",
+        f"Hi {booking.user_name or user_email},\n\n"
+        f"Your booking {booking_id} for {title} on {when} was cancelled.\n"
+        + (f"A refund of {refund:.2f} is on its way.\n" if refund else ""),
+        settings.DEFAULT_FROM_EMAIL,
+        [user_email],
+    )
+    recommendations.booking_changed(event_id, user_email)
+
+
+@job("refresh_related")
+def refresh_related(event_id):
+    record = RelatedEvents.objects(event_id=event_id).first()
+    if record is not None and not recommendations.needs_refresh(record):
+        # Another job got there first
+        return
+    event = Event.objects(pk=event_id).only(*recommendations.FEATURE_FIELDS).first()
+    if event is not None:
+        recommendations.refresh_related(event)
+
+
+@job("event_changed")
+def event_changed(event_id, category=None, city=None):
+    recommendations.event_changed(event_id, category, city)
+
+
+@job("geocode_event")
+def geocode_new_event(event_id):
+    """Fill the point of an event created without coordinates; ``geocode_events`` retries misses"""
+    event = Event.objects(pk=event_id, geo_point=None).only("address", "location", "city").first()
+    if event is None:
+        return
+    point = geocode_event(event)
+    if point is not None:
+        Event.objects(pk=event_id, geo_point=None).update_one(
+            set__geo_point=list(point), set__updated_at=datetime.utcnow(),
+        )
+
+
+@receiver(events_changed)
+def enqueue_event_changed(sender, event, **kwargs):
+    enqueue("event_changed", {"event_id": str(event.id), "category": event.category, "city": event.city})
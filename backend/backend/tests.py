@@ -1,4 +1,4 @@
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, SimpleTestCase, RequestFactory, override_settings
 from unittest.mock import patch, MagicMock, PropertyMock
 import json
 from datetime import datetime
@@ -27,8 +27,14 @@ def make_event(**kwargs):
     event = MagicMock()
     event.id = kwargs.get("id", "event123")
     event.title = kwargs.get("title", "Test Event")
+    event.date = kwargs.get("date", "2025-06-01")
+    event.time = kwargs.get("time", "18:00")
+    event.location = kwargs.get("location", "Arena")
+    event.city = kwargs.get("city", "Warsaw")
     event.created_by = kwargs.get("created_by", "test@example.com")
     event.attendees_count = kwargs.get("attendees_count", 0)
+    event.hall_layout = kwargs.get("hall_layout")
+    event.recurrence = kwargs.get("recurrence")
     return event
 
 
@@ -621,4 +627,2118 @@ class UpdateCurrentUserTests(TestCase):
         response = update_current_user(request)
 
         self.assertEqual(response.status_code, 200)
-        mock_user.save.assert_called_once()
\ No newline at end of file
+        mock_user.save.assert_called_once()
+
+
+class SeatIndexTests(SimpleTestCase):
+
+    def make_layout(self):
+        from backend.hall import layout_from_dict, layout_to_dict
+
+        layout = layout_from_dict({
+            "name": "Club",
+            "price_tiers": {"A": 80, "B": 40},
+            "sections": [
+                {"name": "Floor", "price_tier": "A", "rows": [{"seats": 4}, {"seats": 6, "blocked": [3]}]},
+                {"name": "Balcony", "price_tier": "B", "rows": [{"seats": 5, "seat_type": "wheelchair"}]},
+            ],
+        })
+        return layout_to_dict(layout)
+
+    def test_default_layout_matches_legacy_grid(self):
+        """Events without a layout keep the 8x10 grid."""
+        from backend.hall import seat_index_for
+
+        index = seat_index_for(make_event(hall_layout=None))
+        self.assertEqual(index.capacity, 80)
+        self.assertEqual(index.ordinal(8, 10), 79)
+        self.assertIsNone(index.ordinal(9, 1))
+
+    def test_ordinals_round_trip_across_sections(self):
+        """Rows are numbered globally and blocked seats are not sellable."""
+        from backend.hall import SeatIndex
+
+        index = SeatIndex(self.make_layout())
+        self.assertEqual(index.capacity, 14)
+        self.assertIsNone(index.ordinal(2, 3))
+        self.assertEqual(index.ordinal(3, 1), 10)
+        self.assertEqual(index.seat(10), (3, 1))
+        self.assertEqual(index.row_tiers, ["A", "A", "B"])
+        self.assertEqual(list(index.bitmap([0])[:7]), [1, 0, 0, 0, 0, 0, 1])
+
+    def test_layout_rejects_unknown_tier(self):
+        """Rows referencing an undeclared price tier are rejected."""
+        from backend.hall import layout_from_dict
+
+        with self.assertRaises(ValueError):
+            layout_from_dict({
+                "price_tiers": {"A": 10},
+                "sections": [{"name": "Main", "rows": [{"seats": 3, "price_tier": "Z"}]}],
+            })
+
+    def test_seat_ordinals_rejects_duplicates(self):
+        """The same seat twice in one request is invalid."""
+        from backend.hall import SeatIndex, default_layout_dict
+        from backend.inventory import seat_ordinals
+
+        index = SeatIndex(default_layout_dict())
+        ordinals, bad = seat_ordinals(index, [{"row": 1, "column": 1}, {"row": 1, "column": 1}])
+        self.assertIsNone(ordinals)
+        self.assertEqual(bad, {"row": 1, "column": 1})
+
+    def test_index_is_looked_up_by_stored_fingerprint(self):
+        """Saved layouts carry a fingerprint and requests do not re-walk them."""
+        from backend.hall import layout_from_dict, seat_index_for
+
+        data = {"sections": [{"name": "Main", "rows": [{"seats": 3}, {"seats": 4}]}]}
+        layout = layout_from_dict(data)
+        self.assertEqual(layout.fingerprint, layout_from_dict(data).fingerprint)
+        index = seat_index_for(make_event(hall_layout=layout))
+        reloaded = layout_from_dict(data)
+        with patch("backend.hall.layout_to_dict") as to_dict:
+            self.assertIs(seat_index_for(make_event(hall_layout=reloaded)), index)
+        to_dict.assert_not_called()
+        self.assertEqual(index.capacity, 7)
+
+
+
+class BestAvailableTests(SimpleTestCase):
+
+    def make_index(self):
+        from backend.hall import SeatIndex
+
+        return SeatIndex({
+            "name": "Theatre",
+            "price_tiers": {},
+            "sections": [
+                {"name": "Balcony", "score": 1, "rows": [{"seats": 10}]},
+                {"name": "Stalls", "score": 5, "rows": [{"seats": 10}, {"seats": 10}]},
+            ],
+        })
+
+    def test_prefers_highest_scored_section_and_centre(self):
+        """The centre of the best-scored row is offered first."""
+        from backend.allocation import find_best_seats
+
+        index = self.make_index()
+        ordinals = find_best_seats(index, index.bitmap([]), 2)
+        self.assertEqual([index.seat(o) for o in ordinals], [(2, 5), (2, 6)])
+
+    def test_skips_rows_without_a_long_enough_run(self):
+        """Rows whose free runs are too short are skipped."""
+        from backend.allocation import find_best_seats
+
+        index = self.make_index()
+        # Every third seat of the first stalls row is taken
+        taken = [index.ordinal(2, c) for c in (3, 6, 9)]
+        ordinals = find_best_seats(index, index.bitmap(taken), 3)
+        self.assertEqual([index.seat(o) for o in ordinals], [(3, 5), (3, 6), (3, 7)])
+
+    def test_respects_section_filter_and_exhaustion(self):
+        """A section filter limits the search; None means nothing fits."""
+        from backend.allocation import find_best_seats
+
+        index = self.make_index()
+        ordinals = find_best_seats(index, index.bitmap([]), 4, section="Balcony")
+        self.assertEqual({index.seat(o)[0] for o in ordinals}, {1})
+        self.assertIsNone(find_best_seats(index, index.bitmap([]), 11))
+
+
+@override_settings(ADMISSION_QUEUE={"BURST": 2, "PASS_TTL": 600})
+class AdmissionQueueTests(SimpleTestCase):
+
+    def setUp(self):
+        from backend.admission import InMemoryQueueBackend
+
+        self.factory = RequestFactory()
+        self.backend = InMemoryQueueBackend()
+        patcher = patch("backend.admission.get_backend", return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rejoining_keeps_queue_position(self):
+        """A buyer joining twice keeps their original sequence number."""
+        self.backend.open("event123", 60, now=0)
+        first = self.backend.join("event123", "alice")
+        self.backend.join("event123", "bob")
+        self.assertEqual(self.backend.join("event123", "alice"), first)
+
+    def test_buyers_are_admitted_at_the_configured_rate(self):
+        """After the burst, one buyer per second is admitted at 60/min."""
+        from backend.admission import queue_status
+
+        self.backend.open("event123", 60, now=1000)
+        self.assertTrue(queue_status("event123", 1, "u1", now=1000)["admitted"])
+
+        waiting = queue_status("event123", 4, "u4", now=1000)
+        self.assertFalse(waiting["admitted"])
+        self.assertEqual(waiting["position"], 3)
+        self.assertTrue(queue_status("event123", 4, "u4", now=1003)["admitted"])
+
+    def test_pass_is_bound_to_event_and_user(self):
+        """An admission pass only works for the event and user it was issued to."""
+        from backend.admission import queue_status, has_valid_pass
+
+        self.backend.open("event123", 60, now=1000)
+        token = queue_status("event123", 0, "u1", now=1000)["pass"]
+        request = self.factory.post("/api/bookings/", HTTP_X_ADMISSION_PASS=token)
+
+        self.assertTrue(has_valid_pass(request, "event123", "u1"))
+        self.assertFalse(has_valid_pass(request, "event123", "u2"))
+        self.assertFalse(has_valid_pass(request, "other", "u1"))
+
+
+class TokenBucketThrottleTests(SimpleTestCase):
+
+    def setUp(self):
+        from backend.throttling import LocalBucketStore
+
+        self.factory = RequestFactory()
+        self.store = LocalBucketStore()
+        patcher = patch("backend.throttling.get_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_refills_over_time(self):
+        """An empty bucket reports the wait until the next token."""
+        self.assertEqual(self.store.take("k", 2, 0.5, now=0), 0)
+        self.assertEqual(self.store.take("k", 2, 0.5, now=0), 0)
+        self.assertEqual(self.store.take("k", 2, 0.5, now=0), 2.0)
+        self.assertEqual(self.store.take("k", 2, 0.5, now=2), 0)
+
+    @override_settings(TOKEN_BUCKETS={"booking": {"capacity": 1, "refill_rate": 0.1}})
+    def test_throttled_view_returns_retry_after(self):
+        """The second request inside the refill window gets 429 with Retry-After."""
+        from rest_framework.decorators import api_view, throttle_classes
+        from rest_framework.response import Response
+        from backend.throttling import BookingThrottle
+
+        @api_view(["GET"])
+        @throttle_classes([BookingThrottle])
+        def view(request):
+            return Response({"ok": True})
+
+        self.assertEqual(view(self.factory.get("/")).status_code, 200)
+        response = view(self.factory.get("/"))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "10")
+
+    def test_authenticated_users_get_their_own_bucket(self):
+        """Users are keyed by id, anonymous clients by IP."""
+        from backend.throttling import TokenBucketThrottle
+
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1")
+        request.user = make_user(id="u1")
+        throttle = TokenBucketThrottle()
+        self.assertEqual(throttle.get_cache_key(request, None), "throttle:default:user:u1")
+
+        request.user = MagicMock(is_authenticated=False)
+        self.assertEqual(throttle.get_cache_key(request, None), "throttle:default:ip:10.0.0.1")
+
+
+class IdempotencyTests(SimpleTestCase):
+
+    def setUp(self):
+        from rest_framework.test import APIRequestFactory
+
+        self.factory = APIRequestFactory()
+        self.calls = 0
+
+    def make_view(self, status_code=201):
+        from rest_framework.decorators import api_view
+        from rest_framework.response import Response
+        from backend.idempotency import idempotent
+
+        @api_view(["POST"])
+        @idempotent
+        def create_thing(request):
+            self.calls += 1
+            return Response({"id": "new"}, status=status_code)
+
+        return create_thing
+
+    def post(self, view, data, key="key-1"):
+        from rest_framework.test import force_authenticate
+
+        request = self.factory.post("/", data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=make_user())
+        return view(request)
+
+    def existing_record(self, MockRecord, data, **kwargs):
+        from mongoengine.errors import NotUniqueError
+        from backend.idempotency import request_fingerprint
+
+        request = MagicMock(data=data)
+        record = MagicMock(request_hash=request_fingerprint(request), **kwargs)
+        MockRecord.return_value.save.side_effect = NotUniqueError()
+        MockRecord.objects.return_value.first.return_value = record
+        return record
+
+    @patch("backend.idempotency.IdempotencyRecord")
+    def test_first_request_records_response(self, MockRecord):
+        """The first request runs the view and stores its response."""
+        response = self.post(self.make_view(), {"seats": [1]})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.calls, 1)
+        MockRecord.return_value.update.assert_called_once_with(
+            set__state="completed", set__status_code=201, set__response={"id": "new"}
+        )
+
+    @patch("backend.idempotency.IdempotencyRecord")
+    def test_retry_replays_stored_response(self, MockRecord):
+        """A retry with the same key and body replays without running the view."""
+        self.existing_record(
+            MockRecord, {"seats": [1]}, state="completed", status_code=201, response={"id": "first"}
+        )
+        response = self.post(self.make_view(), {"seats": [1]})
+
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(response.data, {"id": "first"})
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+
+    @patch("backend.idempotency.IdempotencyRecord")
+    def test_key_reuse_with_different_body_is_rejected(self, MockRecord):
+        """Reusing a key for a different payload returns 422."""
+        self.existing_record(MockRecord, {"seats": [1]}, state="completed")
+        response = self.post(self.make_view(), {"seats": [2]})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 0)
+
+    @patch("backend.idempotency.IdempotencyRecord")
+    def test_server_errors_are_not_recorded(self, MockRecord):
+        """A 5xx response frees the key so the client can retry."""
+        self.post(self.make_view(status_code=500), {"seats": [1]})
+
+        MockRecord.return_value.delete.assert_called_once()
+        MockRecord.return_value.update.assert_not_called()
+
+    @patch("backend.idempotency.IdempotencyRecord")
+    def test_transient_refusals_are_not_recorded(self, MockRecord):
+        """A queue 403 or a "seats/prices changed" 409 may succeed on retry, so it is not replayed."""
+        for status_code in (403, 409, 429):
+            MockRecord.reset_mock()
+            self.post(self.make_view(status_code=status_code), {"seats": [1]})
+            MockRecord.return_value.delete.assert_called_once()
+            MockRecord.return_value.update.assert_not_called()
+
+
+class TransactionTests(SimpleTestCase):
+
+    def make_client(self):
+        session = MagicMock()
+        session.in_transaction = True
+        client = MagicMock()
+        client.start_session.return_value.__enter__.return_value = session
+        return client, session
+
+    def transient_error(self, label="TransientTransactionError"):
+        from pymongo.errors import OperationFailure
+
+        return OperationFailure("write conflict", details={"errorLabels": [label]})
+
+    @patch("backend.transactions._backoff")
+    @patch("backend.transactions.get_connection")
+    def test_transient_errors_retry_the_transaction(self, mock_conn, mock_backoff):
+        """A TransientTransactionError reruns the whole callback."""
+        from backend.transactions import run_in_transaction
+
+        client, session = self.make_client()
+        mock_conn.return_value = client
+        callback = MagicMock(side_effect=[self.transient_error(), "done"])
+
+        self.assertEqual(run_in_transaction(callback), "done")
+        self.assertEqual(callback.call_count, 2)
+        session.abort_transaction.assert_called_once()
+        session.commit_transaction.assert_called_once()
+
+    @patch("backend.transactions.get_connection")
+    def test_unknown_commit_result_retries_only_the_commit(self, mock_conn):
+        """UnknownTransactionCommitResult retries the commit, not the writes."""
+        from backend.transactions import run_in_transaction
+
+        client, session = self.make_client()
+        mock_conn.return_value = client
+        session.commit_transaction.side_effect = [self.transient_error("UnknownTransactionCommitResult"), None]
+        callback = MagicMock(return_value="done")
+
+        self.assertEqual(run_in_transaction(callback), "done")
+        self.assertEqual(callback.call_count, 1)
+        self.assertEqual(session.commit_transaction.call_count, 2)
+
+    @override_settings(MONGO_TRANSACTIONS=False)
+    @patch("backend.booking.Event")
+    @patch("backend.booking.Booking")
+    @patch("backend.booking.claim_seats", return_value=False)
+    def test_place_booking_writes_nothing_when_seats_are_taken(self, mock_claim, MockBooking, MockEvent):
+        """A lost seat claim aborts before the booking insert and counter update."""
+        from backend.booking import place_booking
+
+        booking = make_booking()
+        self.assertFalse(place_booking(make_event(), booking, [1, 2]))
+        MockBooking._get_collection.return_value.insert_one.assert_not_called()
+        MockEvent._get_collection.return_value.update_one.assert_not_called()
+
+
+@override_settings(MONGO_TRANSACTIONS=False)
+class CancelBookingTests(SimpleTestCase):
+
+    def make_confirmed_booking(self):
+        seat = MagicMock(row=1, column=2)
+        booking = make_booking(num_tickets=1, total_price=50.0)
+        booking.seats = [seat]
+        return booking
+
+    @patch("backend.versions.bump")
+    @patch("backend.feed.Booking")
+    @patch("backend.booking.enqueue")
+    @patch("backend.booking.release_seats")
+    @patch("backend.booking.EventBooking")
+    @patch("backend.booking.Event")
+    @patch("backend.booking.Booking")
+    def test_cancel_releases_seats_and_decrements_count(
+        self, MockBooking, MockEvent, MockEventBooking, mock_release, mock_enqueue, _, mock_bump,
+    ):
+        """Cancelling frees the seat ordinals, decrements attendees, queues the email and signals listeners."""
+        from backend.booking import cancel_and_release
+        from backend.signals import seats_released
+
+        MockBooking._get_collection.return_value.update_one.return_value.modified_count = 1
+        received = []
+        handler = lambda sender, **kwargs: received.append(kwargs)
+        seats_released.connect(handler)
+        self.addCleanup(seats_released.disconnect, handler)
+
+        self.assertTrue(cancel_and_release(self.make_confirmed_booking(), make_event()))
+
+        mock_release.assert_called_once_with("event123", [1], session=None)
+        update = MockEvent._get_collection.return_value.update_one.call_args[0][1]
+        self.assertEqual(update["$inc"], {"attendees_count": -1})
+        copy = MockEventBooking._get_collection.return_value.update_one.call_args[0]
+        self.assertEqual(copy[0]["event_id"], "event123")
+        self.assertEqual(copy[1]["$set"]["booking_status"], "Cancelled")
+        self.assertEqual(received[0]["ordinals"], [1])
+        # A count change does not move the listing version
+        mock_bump.assert_not_called()
+        self.assertEqual(mock_enqueue.call_args[0][0], "booking_cancelled")
+        self.assertEqual(mock_enqueue.call_args[1], {"session": None})
+
+    @patch("backend.booking.release_seats")
+    @patch("backend.booking.Event")
+    @patch("backend.booking.Booking")
+    def test_second_cancel_is_a_no_op(self, MockBooking, MockEvent, mock_release):
+        """A booking that is no longer Confirmed releases nothing."""
+        from backend.booking import cancel_and_release
+
+        MockBooking._get_collection.return_value.update_one.return_value.modified_count = 0
+
+        self.assertFalse(cancel_and_release(self.make_confirmed_booking(), make_event()))
+        mock_release.assert_not_called()
+        MockEvent._get_collection.return_value.update_one.assert_not_called()
+
+
+class RendererTests(SimpleTestCase):
+
+    def test_orjson_renderer_matches_drf_json(self):
+        """The orjson renderer produces the same document as DRF's encoder."""
+        from bson import ObjectId
+        from rest_framework.renderers import JSONRenderer
+        from backend.renderers import ORJSONRenderer
+
+        data = [{"id": "e1", "date": datetime(2025, 6, 1, 18, 0), "tags": ["a"], "price": 9.5}]
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data))
+        )
+        self.assertEqual(json.loads(ORJSONRenderer().render({"id": ObjectId("6523f4a2e1d3c2b1a0f9e8d7")})),
+                         {"id": "6523f4a2e1d3c2b1a0f9e8d7"})
+
+    def test_orjson_renderer_writes_datetimes_like_drf(self):
+        """Datetimes with microseconds or a UTC offset render as the same strings as in DRF."""
+        from datetime import timezone as dt_timezone
+        from rest_framework.renderers import JSONRenderer
+        from backend.renderers import ORJSONRenderer
+
+        data = {
+            "naive": datetime(2025, 6, 1, 18, 0, 5, 123456),
+            "utc": datetime(2025, 6, 1, 18, 0, 5, 123456, tzinfo=dt_timezone.utc),
+        }
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data))
+        )
+
+    def test_msgpack_round_trip(self):
+        """MessagePack output decodes back to the same structure."""
+        from backend.renderers import MessagePackRenderer, msgpack
+
+        if msgpack is None:
+            self.skipTest("msgpack is not installed")
+        data = [{"row": 1, "column": 2}, {"row": 3, "column": 4}]
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data)), data)
+
+    def test_seat_bitmap_sets_one_bit_per_taken_ordinal(self):
+        """Ordinal i maps to bit i, most significant bit first."""
+        from backend.hall import SeatIndex, default_layout_dict
+        from backend.renderers import SeatBitmapRenderer
+
+        index = SeatIndex(default_layout_dict())
+        body = SeatBitmapRenderer().render(index.packed([0, 9, 79]))
+        self.assertEqual(len(body), 10)
+        self.assertEqual(body[0], 0x80)
+        self.assertEqual(body[1], 0x40)
+        self.assertEqual(body[9], 0x01)
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = json.dumps([{"description": "A long event description. " * 10}] * 20).encode()
+
+    def run_middleware(self, response, accept="gzip"):
+        from backend.middleware import CompressionMiddleware
+
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(self.factory.get("/api/events/", HTTP_ACCEPT_ENCODING=accept))
+
+    def test_gzip_large_json(self):
+        """Large JSON bodies are gzipped and marked with Vary."""
+        import gzip
+        from django.http import HttpResponse
+
+        response = self.run_middleware(HttpResponse(self.body, content_type="application/json"))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_prefers_brotli(self):
+        """Brotli wins when the client accepts it."""
+        from django.http import HttpResponse
+        from backend.middleware import brotli
+
+        if brotli is None:
+            self.skipTest("brotli is not installed")
+        response = self.run_middleware(
+            HttpResponse(self.body, content_type="application/json"), accept="gzip, br"
+        )
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_client_q_values_pick_the_encoding(self):
+        """The encoding with the higher q-value wins; Brotli only breaks ties."""
+        from django.http import HttpResponse
+        from backend.middleware import brotli
+
+        if brotli is None:
+            self.skipTest("brotli is not installed")
+        for accept, expected in (("br;q=0.5, gzip", "gzip"), ("gzip;q=0.8, br;q=0.8", "br")):
+            response = self.run_middleware(HttpResponse(self.body, content_type="application/json"), accept=accept)
+            self.assertEqual(response["Content-Encoding"], expected)
+
+    def test_small_or_refused_bodies_are_untouched(self):
+        """Bodies under the threshold or with q=0 are sent uncompressed."""
+        from django.http import HttpResponse
+
+        small = self.run_middleware(HttpResponse(b'{"ok": true}', content_type="application/json"))
+        self.assertFalse(small.has_header("Content-Encoding"))
+
+        refused = self.run_middleware(
+            HttpResponse(self.body, content_type="application/json"), accept="gzip;q=0"
+        )
+        self.assertFalse(refused.has_header("Content-Encoding"))
+
+    def test_streaming_response(self):
+        """Streaming responses are compressed incrementally."""
+        import gzip
+        from django.http import StreamingHttpResponse
+
+        chunks = [self.body[:500], self.body[500:]]
+        response = self.run_middleware(StreamingHttpResponse(chunks, content_type="text/csv"))
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), self.body)
+
+
+class ConditionalGetTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def make_view(self, version, last_modified=None):
+        from django.http import JsonResponse
+        from backend.conditional import conditional
+
+        def view(request):
+            self.calls += 1
+            return JsonResponse({"ok": True})
+
+        return conditional(lambda request: (version, last_modified), {"public": True, "max_age": 30})(view)
+
+    def test_sets_validators_and_cache_control(self):
+        """A full response carries ETag, Last-Modified and Cache-Control."""
+        view = self.make_view(3, datetime(2025, 1, 1, 12, 0))
+        response = view(self.factory.get("/api/events/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("2025", response["Last-Modified"])
+        self.assertIn("max-age=30", response["Cache-Control"])
+
+    def test_if_none_match_skips_view(self):
+        """A matching If-None-Match gets a 304 without running the view."""
+        view = self.make_view(3)
+        etag = view(self.factory.get("/api/events/"))["ETag"]
+
+        response = view(self.factory.get("/api/events/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.calls, 1)
+
+        changed = self.make_view(4)(self.factory.get("/api/events/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(changed.status_code, 200)
+
+    def test_etag_varies_with_query_and_accept(self):
+        """Different filters or formats of the same version get different ETags."""
+        view = self.make_view(3)
+        etags = {
+            view(self.factory.get("/api/events/"))["ETag"],
+            view(self.factory.get("/api/events/?status=upcoming"))["ETag"],
+            view(self.factory.get("/api/events/", HTTP_ACCEPT="application/msgpack"))["ETag"],
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_if_modified_since(self):
+        """If-Modified-Since at or after Last-Modified gets a 304."""
+        view = self.make_view(3, datetime(2025, 1, 1, 12, 0))
+        response = view(self.factory.get(
+            "/api/events/", HTTP_IF_MODIFIED_SINCE="Wed, 01 Jan 2025 12:00:00 GMT"
+        ))
+        self.assertEqual(response.status_code, 304)
+
+    @patch("backend.versions.get_version")
+    def test_event_listing_version_is_the_stamp_and_day(self, mock_version):
+        """Listings are versioned by the events stamp and today's date, without scanning events."""
+        import time
+        from datetime import date
+        from backend.views import events_validators
+
+        request = self.factory.get("/api/events/", {"date_to": "2026-12-31"})
+        request.user = make_user()
+        mock_version.return_value = 7
+        self.assertEqual(events_validators(request), ((7, date.today().isoformat()), None))
+        # Written this second: another write may still land under the same stamp
+        mock_version.return_value = int(time.time())
+        self.assertEqual(events_validators(request), (None, None))
+
+    @patch("backend.versions.get_db")
+    def test_version_stamps_are_coalesced(self, mock_db):
+        """Bumps within one second write once, and seat counters never bump."""
+        from backend import versions
+        from backend.signals import events_changed, seats_claimed
+
+        collection = mock_db.return_value.__getitem__.return_value
+        with patch.dict(versions._stamped, clear=True), patch("backend.versions.time.time", return_value=1000.5):
+            events_changed.send_robust(sender=None, event=None)
+            versions.event_changed_elsewhere({"collection": "events"})
+            seats_claimed.send_robust(sender=None, event_id="e1", booking_id="b1", user_email="a", ordinals=[1])
+        collection.update_one.assert_called_once_with(
+            {"_id": "events"}, {"$max": {"version": 1000}}, upsert=True,
+        )
+
+    @patch("backend.views.stored_event_id", return_value="64b000000000000000000002")
+    @patch("backend.views.Event")
+    def test_occurrence_detail_is_versioned_by_its_stored_event(self, MockEvent, _):
+        """An occurrence's ETag follows the updated_at of the series (or its materialized event)."""
+        from datetime import datetime
+        from backend.views import events_validators
+
+        updated = datetime(2026, 1, 1, 12, 0)
+        MockEvent.objects.return_value.only.return_value.first.return_value = MagicMock(updated_at=updated)
+        request = self.factory.get("/api/events/", {"id": "64b000000000000000000002:2026-05-01"})
+        request.user = make_user()
+        self.assertEqual(events_validators(request), (("64b000000000000000000002", updated), updated))
+
+    def test_missing_version_runs_view(self):
+        """Without a version (e.g. unknown event) the view answers as usual."""
+        response = self.make_view(None)(self.factory.get("/api/events/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+
+class RecommendationTests(SimpleTestCase):
+
+    def make(self, category="Music", city="Pune", tags=(), subcategory=None):
+        return MagicMock(category=category, city=city, tags=list(tags), subcategory=subcategory)
+
+    def test_similarity_ranks_shared_features(self):
+        """Category, city, tags and co-bookings all raise the score."""
+        from backend.recommendations import similarity
+
+        event = self.make(tags=["jazz", "live"])
+        unrelated = similarity(event, self.make(category="Sports", city="Goa"))
+        same_city = similarity(event, self.make(category="Sports"))
+        same_category = similarity(event, self.make(city="Goa"))
+        tagged = similarity(event, self.make(tags=["jazz", "live"]))
+        co_booked = similarity(event, self.make(tags=["jazz", "live"]), co_bookers=5, bookers=10)
+
+        self.assertEqual(unrelated, 0)
+        self.assertLess(same_city, same_category)
+        self.assertLess(same_category, tagged)
+        self.assertLess(tagged, co_booked)
+
+    def test_compute_related_keeps_top_k(self):
+        """Only the best K candidates are kept, excluding the event itself."""
+        from backend import recommendations
+
+        event = self.make()
+        event.id = "e0"
+        candidates = []
+        for i, city in enumerate(["Pune", "Goa", "Pune", "Goa"], start=1):
+            candidate = self.make(city=city)
+            candidate.id = f"e{i}"
+            candidates.append(candidate)
+        candidates.append(event)
+
+        queryset = MagicMock()
+        queryset.filter.return_value.exclude.return_value.only.return_value = candidates
+        with patch.object(recommendations, "co_bookings", return_value=(2, {"e2": 2})), \
+                patch.object(recommendations, "upcoming_published", return_value=queryset), \
+                override_settings(RELATED_TOP_K=2):
+            related = recommendations.compute_related(event)
+
+        self.assertEqual([event_id for event_id, _ in related], ["e2", "e3"])
+
+    @patch("backend.recommendations.enqueue")
+    @patch("backend.recommendations.refresh_related")
+    @patch("backend.recommendations.RelatedEvents")
+    def test_stale_list_is_served_and_refreshed_once(self, MockRelated, mock_refresh, mock_enqueue):
+        """A stale list is returned as is and a single recompute is queued."""
+        from datetime import datetime
+        from django.core.cache import cache
+        from backend.recommendations import related_event_ids
+
+        cache.delete("related:refresh:e0")
+        MockRelated.objects.return_value.first.return_value = MagicMock(
+            stale=True, computed_at=datetime.utcnow(), related=[{"event_id": "e1"}, {"event_id": "e2"}],
+        )
+        event = MagicMock(id="e0")
+
+        self.assertEqual(related_event_ids(event), ["e1", "e2"])
+        self.assertEqual(related_event_ids(event), ["e1", "e2"])
+        mock_refresh.assert_not_called()
+        mock_enqueue.assert_called_once_with("refresh_related", {"event_id": "e0"})
+
+    @patch("backend.views.related_event_ids")
+    @patch("backend.views.Event")
+    def test_view_drops_unavailable_events(self, MockEvent, mock_ids):
+        """Listed events that are no longer published are skipped."""
+        from backend.views import related_events
+
+        mock_ids.return_value = ["a", "b", "c"]
+        found = []
+        for event_id in ("c", "a"):
+            event = MagicMock(id=event_id)
+            event.to_json_safe.return_value = {"id": event_id}
+            found.append(event)
+        queryset = MockEvent.objects.return_value.exclude.return_value
+        queryset.first.return_value = MagicMock()
+        queryset.__iter__.return_value = iter(found)
+
+        request = RequestFactory().get("/api/events/x/related/?limit=2")
+        response = related_events(request, event_id="x")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e["id"] for e in response.data], ["a", "c"])
+        self.assertIn("max-age=300", response["Cache-Control"])
+
+
+class PersonalizedFeedTests(SimpleTestCase):
+
+    def make_event(self, event_id, category, city="Pune", tags=(), attendees=0, days=10):
+        from datetime import date, timedelta
+
+        event = MagicMock(
+            id=event_id, category=category, city=city, tags=list(tags),
+            capacity=100, attendees_count=attendees, date=date.today() + timedelta(days=days),
+        )
+        event.to_json_safe.return_value = {"id": event_id}
+        return event
+
+    def make_matrix(self):
+        from backend.feed import FeatureMatrix
+
+        return FeatureMatrix([
+            self.make_event("music", "Music", tags=["jazz"]),
+            self.make_event("sports", "Sports", city="Goa", attendees=90),
+            self.make_event("tech", "Tech", city="Goa"),
+            self.make_event("jazz-night", "Music", city="Goa", tags=["jazz", "live"]),
+        ])
+
+    def test_taste_outranks_popularity(self):
+        """Events matching the profile come before merely popular ones."""
+        from backend.feed import event_features
+
+        matrix = self.make_matrix()
+        profile = {"category:Music": 2.0, **event_features(None, None, ["jazz"])}
+        ranked = [matrix.ids[i] for i in matrix.top(profile, 3)]
+        self.assertEqual(ranked[:2], ["music", "jazz-night"])
+        self.assertEqual(ranked[2], "sports")
+
+    def test_booked_events_are_excluded(self):
+        """Events the user already booked never show up."""
+        matrix = self.make_matrix()
+        ranked = [matrix.ids[i] for i in matrix.top({"category:Music": 1.0}, 10, exclude=["music"])]
+        self.assertNotIn("music", ranked)
+        self.assertEqual(len(ranked), 3)
+
+    def test_empty_profile_falls_back_to_boosts(self):
+        """Without any history the feed is ordered by popularity and date."""
+        matrix = self.make_matrix()
+        self.assertEqual(matrix.ids[matrix.top({}, 1)[0]], "sports")
+
+    def test_matrix_rebuilt_on_new_generation(self):
+        """Bumping the generation makes the cached matrix stale."""
+        matrix = self.make_matrix()
+        matrix.generation = 3
+        self.assertTrue(matrix.is_current(3))
+        self.assertFalse(matrix.is_current(4))
+
+    @patch("backend.feed.current_generation", return_value=4)
+    @patch("backend.feed.build_matrix")
+    def test_stale_matrix_is_served_while_rebuilding(self, mock_build, _):
+        """Requests keep the old matrix; the rebuild runs once, off the request, and is swapped in."""
+        import threading
+        from backend import feed
+
+        old, new = self.make_matrix(), self.make_matrix()
+        old.generation = 3
+        started, release = threading.Event(), threading.Event()
+
+        def build(generation):
+            started.set()
+            release.wait(5)
+            return new
+
+        mock_build.side_effect = build
+        with patch.object(feed, "_matrix", old):
+            self.assertIs(feed.get_matrix(), old)
+            self.assertTrue(started.wait(5))
+            self.assertIs(feed.get_matrix(), old)
+            thread = feed._rebuilding
+            release.set()
+            thread.join(5)
+            self.assertIs(feed._matrix, new)
+        mock_build.assert_called_once_with(4)
+
+
+class GeocodingTests(SimpleTestCase):
+
+    def test_cached_geocoder_remembers_hits_and_misses(self):
+        """Each normalized query reaches the backend once, misses included."""
+        from django.core.cache import cache
+        from backend.geocoding import CachedGeocoder, StaticGeocoder
+
+        cache.clear()
+        inner = StaticGeocoder({"Main Square, Krakow": [19.9372, 50.0617]})
+        inner.geocode = MagicMock(wraps=inner.geocode)
+        geocoder = CachedGeocoder(inner)
+
+        self.assertEqual(geocoder.geocode("main square  krakow"), (19.9372, 50.0617))
+        self.assertEqual(geocoder.geocode("Main Square, Krakow"), (19.9372, 50.0617))
+        self.assertIsNone(geocoder.geocode("Nowhere"))
+        self.assertIsNone(geocoder.geocode("nowhere"))
+        self.assertEqual(inner.geocode.call_count, 2)
+
+    def test_geocoder_errors_are_not_cached(self):
+        """A failing lookup returns None and is retried next time."""
+        from django.core.cache import cache
+        from backend.geocoding import CachedGeocoder
+
+        cache.clear()
+        inner = MagicMock()
+        inner.geocode.side_effect = [OSError("timeout"), (1.0, 2.0)]
+        geocoder = CachedGeocoder(inner)
+
+        with self.assertLogs("backend.geocoding", "WARNING"):
+            self.assertIsNone(geocoder.geocode("Kyiv"))
+        self.assertEqual(geocoder.geocode("Kyiv"), (1.0, 2.0))
+
+    @patch("backend.views.events_changed")
+    @patch("backend.views.enqueue")
+    @patch("backend.views.Event")
+    @patch("backend.views.User")
+    def test_create_event_geocodes_in_the_background(self, MockUser, MockEvent, mock_enqueue, _):
+        """An event without coordinates is saved at once and geocoded by a job."""
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.views import create_event
+
+        MockUser.objects.get.return_value = make_user()
+        MockEvent.return_value = make_event(id="64b000000000000000000002")
+        request = APIRequestFactory().post(
+            "/events/create/", {"title": "Gig", "address": "Main Square", "city": "Krakow"}, format="json",
+        )
+        force_authenticate(request, user=make_user())
+
+        with patch("backend.geocoding.get_geocoder") as mock_geocoder:
+            response = create_event(request)
+
+        self.assertEqual(response.status_code, 201)
+        mock_geocoder.assert_not_called()
+        mock_enqueue.assert_called_once_with("geocode_event", {"event_id": "64b000000000000000000002"})
+
+    @patch("backend.tasks.geocode_event", return_value=(19.9372, 50.0617))
+    @patch("backend.tasks.Event")
+    def test_geocode_job_fills_missing_point(self, MockEvent, _):
+        """The job stores the point unless coordinates were set meanwhile."""
+        from backend.tasks import geocode_new_event
+
+        geocode_new_event("e1")
+
+        MockEvent.objects.assert_called_with(pk="e1", geo_point=None)
+        update = MockEvent.objects.return_value.update_one.call_args[1]
+        self.assertEqual(update["set__geo_point"], [19.9372, 50.0617])
+
+    def test_haversine(self):
+        """Kyiv to Lviv is about 470 km."""
+        from backend.geocoding import haversine_km
+
+        self.assertAlmostEqual(haversine_km((30.5234, 50.4501), (24.0297, 49.8397)), 468, delta=5)
+
+    def test_geo_filter_parsing(self):
+        """lat/lng/radius and bbox are parsed; bad or mixed input is rejected."""
+        from backend.views import geo_filter
+
+        factory = RequestFactory()
+        self.assertEqual(
+            geo_filter(factory.get("/api/events/", {"lat": "50.45", "lng": "30.52", "radius_km": "5"})),
+            ("near", (30.52, 50.45), 5.0),
+        )
+        self.assertEqual(
+            geo_filter(factory.get("/api/events/", {"bbox": "30,50,31,51"})),
+            ("box", ((30.0, 50.0), (31.0, 51.0))),
+        )
+        self.assertIsNone(geo_filter(factory.get("/api/events/")))
+        for params in ({"lat": "95", "lng": "0"}, {"lat": "50"}, {"bbox": "1,2,3"},
+                       {"bbox": "30,50,31,51", "lat": "1", "lng": "1"}, {"lat": "1", "lng": "1", "radius_km": "0"}):
+            with self.assertRaises(ValueError):
+                geo_filter(factory.get("/api/events/", params))
+
+
+@override_settings(MONGO_TRANSACTIONS=False)
+class FavoriteTests(SimpleTestCase):
+
+    user_id = "64b000000000000000000001"
+    event_id = "64b000000000000000000002"
+
+    @patch("backend.favorites.Event")
+    @patch("backend.favorites.User")
+    def test_add_is_guarded_and_counts_once(self, MockUser, MockEvent):
+        """Adding pushes with a membership guard and bumps the counter only on change."""
+        from backend.favorites import add_favorite
+
+        users = MockUser._get_collection.return_value
+        users.update_one.return_value.modified_count = 1
+        self.assertTrue(add_favorite(self.user_id, self.event_id))
+
+        match, change = users.update_one.call_args[0]
+        self.assertEqual(match["favorite_events"], {"$ne": self.event_id})
+        self.assertEqual(change["$addToSet"], {"favorite_events": self.event_id})
+        update = MockEvent._get_collection.return_value.update_one.call_args[0][1]
+        self.assertEqual(update["$inc"], {"favorites_count": 1})
+        self.assertEqual(update["$set"]["updated_at"], change["$set"]["updated_at"])
+
+        users.update_one.return_value.modified_count = 0
+        MockEvent._get_collection.return_value.update_one.reset_mock()
+        self.assertFalse(add_favorite(self.user_id, self.event_id))
+        MockEvent._get_collection.return_value.update_one.assert_not_called()
+
+    @patch("backend.favorites.Event")
+    @patch("backend.favorites.User")
+    def test_remove_pulls_and_decrements(self, MockUser, MockEvent):
+        """Removing pulls the id and decrements the counter."""
+        from backend.favorites import remove_favorite
+
+        users = MockUser._get_collection.return_value
+        users.update_one.return_value.modified_count = 1
+        self.assertTrue(remove_favorite(self.user_id, self.event_id))
+
+        match, change = users.update_one.call_args[0]
+        self.assertEqual(match["favorite_events"], self.event_id)
+        self.assertEqual(change["$pull"], {"favorite_events": self.event_id})
+        update = MockEvent._get_collection.return_value.update_one.call_args[0][1]
+        self.assertEqual(update["$inc"], {"favorites_count": -1})
+        self.assertIn("updated_at", update["$set"])
+
+    @patch("backend.views.Event")
+    def test_unknown_event_is_404(self, MockEvent):
+        """Favoriting a missing event writes nothing."""
+        from rest_framework.test import force_authenticate
+        from backend.views import favorite_event
+
+        MockEvent.objects.return_value.only.return_value.first.return_value = None
+        request = RequestFactory().post(f"/api/me/favorites/{self.event_id}/")
+        force_authenticate(request, user=make_user())
+        with patch("backend.views.add_favorite") as mock_add:
+            response = favorite_event(request, event_id=self.event_id)
+        self.assertEqual(response.status_code, 404)
+        mock_add.assert_not_called()
+
+
+class ShardedCollectionStandIn:
+    """Records the filters sent to a collection and whether mongos could route each to one shard"""
+
+    def __init__(self, name):
+        self.name = name
+        self.scattered = []
+        self.reads = []
+
+    def route(self, query):
+        from backend.sharding import targets_single_shard
+
+        if not targets_single_shard(self.name, query):
+            self.scattered.append(query)
+        return MagicMock(modified_count=1, matched_count=1)
+
+    def find(self, query, *args, **kwargs):
+        self.route(query)
+        self.reads.append(query)
+        return []
+
+    def update_one(self, query, update, **kwargs):
+        return self.route(query)
+
+    def insert_one(self, document, **kwargs):
+        from bson import ObjectId
+
+        document.setdefault("_id", ObjectId())
+        return self.route(document)
+
+
+@override_settings(MONGO_TRANSACTIONS=False)
+class ShardingTests(SimpleTestCase):
+
+    def test_targets_single_shard(self):
+        """Only equality on the whole shard key routes to one shard."""
+        from backend.sharding import targets_single_shard
+
+        self.assertTrue(targets_single_shard("bookings", {"_id": 1, "user_email": "a@b.c"}))
+        self.assertFalse(targets_single_shard("bookings", {"_id": 1}))
+        self.assertFalse(targets_single_shard("bookings", {"user_email": {"$in": ["a", "b"]}}))
+        self.assertTrue(targets_single_shard("seat_inventory", {"event_id": "e1", "taken": {"$nin": [1]}}))
+        self.assertTrue(targets_single_shard("users", {"email": "a@b.c"}))
+
+    def test_shard_commands_include_zones(self):
+        """Collections are sharded by their key and zones get ranges."""
+        from backend.sharding import shard_commands
+
+        commands = shard_commands("app", {
+            "COLLECTIONS": {"bookings": {"user_email": 1}},
+            "ZONES": [{"name": "eu", "shards": ["s1"], "ranges": [
+                {"collection": "bookings", "min": {"user_email": "a"}, "max": {"user_email": "m"}},
+            ]}],
+        })
+        self.assertEqual(commands[0], {"enableSharding": "app"})
+        self.assertIn({"shardCollection": "app.bookings", "key": {"user_email": 1}}, commands)
+        self.assertIn({"addShardToZone": "s1", "zone": "eu"}, commands)
+        self.assertEqual(commands[-1]["updateZoneKeyRange"], "app.bookings")
+
+    def test_booking_write_path_stays_on_one_shard(self):
+        """Placing and cancelling a booking never needs a scatter-gather write."""
+        from backend.booking import cancel_and_release, place_booking
+        from backend.models import Booking, Event, EventBooking, Job, SeatInventory, Seat
+
+        collections = {
+            model: ShardedCollectionStandIn(model._meta["collection"])
+            for model in (Booking, Event, EventBooking, Job, SeatInventory)
+        }
+        event = make_event(id="64b000000000000000000002")
+        event.pk = event.id
+        booking = Booking(
+            event_id=event.id, user_email="fan@example.com", num_tickets=1,
+            total_price=50.0, seats=[Seat(row=1, column=1)],
+        )
+
+        patches = [
+            patch.object(model, "_get_collection", return_value=stand_in)
+            for model, stand_in in collections.items()
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        with patch("backend.booking.seats_claimed"), patch("backend.booking.seats_released"):
+            self.assertTrue(place_booking(event, booking, [0]))
+            self.assertTrue(cancel_and_release(booking, event))
+
+        for stand_in in collections.values():
+            self.assertEqual(stand_in.scattered, [], stand_in.name)
+
+    def test_per_event_reads_stay_on_one_shard(self):
+        """Check-in syncs, snapshots and inventory backfills read the per-event copy by its shard key."""
+        from datetime import datetime
+        from backend.checkin import changes_since
+        from backend.hall import SeatIndex, default_layout_dict
+        from backend.inventory import get_inventory
+        from backend.models import Booking, CheckIn, EventBooking
+        from backend.sharding import HOT_QUERIES
+        from backend.snapshot import sold_seats
+
+        collections = {
+            model: ShardedCollectionStandIn(model._meta["collection"])
+            for model in (Booking, CheckIn, EventBooking)
+        }
+        for model, stand_in in collections.items():
+            p = patch.object(model, "_get_collection", return_value=stand_in)
+            p.start()
+            self.addCleanup(p.stop)
+        event_id = "64b000000000000000000002"
+        index = SeatIndex(default_layout_dict())
+        with patch("backend.inventory.SeatInventory") as MockInventory:
+            MockInventory.objects.return_value.first.return_value = None
+            changes_since(event_id, datetime(2026, 1, 1))
+            list(sold_seats(event_id, index))
+            list(sold_seats(event_id, index, datetime(2026, 1, 1)))
+            get_inventory(event_id, index)
+
+        copies = collections[EventBooking]
+        self.assertEqual(len(copies.reads), 4)
+        self.assertEqual(copies.scattered, [])
+        self.assertEqual(collections[Booking].reads, [])
+        hot_shapes = {(c, tuple(sorted(q))) for c, q in HOT_QUERIES}
+        for query in copies.reads:
+            self.assertIn(("event_bookings", tuple(sorted(query))), hot_shapes)
+
+    def test_hot_queries_target_one_shard(self):
+        """Every hot query shape pins its collection's shard key."""
+        from backend.sharding import HOT_QUERIES, targets_single_shard
+
+        for collection, query in HOT_QUERIES:
+            self.assertTrue(targets_single_shard(collection, query), collection)
+
+    @patch("backend.management.commands.shard_collections.get_db")
+    def test_check_fails_unless_hot_queries_hit_one_shard(self, mock_db):
+        """The --check command explains the hot queries through mongos and fails on a scatter-gather."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        db = mock_db.return_value
+        db.client.is_mongos = True
+        db.command.return_value = {"queryPlanner": {"winningPlan": {"stage": "SINGLE_SHARD"}}}
+        call_command("shard_collections", check=True, stdout=StringIO())
+
+        db.command.return_value = {"queryPlanner": {"winningPlan": {"stage": "SHARD_MERGE"}}}
+        with self.assertRaises(CommandError):
+            call_command("shard_collections", check=True, stdout=StringIO())
+
+    def test_users_look_up_bookings_by_shard_key(self):
+        """A user's booking lookup includes their email; admins may look up any booking."""
+        from backend.views import booking_lookup
+
+        request = MagicMock(user=make_user())
+        self.assertEqual(booking_lookup(request, "b1"), {"id": "b1", "user_email": "test@example.com"})
+        request.user = make_user(role="admin")
+        self.assertEqual(booking_lookup(request, "b1"), {"id": "b1"})
+
+
+class InvalidationBusTests(SimpleTestCase):
+
+    def change(self, coll, op="update", full=None, key=None):
+        return {
+            "_id": {"_data": f"token-{coll}-{op}"},
+            "operationType": op,
+            "ns": {"db": "app", "coll": coll},
+            "documentKey": key or {"_id": "64b000000000000000000001"},
+            "fullDocument": full,
+        }
+
+    def test_to_message(self):
+        """Change events become small messages; other collections are skipped."""
+        from backend.invalidation import to_message
+
+        message = to_message(self.change(
+            "bookings", full={"user_email": "fan@example.com", "event_id": "e1", "seats": [1]}
+        ))
+        self.assertEqual(message["collection"], "bookings")
+        self.assertEqual(message["id"], "64b000000000000000000001")
+        self.assertEqual(message["doc"], {"user_email": "fan@example.com", "event_id": "e1"})
+        self.assertEqual(message["token"], "token-bookings-update")
+
+        deleted = to_message(self.change("bookings", op="delete", key={"_id": "b1", "user_email": "x@y.z"}))
+        self.assertEqual(deleted["doc"], {"user_email": "x@y.z"})
+        self.assertIsNone(to_message(self.change("idempotency_keys")))
+
+    def test_counter_updates_are_skipped(self):
+        """Booking and favorite counters do not invalidate; content edits do."""
+        from backend.invalidation import to_message
+
+        change = self.change("events", full={"category": "Music"})
+        change["updateDescription"] = {"updatedFields": {"attendees_count": 3, "updated_at": 1}, "removedFields": []}
+        self.assertIsNone(to_message(change))
+        change["updateDescription"]["updatedFields"]["title"] = "New title"
+        self.assertEqual(to_message(change)["doc"], {"category": "Music"})
+        self.assertIsNotNone(to_message(self.change("events", op="replace", full={})))
+
+    def test_shared_handlers_run_once_and_local_ones_via_bus(self):
+        """The consumer runs shared handlers itself and fans out to workers through the bus."""
+        from backend import invalidation
+
+        shared, local = [], []
+        self.addCleanup(invalidation._shared_handlers.pop, "test_coll", None)
+        self.addCleanup(invalidation._local_handlers.pop, "test_coll", None)
+        invalidation.on_change("test_coll")(shared.append)
+        invalidation.subscribe("test_coll", local.append)
+        invalidation.subscribe("test_coll", MagicMock(side_effect=RuntimeError("broken")))
+
+        bus = MagicMock()
+        bus.publish.side_effect = invalidation.deliver
+        message = {"collection": "test_coll", "op": "update", "id": "1", "doc": {}, "token": "t"}
+        with patch.object(invalidation, "get_bus", return_value=bus), \
+                self.assertLogs("backend.invalidation", "ERROR"):
+            invalidation.handle(message)
+
+        self.assertEqual(shared, [message])
+        self.assertEqual(local, [message])
+
+    @override_settings(INVALIDATION={"USER_CACHE_SECONDS": 60})
+    @patch("backend.authentication.User")
+    def test_user_cache_dropped_on_user_change(self, MockUser):
+        """JWT user lookups are cached until a users change arrives."""
+        from backend.authentication import MongoJWTAuthentication, user_cache
+        from backend.invalidation import deliver
+
+        self.addCleanup(user_cache.forget, "u1")
+        MockUser.objects.get.return_value = make_user(id="u1")
+        auth = MongoJWTAuthentication()
+
+        auth.get_user({"user_id": "u1"})
+        auth.get_user({"user_id": "u1"})
+        self.assertEqual(MockUser.objects.get.call_count, 1)
+
+        deliver({"collection": "users", "op": "update", "id": "u1", "doc": {}, "token": None})
+        auth.get_user({"user_id": "u1"})
+        self.assertEqual(MockUser.objects.get.call_count, 2)
+
+
+class ReadRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    @override_settings(READ_ROUTING={"ENABLED": True, "MAX_STALENESS_SECONDS": 120})
+    def test_tolerant_reads_go_to_secondaries(self):
+        """Opted-in querysets read secondaryPreferred with bounded staleness."""
+        from backend.routing import tolerant
+
+        queryset = MagicMock()
+        tolerant(queryset)
+        preference = queryset.read_preference.call_args[0][0]
+        self.assertEqual(preference.mongos_mode, "secondaryPreferred")
+        self.assertEqual(preference.max_staleness, 120)
+
+    @override_settings(READ_ROUTING={"ENABLED": False})
+    def test_disabled_routing_keeps_primary(self):
+        """With routing off the queryset is returned untouched."""
+        from backend.routing import tolerant
+
+        queryset = MagicMock()
+        self.assertIs(tolerant(queryset), queryset)
+
+    @override_settings(READ_ROUTING={"ENABLED": True, "STICKY_SECONDS": 60})
+    def test_writers_read_their_writes(self):
+        """After a successful write the user's tolerant reads stay on the primary."""
+        from django.http import HttpResponse
+        from backend.routing import ReadYourWritesMiddleware, tolerant
+
+        factory = RequestFactory()
+        post = factory.post("/api/events/create/")
+        post.user = make_user()
+        ReadYourWritesMiddleware(lambda request: HttpResponse(status=201))(post)
+
+        get = factory.get("/api/events/")
+        get.user = make_user()
+        queryset = MagicMock()
+        self.assertIs(tolerant(queryset, get), queryset)
+
+        other = factory.get("/api/events/")
+        other.user = make_user(id="someone-else")
+        tolerant(queryset, other)
+        queryset.read_preference.assert_called_once()
+
+        failed = factory.post("/api/events/create/")
+        failed.user = make_user(id="failed-writer")
+        ReadYourWritesMiddleware(lambda request: HttpResponse(status=400))(failed)
+        queryset = MagicMock()
+        tolerant(queryset, failed)
+        queryset.read_preference.assert_called_once()
+
+
+class JobQueueTests(SimpleTestCase):
+
+    def claimed(self, name="test_job", attempts=1, max_attempts=3, payload=None):
+        return {
+            "_id": "j1", "name": name, "payload": payload or {}, "status": "running",
+            "attempts": attempts, "max_attempts": max_attempts, "locked_by": "w1",
+        }
+
+    def register(self, name, handler):
+        from backend import jobs
+
+        jobs.job(name)(handler)
+        self.addCleanup(jobs._handlers.pop, name, None)
+
+    @patch("backend.jobs.Job")
+    def test_enqueue_joins_the_callers_transaction(self, MockJob):
+        """A job is inserted with the session of the write that caused it."""
+        from backend.jobs import enqueue
+
+        session = object()
+        enqueue("test_job", {"a": 1}, session=session)
+
+        doc = MockJob._get_collection.return_value.insert_one.call_args[0][0]
+        self.assertEqual((doc["name"], doc["payload"], doc["status"], doc["attempts"]), ("test_job", {"a": 1}, "queued", 0))
+        self.assertIs(MockJob._get_collection.return_value.insert_one.call_args[1]["session"], session)
+
+    @patch("backend.jobs.Job")
+    def test_success_marks_job_done(self, MockJob):
+        """A handler that returns finishes the job under the worker's lease."""
+        from backend.jobs import execute
+
+        calls = []
+        self.register("test_job", lambda **payload: calls.append(payload))
+
+        self.assertEqual(execute(self.claimed(payload={"a": 1}), "w1"), "done")
+        self.assertEqual(calls, [{"a": 1}])
+        lease, update = MockJob._get_collection.return_value.update_one.call_args[0]
+        self.assertEqual(lease, {"_id": "j1", "locked_by": "w1"})
+        self.assertEqual(update["$set"]["status"], "done")
+
+    @patch("backend.jobs.Job")
+    def test_failure_is_retried_with_backoff(self, MockJob):
+        """A failing job goes back to the queue later, with its error recorded."""
+        from datetime import datetime, timedelta
+        from backend.jobs import BACKOFF_BASE_SECONDS, execute
+
+        def fail(**payload):
+            raise RuntimeError("smtp down")
+
+        self.register("test_job", fail)
+        now = datetime(2026, 1, 1)
+
+        self.assertEqual(execute(self.claimed(attempts=2), "w1", now=now), "queued")
+        update = MockJob._get_collection.return_value.update_one.call_args[0][1]
+        self.assertEqual(update["$set"]["status"], "queued")
+        self.assertIn("smtp down", update["$set"]["last_error"])
+        delay = update["$set"]["run_at"] - now
+        self.assertTrue(timedelta(seconds=BACKOFF_BASE_SECONDS) <= delay <= timedelta(seconds=2 * BACKOFF_BASE_SECONDS))
+
+    @patch("backend.jobs.Job")
+    def test_last_attempt_and_unknown_jobs_are_dead(self, MockJob):
+        """Jobs out of attempts, or without a handler, are parked as dead."""
+        from backend.jobs import execute
+
+        def fail(**payload):
+            raise RuntimeError("boom")
+
+        self.register("test_job", fail)
+        self.assertEqual(execute(self.claimed(attempts=3), "w1"), "dead")
+        self.assertEqual(execute(self.claimed(name="no_such_job"), "w1"), "dead")
+        update = MockJob._get_collection.return_value.update_one.call_args[0][1]
+        self.assertIn("no_such_job", update["$set"]["last_error"])
+
+    @patch("backend.jobs.Job")
+    def test_claim_takes_due_jobs_and_expired_leases(self, MockJob):
+        """Workers lease queued jobs that are due and jobs whose holder died."""
+        from datetime import datetime
+        from backend.jobs import LEASE, claim
+
+        now = datetime(2026, 1, 1)
+        claim("w2", now=now)
+
+        query, update = MockJob._get_collection.return_value.find_one_and_update.call_args[0]
+        self.assertIn({"status": "queued", "run_at": {"$lte": now}}, query["$or"])
+        self.assertIn({"status": "running", "locked_until": {"$lt": now}}, query["$or"])
+        self.assertEqual(update["$set"], {"status": "running", "locked_by": "w2", "locked_until": now + LEASE})
+        self.assertEqual(update["$inc"], {"attempts": 1})
+
+    @patch("backend.tasks.booking_tickets")
+    @patch("backend.tasks.recommendations")
+    @patch("backend.tasks.send_mail")
+    @patch("backend.tasks.Event")
+    @patch("backend.tasks.Booking")
+    def test_booking_confirmed_emails_guest_and_organizer(self, MockBooking, MockEvent, mock_send, mock_recs, mock_tickets):
+        """The confirmation job emails both parties and refreshes related lists."""
+        from backend.tasks import booking_confirmed
+
+        from datetime import date
+        from backend.models import Booking, Seat
+
+        MockBooking.objects.return_value.first.return_value = Booking(
+            user_name="Ann", num_tickets=1, total_price=30.0, seats=[Seat(row=2, column=5)],
+        )
+        MockEvent.objects.return_value.only.return_value.first.return_value = MagicMock(
+            title="Test Event", date=date(2026, 5, 1), time="20:00", location="Club", city="Warsaw",
+            organizer_email="org@example.com",
+        )
+
+        booking_confirmed("b1", "event123", "test@example.com")
+
+        self.assertEqual([c[0][3] for c in mock_send.call_args_list], [["test@example.com"], ["org@example.com"]])
+        subject, body = mock_send.call_args_list[0][0][:2]
+        self.assertEqual(subject, "Your booking for Test Event")
+        self.assertIn("1 ticket(s) for Test Event on 2026-05-01 at 20:00, Club, Warsaw.\nSeats: row 2 seat 5", body)
+        self.assertNotIn("None", body)
+        mock_recs.booking_changed.assert_called_once_with("event123", "test@example.com")
+        # Tickets rendered into a per-process cache would never reach the web workers
+        mock_tickets.assert_not_called()
+        with override_settings(TICKETS={"PRERENDER": True}):
+            booking_confirmed("b1", "event123", "test@example.com")
+        mock_tickets.assert_called_once()
+
+
+class TicketTests(SimpleTestCase):
+
+    def make_board(self, organizer="org@example.com"):
+        from backend.checkin import CheckInBoard
+        from backend.hall import SeatIndex, default_layout_dict
+
+        return CheckInBoard("64b000000000000000000001", SeatIndex(default_layout_dict()), organizer)
+
+    def test_tokens_verify_offline_and_reject_tampering(self):
+        """A token round-trips to its seat; any edit breaks the signature."""
+        from backend.tickets import InvalidTicket, read_ticket, ticket_token
+
+        token = ticket_token("e1", "b1", 7)
+        self.assertEqual(read_ticket(token), ("e1", "b1", 7))
+        with self.assertRaises(InvalidTicket):
+            read_ticket(token.replace("e1.b1.7", "e1.b1.8"))
+        with self.assertRaises(InvalidTicket):
+            read_ticket("garbage")
+
+    def test_tickets_are_built_per_seat_and_cached(self):
+        """Every seat gets a signed ticket, rendered once per booking."""
+        from django.core.cache import cache
+        from backend.models import Seat
+        from backend.tickets import CACHE_KEY, booking_tickets, read_ticket
+
+        booking = make_booking(id="b42", event_id="e1")
+        booking.seats = [Seat(row=1, column=1), Seat(row=2, column=3)]
+        self.addCleanup(cache.delete, CACHE_KEY % "b42")
+        event = make_event(hall_layout=None)
+
+        tickets = booking_tickets(booking, event)
+        self.assertEqual([read_ticket(t["token"]) for t in tickets], [("e1", "b42", 0), ("e1", "b42", 12)])
+        with patch("backend.tickets.build_tickets") as mock_build:
+            self.assertEqual(booking_tickets(booking, event), tickets)
+            mock_build.assert_not_called()
+
+    def test_board_admits_each_seat_once(self):
+        """Admission is decided in memory: repeats, cancelled bookings and bad seats are refused."""
+        board = self.make_board()
+        board.revoked.add("cancelled")
+
+        self.assertEqual(board.admit("b1", 5, by="door@example.com"), "ok")
+        self.assertEqual(board.admit("b1", 5), "duplicate")
+        self.assertEqual(board.admit("cancelled", 6), "revoked")
+        self.assertEqual(board.admit("b1", 10_000), "invalid")
+        self.assertEqual([d["ordinal"] for d in board.pending], [5])
+
+    @patch("backend.checkin.EventBooking")
+    @patch("backend.checkin.CheckIn")
+    def test_sync_stores_admissions_and_merges_other_workers(self, MockCheckIn, MockBooking):
+        """Sync writes queued admissions and picks up other doors' scans and cancellations."""
+        from bson import ObjectId
+
+        board = self.make_board()
+        board.admit("b1", 5)
+        MockCheckIn._get_collection.return_value.find.return_value = [{"ordinal": 9}]
+        cancelled = ObjectId()
+        MockBooking._get_collection.return_value.find.return_value = [{"_id": cancelled}]
+
+        board.sync()
+
+        stored = MockCheckIn._get_collection.return_value.insert_many.call_args[0][0]
+        self.assertEqual([d["ordinal"] for d in stored], [5])
+        self.assertEqual(board.pending, [])
+        self.assertEqual(board.admit("b2", 9), "duplicate")
+        self.assertEqual(board.admit(str(cancelled), 11), "revoked")
+
+    @patch("backend.checkin.CheckIn")
+    def test_failed_flush_keeps_admissions_queued(self, MockCheckIn):
+        """Admissions are retried if Mongo is unreachable; duplicates are dropped."""
+        from pymongo.errors import BulkWriteError, AutoReconnect
+
+        board = self.make_board()
+        board.admit("b1", 1)
+        board.admit("b2", 2)
+        MockCheckIn._get_collection.return_value.insert_many.side_effect = BulkWriteError({"writeErrors": [
+            {"index": 0, "code": 11000}, {"index": 1, "code": 91},
+        ]})
+        board.flush()
+        self.assertEqual([d["ordinal"] for d in board.pending], [2])
+
+        MockCheckIn._get_collection.return_value.insert_many.side_effect = AutoReconnect()
+        board.flush()
+        self.assertEqual([d["ordinal"] for d in board.pending], [2])
+
+    @patch("backend.checkin._start_syncer")
+    @patch("backend.checkin.changes_since", return_value=([], set()))
+    @patch("backend.checkin.seat_index_for")
+    @patch("backend.checkin.Event")
+    def test_slow_board_load_does_not_block_other_events(self, MockEvent, mock_index, mock_changes, mock_syncer):
+        """Loading one event's board holds no lock the other events' scans need."""
+        import threading
+        from backend import checkin
+
+        mock_index.return_value = MagicMock(size=10)
+        loading, release = threading.Event(), threading.Event()
+
+        def get(id):
+            if id == "slow":
+                loading.set()
+                release.wait(5)
+            return MagicMock(created_by="org@example.com")
+
+        MockEvent.objects.only.return_value.get.side_effect = get
+        with patch.dict(checkin._boards, clear=True):
+            slow = threading.Thread(target=checkin.get_board, args=("slow",))
+            slow.start()
+            self.assertTrue(loading.wait(5))
+            try:
+                self.assertEqual(checkin.get_board("fast").event_id, "fast")
+            finally:
+                release.set()
+                slow.join(5)
+            self.assertEqual(set(checkin._boards), {"slow", "fast"})
+
+    @patch("backend.views.get_board")
+    def test_check_in_endpoint(self, mock_get_board):
+        """Door staff scan tickets; a second scan of the same seat is refused."""
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.tickets import ticket_token
+        from backend.views import event_check_in
+
+        board = self.make_board(organizer="test@example.com")
+        mock_get_board.return_value = board
+        event_id = board.event_id
+
+        def scan(token, user=None):
+            request = APIRequestFactory().post(f"/api/events/{event_id}/check-in/", {"ticket": token}, format="json")
+            force_authenticate(request, user=user or make_user())
+            return event_check_in(request, event_id=event_id)
+
+        token = ticket_token(event_id, "b1", 12)
+        response = scan(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["result"], response.data["row"], response.data["column"]), ("ok", 2, 3))
+        self.assertEqual(scan(token).data["result"], "duplicate")
+        self.assertEqual(scan("forged:token").status_code, 400)
+        self.assertEqual(scan(ticket_token("64b000000000000000000099", "b1", 1)).status_code, 409)
+        self.assertEqual(scan(token, user=make_user(email="fan@example.com")).status_code, 403)
+
+
+class OfflineCheckInTests(SimpleTestCase):
+
+    EVENT_ID = "64b000000000000000000001"
+
+    @patch("backend.snapshot.EventBooking")
+    def test_snapshot_round_trip_and_signature(self, MockEventBooking):
+        """The snapshot lists sold seats by ordinal with their booking; any edit is detected."""
+        from bson import ObjectId
+        from backend.hall import SeatIndex, default_layout_dict
+        from backend.snapshot import build_snapshot, read_snapshot
+
+        b1, b2 = ObjectId(), ObjectId()
+        MockEventBooking._get_collection.return_value.find.return_value = [
+            {"_id": b1, "ordinals": [10, 2]},
+            {"_id": b2, "ordinals": [0, 10_000]},
+        ]
+        data = build_snapshot(self.EVENT_ID, SeatIndex(default_layout_dict()), admitted=[2], cursor=1_700_000_000)
+
+        snapshot = read_snapshot(data)
+        self.assertEqual(snapshot["event_id"], self.EVENT_ID)
+        self.assertEqual(snapshot["cursor"], 1_700_000_000)
+        self.assertEqual(snapshot["seats"], {0: str(b2), 2: str(b1), 10: str(b1)})
+        self.assertEqual(snapshot["admitted"], [2])
+        query = MockEventBooking._get_collection.return_value.find.call_args[0][0]
+        self.assertEqual(query, {"event_id": self.EVENT_ID, "booking_status": "Confirmed"})
+
+        tampered = bytearray(data)
+        tampered[30] ^= 1
+        with self.assertRaises(ValueError):
+            read_snapshot(bytes(tampered))
+
+    @patch("backend.snapshot.EventBooking")
+    @patch("backend.checkin.CheckIn")
+    @patch("backend.views.changes_since")
+    @patch("backend.views.get_board")
+    def test_sync_uploads_offline_scans_and_returns_changes(self, mock_get_board, mock_changes, MockCheckIn, MockCopies):
+        """Offline admissions keep their scan time; the reply carries others' changes since the cursor."""
+        from datetime import datetime
+        from bson import ObjectId
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.checkin import CheckInBoard
+        from backend.hall import SeatIndex, default_layout_dict
+        from backend.tickets import ticket_token
+        from backend.views import check_in_sync
+
+        board = CheckInBoard(self.EVENT_ID, SeatIndex(default_layout_dict()), "test@example.com")
+        board.admit("b0", 4)
+        board.pending.clear()
+        mock_get_board.return_value = board
+        mock_changes.return_value = ([7, 7, 3], {"b9"})
+        new_booking = ObjectId()
+        MockCopies._get_collection.return_value.find.return_value = [{"_id": new_booking, "ordinals": [12, 11]}]
+
+        request = APIRequestFactory().post(f"/api/events/{self.EVENT_ID}/check-in/sync/", {
+            "cursor": 1_700_000_000,
+            "admissions": [
+                {"ticket": ticket_token(self.EVENT_ID, "b1", 5), "checked_in_at": 1_700_000_100},
+                {"ticket": ticket_token(self.EVENT_ID, "b2", 4), "checked_in_at": 1_700_000_200},
+                {"ticket": "forged", "checked_in_at": 1_700_000_300},
+            ],
+        }, format="json")
+        force_authenticate(request, user=make_user())
+        response = check_in_sync(request, event_id=self.EVENT_ID)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], ["ok", "duplicate", "invalid"])
+        self.assertEqual((response.data["admitted"], response.data["revoked"]), ([3, 7], ["b9"]))
+        stored = MockCheckIn._get_collection.return_value.insert_many.call_args[0][0]
+        self.assertEqual([(d["ordinal"], d["checked_in_at"]) for d in stored], [(5, datetime(2023, 11, 14, 22, 15))])
+        mock_changes.assert_called_once_with(self.EVENT_ID, datetime(2023, 11, 14, 22, 13, 20))
+        # Tickets bought after the snapshot scan offline without a new snapshot
+        self.assertEqual(response.data["sold"], [[11, str(new_booking)], [12, str(new_booking)]])
+        query = MockCopies._get_collection.return_value.find.call_args[0][0]
+        self.assertEqual(query["created_at"], {"$gte": datetime(2023, 11, 14, 22, 12, 20)})
+
+
+class StartupTests(SimpleTestCase):
+
+    def test_loading_the_app_opens_no_connection(self):
+        """Settings, app loading and URL resolution do no Mongo I/O and leave numpy for later."""
+        import os
+        import subprocess
+        import sys
+        from django.conf import settings
+
+        code = (
+            "import sys, django; django.setup()\n"
+            "from django.urls import get_resolver; get_resolver().url_patterns\n"
+            "import mongoengine.connection as c\n"
+            "print('default' in c._connections, 'numpy' in sys.modules)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "eventbookingapp.settings"},
+        )
+        self.assertEqual(result.stdout.split(), ["False", "False"], result.stderr)
+
+    def test_warm_up_never_raises(self):
+        """A worker whose warmup fails still starts; every step is timed."""
+        from backend.startup import warm_up
+
+        with patch("backend.startup.get_connection", side_effect=RuntimeError("no route")), \
+                patch("backend.invalidation.get_bus"), \
+                patch("backend.feed.get_matrix", side_effect=RuntimeError("no route")):
+            timings = warm_up()
+        self.assertEqual(list(timings), ["mongo", "invalidation bus", "feed matrix"])
+
+    def test_index_creation_follows_settings(self):
+        """With MONGO_AUTO_CREATE_INDEXES off, no document creates indexes on first use."""
+        from django.test import override_settings
+        from backend.models import Booking, Event
+        from backend.startup import configure_indexes, documents
+
+        self.addCleanup(configure_indexes)
+        self.assertIn(Booking, documents())
+        with override_settings(MONGO_AUTO_CREATE_INDEXES=False):
+            configure_indexes()
+        self.assertFalse(Event._meta["auto_create_index"])
+
+    def test_health_needs_no_auth_or_database(self):
+        """The readiness probe answers anonymously."""
+        from rest_framework.test import APIRequestFactory
+        from backend.views import health
+
+        response = health(APIRequestFactory().get("/api/health/"))
+        self.assertEqual((response.status_code, response.data), (200, {"status": "ok"}))
+
+
+class SlowQueryLogTests(SimpleTestCase):
+
+    def event(self, kind, name="find", command=None, micros=0, request_id=1):
+        from unittest.mock import NonCallableMagicMock
+
+        event = NonCallableMagicMock(
+            command_name=name, connection_id=("db", 27017), request_id=request_id,
+            database_name="app", duration_micros=micros,
+        )
+        event.command = command or {}
+        return event
+
+    def test_query_shape_drops_values_and_keeps_structure(self):
+        """Filters that differ only in values share one shape."""
+        from backend.slowlog import command_shape
+
+        shape = command_shape("find", {
+            "find": "events",
+            "filter": {"status": "Published", "date": {"$gte": "2026-01-01"}, "category": {"$in": ["a", "b"]},
+                       "$or": [{"title": "x"}, {"city": "y"}]},
+            "sort": {"date": 1},
+        })
+        self.assertEqual(shape, {
+            "filter": {"status": 1, "date": {"$gte": 1}, "category": {"$in": 1}, "$or": [{"title": 1}, {"city": 1}]},
+            "sort": {"date": 1},
+        })
+        self.assertEqual(
+            command_shape("update", {"update": "bookings", "updates": [{"q": {"_id": 1, "user_email": "a"}, "u": {}}]}),
+            {"filter": {"_id": 1, "user_email": 1}},
+        )
+
+    @patch("backend.slowlog.write")
+    def test_listener_records_slow_commands_with_their_view(self, mock_write):
+        """Only commands over the threshold are recorded, tagged with the running view."""
+        from backend.slowlog import SlowQueryListener, operation
+
+        explainer = MagicMock()
+        listener = SlowQueryListener(threshold_ms=50, explain=True, explain_interval=600, explainer=explainer)
+        command = {"find": "bookings", "filter": {"event_id": "e1"}, "lsid": {"id": 1}}
+
+        with operation("backend.views.fetch_events"):
+            listener.started(self.event("started", command=command, request_id=1))
+            listener.started(self.event("started", command=command, request_id=2))
+        listener.succeeded(self.event("succeeded", micros=10_000, request_id=1))
+        listener.succeeded(self.event("succeeded", micros=80_000, request_id=2))
+
+        database, explained, record = explainer.submit.call_args[0]
+        self.assertEqual((database, explained), ("app", command))
+        self.assertEqual(record["view"], "backend.views.fetch_events")
+        self.assertEqual((record["collection"], record["ms"]), ("bookings", 80.0))
+        self.assertEqual(record["shape"], {"filter": {"event_id": 1}})
+
+        # The same shape is explained once per interval; the rest are written directly
+        listener.started(self.event("started", command=command, request_id=3))
+        listener.succeeded(self.event("succeeded", micros=90_000, request_id=3))
+        self.assertEqual(explainer.submit.call_count, 1)
+        self.assertEqual(mock_write.call_count, 1)
+
+    @patch("backend.slowlog.write")
+    def test_change_stream_waits_are_not_recorded(self, mock_write):
+        """A getMore blocking on awaitData is idle time; a plain getMore is still timed."""
+        from backend.slowlog import SlowQueryListener
+
+        listener = SlowQueryListener(threshold_ms=50, explain=False)
+        awaiting = {"getMore": 1, "collection": "events", "maxTimeMS": 1000}
+        listener.started(self.event("started", name="getMore", command=awaiting, request_id=1))
+        listener.succeeded(self.event("succeeded", name="getMore", micros=1_000_000, request_id=1))
+        mock_write.assert_not_called()
+
+        plain = {"getMore": 1, "collection": "events"}
+        listener.started(self.event("started", name="getMore", command=plain, request_id=2))
+        listener.succeeded(self.event("succeeded", name="getMore", micros=80_000, request_id=2))
+        mock_write.assert_called_once()
+
+    def test_explain_summary(self):
+        """The winning plan is flattened from the root stage to the index scan."""
+        from backend.slowlog import summarize_explain
+
+        summary = summarize_explain({
+            "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "event_id_1"}}},
+            "executionStats": {"nReturned": 3, "totalKeysExamined": 3, "totalDocsExamined": 3, "executionTimeMillis": 120},
+        })
+        self.assertEqual(summary["plan"], "FETCH <- IXSCAN(event_id_1)")
+        self.assertEqual((summary["docs_examined"], summary["millis"]), (3, 120))
+
+    def test_admin_endpoint_groups_log_by_shape(self):
+        """Admins browse the rotating log grouped by shape; others are refused."""
+        import json
+        import os
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.views import slow_queries
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "slow.log")
+        records = [
+            {"collection": "events", "command": "find", "shape": {"filter": {"status": 1}}, "ms": 120, "view": "v1"},
+            {"collection": "events", "command": "find", "shape": {"filter": {"status": 1}}, "ms": 300, "view": "v2",
+             "explain": {"plan": "COLLSCAN"}},
+            {"collection": "bookings", "command": "find", "shape": {"filter": {}}, "ms": 110, "view": "v1"},
+        ]
+        with open(path + ".1", "w") as f:
+            f.write(json.dumps(records[0]) + "\n")
+        with open(path, "w") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records[1:]) + "not json\n")
+        self.addCleanup(shutil.rmtree, directory)
+
+        def get(user, query=""):
+            request = APIRequestFactory().get("/api/admin/slow-queries/" + query)
+            force_authenticate(request, user=user)
+            return slow_queries(request)
+
+        with override_settings(SLOW_QUERIES={"LOG_FILE": path, "BACKUP_COUNT": 2}):
+            self.assertEqual(get(make_user()).status_code, 403)
+            groups = get(make_user(role="admin")).data
+            raw = get(make_user(role="admin"), "?group=none&collection=bookings").data
+
+        self.assertEqual([(g["collection"], g["count"], g["max_ms"]) for g in groups], [("events", 2, 300), ("bookings", 1, 110)])
+        self.assertEqual(groups[0]["views"], ["v1", "v2"])
+        self.assertEqual(groups[0]["explain"], {"plan": "COLLSCAN"})
+        self.assertEqual(len(raw), 1)
+
+
+@override_settings(PROFILING={"ENABLED": True, "SHARED_CACHE": True})
+class ProfilerTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_sampler_collapses_stacks_of_watched_threads(self):
+        """Only watched request threads are sampled, with the view as the root frame."""
+        import threading
+        import time
+        from backend.profiling import Sampler, results
+
+        done = threading.Event()
+
+        def busy_booking_handler():
+            while not done.is_set():
+                sum(range(100))
+
+        worker = threading.Thread(target=busy_booking_handler)
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(done.set)
+
+        sampler = Sampler({"id": "s1", "until": time.time() + 60, "interval": 0.001, "views": []}, worker="w1")
+        sampler.watch(worker.ident, "create_booking")
+        for _ in range(5):
+            sampler.sample()
+        sampler.flush()
+
+        merged = results("s1")
+        self.assertEqual((merged["workers"], merged["requests"]), (1, 1))
+        self.assertEqual(sum(merged["stacks"].values()), 5)
+        stack = next(iter(merged["stacks"]))
+        self.assertTrue(stack.startswith("create_booking;"))
+        self.assertIn("busy_booking_handler", stack)
+
+    def test_middleware_samples_backend_views_only(self):
+        """Sessions pick views from backend/views.py by name and honour the rate."""
+        from backend.profiling import ProfilingMiddleware
+        from backend.views import create_booking, fetch_events
+
+        middleware = ProfilingMiddleware(lambda request: None)
+        session = {"id": "s2", "until": 2e9, "rate": 1.0, "interval": 0.01, "views": ["create_booking"]}
+        sampler = MagicMock()
+        with patch("backend.profiling.active_session", return_value=session), \
+                patch("backend.profiling.sampler_for", return_value=sampler):
+            for view in (create_booking, fetch_events, lambda request: None):
+                middleware.process_view(MagicMock(spec=[]), view, (), {})
+        self.assertEqual([c[0][1] for c in sampler.watch.call_args_list], ["create_booking"])
+
+    def test_admin_endpoint(self):
+        """Admins start a session, then read merged samples; others are refused."""
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.profiling import STACKS_KEY, SLOT_KEY
+        from backend.views import profiler
+        from django.core.cache import cache
+
+        def call(method, user, data=None, query=""):
+            request = getattr(APIRequestFactory(), method)("/api/admin/profile/" + query, data, format="json")
+            force_authenticate(request, user=user)
+            return profiler(request)
+
+        admin = make_user(role="admin")
+        self.assertEqual(call("post", make_user(), {"seconds": 5}).status_code, 403)
+        self.assertEqual(call("post", admin, {"seconds": 5000}).status_code, 400)
+        session = call("post", admin, {"seconds": 5, "rate": 0.5, "views": ["create_booking"]}).data
+
+        cache.set(SLOT_KEY % (session["id"], 0), "w1")
+        cache.set(STACKS_KEY % (session["id"], 0), {"requests": 2, "stacks": {"create_booking;a:f;b:g": 3, "create_booking;a:f": 1}})
+        summary = call("get", admin).data
+        self.assertEqual((summary["requests"], summary["samples"]), (2, 4))
+        self.assertEqual(summary["top"][0], {"function": "b:g", "samples": 3, "percent": 75.0})
+        text = call("get", admin, query="?output=collapsed").content.decode()
+        self.assertEqual(text, "create_booking;a:f;b:g 3\ncreate_booking;a:f 1\n")
+        self.assertEqual(call("delete", admin).data, {"stopped": True})
+
+        with override_settings(PROFILING={"ENABLED": False}):
+            self.assertEqual(call("get", admin).status_code, 409)
+        with override_settings(PROFILING={"ENABLED": True, "SHARED_CACHE": False}):
+            self.assertEqual(call("post", admin, {"seconds": 5, "rate": 1}).status_code, 409)
+
+
+class PricingTests(SimpleTestCase):
+
+    def make_index(self):
+        from backend.hall import SeatIndex
+
+        return SeatIndex({
+            "name": "Club",
+            "price_tiers": {"A": 80, "B": 40},
+            "sections": [
+                {"name": "Floor", "price_tier": "A", "rows": [{"seats": 5}]},
+                {"name": "Balcony", "price_tier": "B", "rows": [{"seats": 5}]},
+                {"name": "Standing", "rows": [{"seats": 10}]},
+            ],
+        })
+
+    def make_priced_event(self, ticket_type="Paid", steps=()):
+        from backend.pricing import steps_from_list
+
+        event = make_event()
+        event.price = 25.0
+        event.ticket_type = ticket_type
+        event.demand_pricing = steps_from_list(list(steps))
+        return event
+
+    def test_tier_and_flat_prices(self):
+        """Seats cost their tier price, untiered rows the event price; Free is 0."""
+        from backend.pricing import seats_total
+
+        index = self.make_index()
+        ordinals = [index.ordinal(1, 1), index.ordinal(2, 1), index.ordinal(3, 1)]
+        self.assertEqual(seats_total(self.make_priced_event(), index, ordinals), 145.0)
+        self.assertEqual(seats_total(self.make_priced_event("Free"), index, ordinals), 0.0)
+
+    def test_demand_steps(self):
+        """The highest step reached by the sold share multiplies every seat."""
+        from backend.pricing import describe, seats_total
+
+        index = self.make_index()
+        event = self.make_priced_event(steps=[{"sold_ratio": 0.9, "multiplier": 2}, {"sold_ratio": 0.5, "multiplier": 1.5}])
+        inventory = MagicMock(taken=list(range(10)))
+        self.assertEqual(seats_total(event, index, [index.ordinal(3, 1)], inventory), 37.5)
+        prices = describe(event, index, inventory)
+        self.assertEqual((prices["multiplier"], prices["tiers"], prices["rows"]), (1.5, {"A": 120.0, "B": 60.0}, [120.0, 60.0, 37.5]))
+        inventory.taken = list(range(19))
+        self.assertEqual(seats_total(event, index, [index.ordinal(3, 1)], inventory), 50.0)
+
+    def test_rejects_invalid_steps(self):
+        from backend.pricing import steps_from_list
+
+        for steps in ({"sold_ratio": 0.5}, [{"sold_ratio": 1.5, "multiplier": 2}], [{"sold_ratio": 0.5, "multiplier": 0}], [{}],
+                      [{"sold_ratio": 0.5, "multiplier": "inf"}], [{"sold_ratio": "nan", "multiplier": 2}]):
+            with self.assertRaises(ValueError):
+                steps_from_list(steps)
+
+    def test_layout_rejects_non_finite_numbers(self):
+        """NaN or infinite tier prices and section scores are not numbers a hall can use."""
+        from backend.hall import layout_from_dict
+
+        rows = [{"seats": 3, "price_tier": "A"}]
+        for tiers, score in (({"A": "nan"}, 0), ({"A": "inf"}, 0), ({"A": 10}, "nan")):
+            with self.assertRaises(ValueError):
+                layout_from_dict({"price_tiers": tiers, "sections": [{"name": "Main", "score": score, "rows": rows}]})
+
+    def test_checkout_total_validates_the_client_total(self):
+        """A stale client total is refused; donations may pay more."""
+        from backend.pricing import PriceChanged, checkout_total
+
+        index = self.make_index()
+        ordinals = [index.ordinal(1, 1), index.ordinal(1, 2)]
+        event = self.make_priced_event()
+        self.assertEqual(checkout_total(event, index, ordinals), 160.0)
+        self.assertEqual(checkout_total(event, index, ordinals, offered="160.001"), 160.0)
+        with self.assertRaises(PriceChanged) as raised:
+            checkout_total(event, index, ordinals, offered=50)
+        self.assertEqual(raised.exception.expected, 160.0)
+        donation = self.make_priced_event("Donation")
+        self.assertEqual(checkout_total(donation, index, ordinals, offered=200), 200.0)
+        with self.assertRaises(PriceChanged):
+            checkout_total(donation, index, ordinals, offered=100)
+
+    @patch("backend.admission.admission_rate", return_value=0)
+    @patch("backend.views.place_booking")
+    @patch("backend.views.get_inventory")
+    @patch("backend.views.seat_index_for")
+    @patch("backend.views.Event")
+    def test_create_booking_charges_the_server_price(self, MockEvent, mock_index, mock_inventory, mock_place, _):
+        """The booking stores the computed total; a mismatch is a 409 with the new total."""
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.views import create_booking
+
+        index = self.make_index()
+        MockEvent.objects.get.return_value = self.make_priced_event()
+        mock_index.return_value = index
+        mock_inventory.return_value = MagicMock(taken=[])
+        mock_place.return_value = True
+
+        def book(total):
+            data = {"event_id": "event123", "seats": [{"row": 2, "column": 1}], "total_price": total}
+            request = APIRequestFactory().post("/api/bookings/create/", data, format="json")
+            force_authenticate(request, user=make_user(email="buyer@example.com"))
+            return create_booking(request)
+
+        response = book(1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["total_price"], 40.0)
+        mock_place.assert_not_called()
+        self.assertEqual(book(40).status_code, 200)
+        self.assertEqual(mock_place.call_args[0][1].total_price, 40.0)
+
+
+class RecurrenceTests(SimpleTestCase):
+
+    def make_series(self, start, **rule):
+        from bson import ObjectId
+        from backend.models import Event, Recurrence
+
+        return Event(
+            id=ObjectId("64b000000000000000000010"), title="Weekly show", category="Music",
+            date=start, time="20:00", location="Club", city="Warsaw", price=30.0,
+            recurrence=Recurrence(**rule),
+        )
+
+    def test_window_jump_matches_full_expansion(self):
+        """Starting at the window gives the same dates as expanding from the start."""
+        from datetime import date
+        from backend.models import Recurrence
+        from backend.recurrence import occurrences
+
+        start, window = date(2026, 1, 7), (date(2026, 6, 1), date(2026, 7, 31))
+        for rule in (
+            Recurrence(freq="daily", interval=3, count=60),
+            Recurrence(freq="weekly", interval=2, weekdays=[0, 2, 4], count=50),
+            Recurrence(freq="weekly", until=date(2026, 7, 1)),
+        ):
+            full = [d for d in occurrences(start, rule, window_end=window[1]) if d >= window[0]]
+            self.assertEqual(list(occurrences(start, rule, *window)), full)
+            self.assertTrue(full)
+
+    def test_monthly_exdates_and_count(self):
+        """Months without the day are skipped; count includes cancelled dates."""
+        from datetime import date
+        from backend.models import Recurrence
+        from backend.recurrence import occurrences
+
+        rule = Recurrence(freq="monthly", count=4, exdates=[date(2026, 3, 31)])
+        self.assertEqual(
+            list(occurrences(date(2026, 1, 31), rule)),
+            [date(2026, 1, 31), date(2026, 5, 31), date(2026, 7, 31)],
+        )
+
+    def test_recurrence_from_dict(self):
+        from backend.recurrence import recurrence_from_dict
+
+        rule = recurrence_from_dict({"freq": "weekly", "weekdays": ["FR", "MO", 0], "until": "2026-12-31"})
+        self.assertEqual(rule.weekdays, [0, 4])
+        for bad in ({"freq": "yearly"}, {"freq": "daily", "weekdays": [1]}, {"freq": "weekly", "interval": 0}, []):
+            with self.assertRaises(ValueError):
+                recurrence_from_dict(bad)
+
+    def test_expand_skips_materialized_dates(self):
+        """Listings get virtual occurrences by date, except dates already stored."""
+        from datetime import date, datetime
+        from backend.recurrence import expand, split_occurrence_id
+
+        series = self.make_series(date(2026, 3, 2), freq="weekly")
+        docs = list(expand([series], date(2026, 3, 1), date(2026, 3, 31), {(str(series.id), date(2026, 3, 9))}))
+        self.assertEqual([d["date"].day for d in docs], [2, 16, 23, 30])
+        self.assertEqual(split_occurrence_id(docs[0]["_id"]), (str(series.id), date(2026, 3, 2)))
+        self.assertEqual((docs[0]["series_id"], docs[0]["title"]), (str(series.id), "Weekly show"))
+        self.assertNotIn("recurrence", docs[0])
+        self.assertEqual(docs[1]["date"], datetime(2026, 3, 16))
+
+    @patch("backend.recurrence.Event")
+    def test_materialize_inserts_once(self, MockEvent):
+        """The occurrence gets a stable id; a concurrent insert is read back."""
+        from datetime import date
+        from pymongo.errors import DuplicateKeyError
+        from backend.recurrence import materialize, materialized_id
+
+        series = self.make_series(date(2026, 3, 2), freq="weekly")
+        MockEvent.objects.filter.return_value.first.return_value = series
+        MockEvent.DoesNotExist = Exception
+        collection = MockEvent._get_collection.return_value
+        collection.insert_one.side_effect = DuplicateKeyError("dup")
+
+        materialize(f"{series.id}:2026-03-09")
+        doc = collection.insert_one.call_args[0][0]
+        self.assertEqual(doc["_id"], materialized_id(str(series.id), date(2026, 3, 9)))
+        self.assertEqual((doc["series_id"], doc["attendees_count"]), (str(series.id), 0))
+        MockEvent.objects.get.assert_called_once_with(id=doc["_id"])
+        with self.assertRaises(Exception):
+            materialize(f"{series.id}:2026-03-10")
+
+    @patch("backend.admission.admission_rate", return_value=0)
+    @patch("backend.views.place_booking", return_value=True)
+    @patch("backend.views.get_inventory")
+    @patch("backend.views.materialize")
+    @patch("backend.views.occurrence_event")
+    def test_occurrence_is_stored_only_for_a_valid_booking(
+        self, mock_occurrence, mock_materialize, mock_inventory, mock_place, _,
+    ):
+        """A rejected booking of an unbooked date writes nothing; an accepted one stores it first."""
+        from datetime import date
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.models import Event
+        from backend.recurrence import materialized_id
+        from backend.views import create_booking
+
+        occurrence_id = "64b000000000000000000010:2026-03-09"
+        unsaved = Event(id=materialized_id("64b000000000000000000010", date(2026, 3, 9)), title="Weekly show",
+                        price=30.0, ticket_type="Paid", created_by="org@example.com")
+        mock_occurrence.return_value = (unsaved, False)
+        stored = make_event(id=str(unsaved.id))
+        mock_materialize.return_value = stored
+
+        def book(seats, total):
+            data = {"event_id": occurrence_id, "seats": seats, "total_price": total}
+            request = APIRequestFactory().post("/api/bookings/create/", data, format="json")
+            force_authenticate(request, user=make_user(email="buyer@example.com"))
+            return create_booking(request)
+
+        self.assertEqual(book([{"row": 99, "column": 1}], 30).status_code, 400)
+        self.assertEqual(book([{"row": 1, "column": 1}], 1).status_code, 409)
+        mock_materialize.assert_not_called()
+        mock_inventory.assert_not_called()
+
+        self.assertEqual(book([{"row": 1, "column": 1}], 30).status_code, 200)
+        mock_materialize.assert_called_once_with(occurrence_id)
+        self.assertIs(mock_place.call_args[0][0], stored)
+
+    @patch("backend.views.Event")
+    def test_unwindowed_listing_shows_a_series_as_its_next_date(self, MockEvent):
+        """Without a window a series is listed as its next unbooked date, never as the template."""
+        from datetime import date, timedelta
+        from backend.recurrence import split_occurrence_id
+        from backend.views import next_dates
+
+        today = date.today()
+        series = self.make_series(today - timedelta(days=14), freq="weekly")
+        ended = self.make_series(today - timedelta(days=60), freq="weekly", count=2)
+        single = make_event()
+        single.to_mongo.return_value.to_dict.return_value = {"_id": "event123"}
+        booked_next = MagicMock(series_id=str(series.id), date=today)
+        MockEvent.objects.filter.return_value.only.return_value = [booked_next]
+
+        docs = list(next_dates(RequestFactory().get("/api/events/"), [single, series, ended]))
+
+        self.assertEqual(docs[0], {"_id": "event123"})
+        self.assertEqual(len(docs), 2)
+        self.assertEqual(split_occurrence_id(docs[1]["_id"]), (str(series.id), today + timedelta(days=7)))
+
+    @patch("backend.admission.admission_rate", return_value=0)
+    @patch("backend.views.SeatInventory")
+    @patch("backend.views.get_inventory")
+    @patch("backend.views.Event")
+    @patch("backend.views.stored_event_id", return_value="64b000000000000000000010")
+    def test_unbooked_occurrence_has_no_reserved_seats(self, _, MockEvent, mock_inventory, MockInventory, __):
+        """Reserved seats of an unbooked date are empty and nothing is written for them."""
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from backend.views import get_reserved_seats
+
+        MockEvent.objects.only.return_value.get.return_value = make_event()
+        request = APIRequestFactory().get("/api/events/64b000000000000000000010:2026-03-09/reserved-seats/")
+        force_authenticate(request, user=make_user())
+        response = get_reserved_seats(request, "64b000000000000000000010:2026-03-09")
+
+        self.assertEqual((response.status_code, response.data), (200, []))
+        mock_inventory.assert_not_called()
+        MockInventory.objects.assert_not_called()
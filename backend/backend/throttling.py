@@ -0,0 +1,120 @@
+"""Token-bucket request throttling for DRF views.
+
+Each throttle scope has a bucket of ``capacity`` tokens refilled at
+``refill_rate`` tokens per second (``settings.TOKEN_BUCKETS``). A request
+takes one token from the bucket of its client: the user id for requests
+authenticated by MongoJWTAuthentication, the client IP otherwise. When the
+bucket is empty DRF answers 429 with a ``Retry-After`` header taken from
+``wait()``.
+
+Bucket state is kept by ``settings.TOKEN_BUCKET_STORE``: ``LocalBucketStore``
+(per process) or ``CacheBucketStore`` (Django cache, shared by all workers
+when the cache is Redis).
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_BUCKET = {"capacity": 120, "refill_rate": 2.0}
+
+
+def refill(tokens, last, capacity, refill_rate, now):
+    return min(capacity, tokens + max(0.0, now - last) * refill_rate)
+
+
+class LocalBucketStore:
+    """Buckets in a process-local dict"""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, capacity, refill_rate, now):
+        """Take a token; returns 0 when allowed, else seconds until one is available"""
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = refill(tokens, last, capacity, refill_rate, now)
+            if tokens >= 1:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._prune(now)
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / refill_rate
+
+    def _prune(self, now):
+        # Buckets untouched for a minute are (nearly always) full again; forget them
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < 60}
+
+
+class CacheBucketStore:
+    """Buckets in the Django cache.
+
+    Reads and writes are not atomic, so concurrent requests of one client can
+    occasionally take the same token; acceptable for abuse protection.
+    """
+
+    def take(self, key, capacity, refill_rate, now):
+        tokens, last = cache.get(key) or (capacity, now)
+        tokens = refill(tokens, last, capacity, refill_rate, now)
+        ttl = math.ceil(capacity / refill_rate) + 1
+        if tokens >= 1:
+            cache.set(key, (tokens - 1, now), ttl)
+            return 0
+        cache.set(key, (tokens, now), ttl)
+        return (1 - tokens) / refill_rate
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, "TOKEN_BUCKET_STORE", "backend.throttling.LocalBucketStore"))()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = "default"
+
+    def __init__(self):
+        self._wait = 0
+
+    def get_bucket(self):
+        buckets = getattr(settings, "TOKEN_BUCKETS", {})
+        return buckets.get(self.scope) or buckets.get("default") or DEFAULT_BUCKET
+
+    def get_cache_key(self, request, view):
+        user = getattr(request, "user", None)
+        if user is not None and getattr(user, "is_authenticated", False) and getattr(user, "id", None):
+            return f"throttle:{self.scope}:user:{user.id}"
+        return f"throttle:{self.scope}:ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        bucket = self.get_bucket()
+        self._wait = get_store().take(
+            self.get_cache_key(request, view),
+            bucket["capacity"],
+            bucket["refill_rate"],
+            time.time(),
+        )
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
+
+
+class EventListThrottle(TokenBucketThrottle):
+    scope = "events"
+
+
+class BookingThrottle(TokenBucketThrottle):
+    scope = "booking"
@@ -0,0 +1,104 @@
+"""Signed e-tickets, one per booked seat.
+
+A ticket token is ``<event_id>.<booking_id>.<ordinal>:<signature>``, signed
+(HMAC, django.core.signing) with ``TICKETS["SIGNING_KEY"]``, so the door can
+verify it without a database round trip (see backend/checkin.py). Tokens do
+not expire; cancelling the booking is what revokes them.
+
+QR codes are rendered as SVG with the optional ``qrcode`` package. Rendered
+tickets are cached for ``TICKETS["CACHE_SECONDS"]``; the tickets endpoint
+only renders on a cache miss. With ``TICKETS["PRERENDER"]`` the
+``booking_confirmed`` job renders them in advance, which only helps when
+the web workers read the same cache as ``run_jobs`` (Redis); with the
+default per-process cache the job would fill a cache nobody reads, so it
+is off unless a shared cache is configured. Without ``qrcode`` tickets
+carry the token alone and apps draw the code themselves.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signing import BadSignature, Signer
+
+try:
+    import qrcode
+    import qrcode.image.svg
+except ImportError:
+    qrcode = None
+
+from .hall import seat_index_for
+
+CACHE_KEY = "tickets:%s"
+SALT = "backend.tickets"
+
+DEFAULTS = {
+    "SIGNING_KEY": None,  # SECRET_KEY
+    "FALLBACK_KEYS": [],  # previous keys, still accepted at the door
+    "SNAPSHOT_KEY": None,  # shared with scanner devices (backend/snapshot.py); SECRET_KEY
+    "CACHE_SECONDS": 7 * 24 * 60 * 60,
+    "PRERENDER": False,  # needs a cache shared with the web workers
+    "SYNC_SECONDS": 5,
+    "IDLE_SECONDS": 6 * 60 * 60,
+}
+
+
+class InvalidTicket(Exception):
+    pass
+
+
+def conf():
+    return {**DEFAULTS, **getattr(settings, "TICKETS", {})}
+
+
+def signer():
+    c = conf()
+    return Signer(key=c["SIGNING_KEY"], fallback_keys=c["FALLBACK_KEYS"] or None, salt=SALT)
+
+
+def ticket_token(event_id, booking_id, ordinal):
+    return signer().sign(f"{event_id}.{booking_id}.{ordinal}")
+
+
+def read_ticket(token):
+    """``(event_id, booking_id, ordinal)`` of a genuine token; raises InvalidTicket"""
+    try:
+        event_id, booking_id, ordinal = signer().unsign(token).split(".")
+        return event_id, booking_id, int(ordinal)
+    except (BadSignature, ValueError):
+        raise InvalidTicket()
+
+
+def qr_svg(data):
+    if qrcode is None:
+        return None
+    svg = qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage).to_string()
+    return svg.decode() if isinstance(svg, bytes) else svg
+
+
+def build_tickets(booking, index):
+    tickets = []
+    for s in booking.seats:
+        ordinal = index.ordinal(s.row, s.column)
+        if ordinal is None:
+            continue
+        token = ticket_token(booking.event_id, booking.id, ordinal)
+        tickets.append({
+            "row": s.row,
+            "column": s.column,
+            "section": index.section_names[index.row_sections[s.row - 1]],
+            "token": token,
+            "qr_svg": qr_svg(token),
+        })
+    return tickets
+
+
+def booking_tickets(booking, event):
+    """Tickets of a Confirmed booking, rendered once and cached"""
+    key = CACHE_KEY % booking.id
+    tickets = cache.get(key)
+    if tickets is None:
+        tickets = build_tickets(booking, seat_index_for(event))
+        cache.set(key, tickets, conf()["CACHE_SECONDS"])
+    return tickets
+
+
+def forget_tickets(booking_id):
+    cache.delete(CACHE_KEY % booking_id)
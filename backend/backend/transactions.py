@@ -0,0 +1,69 @@
+"""Multi-document Mongo transactions with retries.
+
+mongoengine does not take sessions, so code running inside a transaction
+works on the raw pymongo collections (``Document._get_collection()``) and
+passes the session along.
+"""
+import random
+import time
+
+from django.conf import settings
+from mongoengine.connection import get_connection
+from pymongo.errors import PyMongoError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+MAX_ATTEMPTS = 5
+MAX_COMMIT_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.01
+
+
+def _backoff(attempt):
+    time.sleep(BACKOFF_SECONDS * (2 ** (attempt - 1)) * (1 + random.random()))
+
+
+def _commit(session):
+    for attempt in range(1, MAX_COMMIT_ATTEMPTS + 1):
+        try:
+            session.commit_transaction()
+            return
+        except PyMongoError as exc:
+            if exc.has_error_label("UnknownTransactionCommitResult") and attempt < MAX_COMMIT_ATTEMPTS:
+                continue
+            raise
+
+
+def run_in_transaction(callback, max_attempts=MAX_ATTEMPTS):
+    """Run ``callback(session)`` in a transaction and return its result.
+
+    The whole transaction is retried on TransientTransactionError (write
+    conflicts, primary elections) and the commit alone on
+    UnknownTransactionCommitResult. Any other exception aborts and propagates.
+    With ``settings.MONGO_TRANSACTIONS`` off (standalone servers) the callback
+    runs without a session.
+    """
+    if not getattr(settings, "MONGO_TRANSACTIONS", True):
+        return callback(None)
+
+    client = get_connection()
+    for attempt in range(1, max_attempts + 1):
+        with client.start_session() as session:
+            session.start_transaction(
+                read_concern=ReadConcern("snapshot"),
+                write_concern=WriteConcern("majority"),
+            )
+            try:
+                result = callback(session)
+                _commit(session)
+                return result
+            except PyMongoError as exc:
+                if session.in_transaction:
+                    session.abort_transaction()
+                if exc.has_error_label("TransientTransactionError") and attempt < max_attempts:
+                    _backoff(attempt)
+                    continue
+                raise
+            except Exception:
+                if session.in_transaction:
+                    session.abort_transaction()
+                raise
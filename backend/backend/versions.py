@@ -0,0 +1,71 @@
+"""Maintained version stamps for listing ETags.
+
+A listing's ETag used to be derived from an aggregation over every matching
+document, which scanned the collection on each request. Instead, writes
+that change what a listing shows stamp a document in ``collection_versions``
+with the time of the write (whole seconds), and the validators read that one
+document by ``_id``.
+
+Counter-only updates (``attendees_count``, ``favorites_count``: bookings,
+cancellations, favorites, counter repairs) do not move the stamp, so an
+on-sale never writes it and listings stay cacheable under load; their counts
+are as fresh as the listing Cache-Control allows. Event details are
+validated by the event's own ``updated_at`` instead (see
+``views.events_validators``).
+
+Stamps are coalesced: ``bump`` writes with ``$max`` at most once per second
+per process, so an app write seen both through ``events_changed`` and the
+change-stream consumer (which also covers admin scripts and the Mongo shell)
+costs one write. Since a second write within the same second leaves the
+stamp unchanged, ``settled_version`` reports no version while the last
+write is less than ``SETTLE_SECONDS`` old and those listings go out
+without a validator.
+"""
+import threading
+import time
+
+from django.dispatch import receiver
+from mongoengine.connection import get_db
+
+from .invalidation import on_change
+from .signals import events_changed
+
+COLLECTION = "collection_versions"
+# Longer than a stamp's second plus the clock skew between workers
+SETTLE_SECONDS = 2
+
+_stamped = {}
+_lock = threading.Lock()
+
+
+def get_version(name):
+    doc = get_db()[COLLECTION].find_one({"_id": name}, {"version": 1})
+    return doc["version"] if doc else 0
+
+
+def settled_version(name):
+    """The version of ``name``, or None while it may still change within its second"""
+    version = get_version(name)
+    if version > time.time() - SETTLE_SECONDS:
+        return None
+    return version
+
+
+def bump(name):
+    stamp = int(time.time())
+    with _lock:
+        if _stamped.get(name) == stamp:
+            return
+        _stamped[name] = stamp
+    get_db()[COLLECTION].update_one({"_id": name}, {"$max": {"version": stamp}}, upsert=True)
+
+
+@receiver(events_changed)
+def event_written(sender, **kwargs):
+    bump("events")
+
+
+@on_change("events")
+def event_changed_elsewhere(message):
+    # Counter-only updates never reach the handlers (invalidation.counters_only)
+    bump("events")
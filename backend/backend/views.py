@@ -1,20 +1,92 @@
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from mongoengine.errors import DoesNotExist, NotUniqueError
+import calendar
+import heapq
 import json
+import math
 import os
+import time
 import uuid
+from datetime import date, datetime, timedelta
+from itertools import islice
+from bson import ObjectId
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.utils.cache import patch_cache_control
 from django.contrib.auth.hashers import make_password, check_password
 
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import User, Event, Booking, Seat
+from .models import User, Event, Booking, EventBooking, Seat, SeatInventory
+from .throttling import BookingThrottle, EventListThrottle
+from .idempotency import idempotent
+from .renderers import COMPACT_RENDERERS, SeatBitmapRenderer
+from .conditional import conditional
+from .versions import settled_version
+from .recommendations import related_event_ids
+from .feed import personalized_feed, forget_profile
+from .favorites import add_favorite, remove_favorite
+from .invalidation import publish as publish_change
+from .signals import events_changed
+from .routing import tolerant
+from .geocoding import EARTH_RADIUS_KM, haversine_km, valid_point
+from .jobs import enqueue
+from .hall import layout_from_dict, seat_index_for
+from .inventory import seat_ordinals, get_inventory, occupancy, packed_taken
+from .booking import place_booking, cancel_and_release
+from .tickets import InvalidTicket, booking_tickets, read_ticket
+from .checkin import changes_since, get_board
+from .snapshot import build_snapshot, sold_seats
+from .recurrence import (
+    as_date,
+    expand as expand_series,
+    is_occurrence,
+    listing_key,
+    materialize,
+    occurrence_document,
+    occurrence_event,
+    recurrence_from_dict,
+    split_occurrence_id,
+    stored_event_id,
+)
+from .pricing import PriceChanged, checkout_total, steps_from_list, describe as describe_prices
+from .slowlog import group_by_shape, read_records
+from . import profiling
+from .allocation import find_best_seats
+from .admission import (
+    require_admission,
+    admission_rate,
+    get_backend as get_queue_backend,
+    issue_queue_token,
+    read_queue_token,
+    queue_status,
+)
+
+MAX_BEST_AVAILABLE = 10
+BEST_AVAILABLE_ATTEMPTS = 3
+QUEUE_POLL_MAX_SECONDS = 30
+MAX_RELATED = 12
+MAX_FEED = 50
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 500
+MAX_SYNC_ADMISSIONS = 1000
+MAX_SLOW_QUERIES = 5000
+MAX_PROFILE_INTERVAL_MS = 1000
+DEFAULT_WINDOW_DAYS = 90
+MAX_WINDOW_DAYS = 366
+PRICES_MAX_AGE = 10
+
+
+@api_view(["GET"])
+@throttle_classes([])
+def health(request):
+    """Readiness probe: answers as soon as the worker can serve, without touching Mongo"""
+    return Response({"status": "ok"})
 
 
 # --- HELPERS ---
@@ -34,6 +106,49 @@ def serialize_user(user):
     }
 
 
+def booking_event(event_id):
+    """``(Event, stored)`` to book for an event or occurrence id.
+
+    An occurrence nobody booked yet comes back unsaved (``stored`` False):
+    the booking is validated against it and ``store_occurrence`` only runs
+    once it is accepted.
+    """
+    if split_occurrence_id(event_id):
+        return occurrence_event(event_id)
+    return Event.objects.get(id=event_id), True
+
+
+def booking_inventory(event_id, index, stored):
+    """The inventory to validate a booking against; nothing is sold (or written) for an unstored occurrence"""
+    if stored:
+        return get_inventory(event_id, index)
+    return SeatInventory(event_id=event_id, taken=[])
+
+
+def store_occurrence(occurrence_id, index):
+    """Materialize an occurrence for an accepted booking, with the inventory its seat claim needs"""
+    event = materialize(occurrence_id)
+    get_inventory(str(event.id), index)
+    return event
+
+
+def build_booking(request, event, seats_data, total_price):
+    return Booking(
+        event_id=str(event.id),
+        # Snapshot of the event as booked, shown in booking lists and emails
+        event_title=event.title,
+        event_date=str(event.date) if event.date else None,
+        event_time=event.time,
+        event_location=", ".join(p for p in (event.location, event.city) if p),
+        user_email=request.user.email,
+        user_name=getattr(request.user, "full_name", ""),
+        seats=[Seat(row=s["row"], column=s["column"]) for s in seats_data],
+        num_tickets=len(seats_data),
+        total_price=total_price,
+        booking_status="Confirmed"
+    )
+
+
 # --- AUTH VIEWS ---
 
 @api_view(["POST"])
@@ -108,54 +223,260 @@ def update_current_user(request):
         user = User.objects.get(id=request.user.id)
         data = request.data
 
-        fields = ["full_name", "phone", "city", "avatar_url", "favorite_categories", "favorite_events"]
+        # favorite_events changes go through favorite_event so favorites_count stays right
+        fields = ["full_name", "phone", "city", "avatar_url", "favorite_categories"]
         for field in fields:
             if field in data:
                 setattr(user, field, data[field])
 
         user.save()
+        publish_change("users", "update", user.id, {"email": user.email})
+        if "favorite_categories" in data or "city" in data:
+            forget_profile(user.email)
         return Response(serialize_user(user))
     except DoesNotExist:
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(["POST", "DELETE"])
+@permission_classes([IsAuthenticated])
+def favorite_event(request, event_id):
+    """POST adds the event to the user's favorites, DELETE removes it"""
+    if request.method == "POST":
+        if not ObjectId.is_valid(event_id) or Event.objects(id=event_id).only("id").first() is None:
+            return Response({"error": "Event not found"}, status=404)
+        changed = add_favorite(request.user.id, event_id)
+    else:
+        if not ObjectId.is_valid(event_id):
+            return Response({"error": "Event not found"}, status=404)
+        changed = remove_favorite(request.user.id, event_id)
+
+    if changed:
+        publish_change("users", "update", request.user.id, {"email": request.user.email})
+        forget_profile(request.user.email)
+    return Response({"event_id": event_id, "favorite": request.method == "POST", "changed": changed})
+
+
 # --- EVENT VIEWS ---
 
+def parse_floats(value, count, name):
+    try:
+        numbers = [float(v) for v in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValueError(f"{name} needs {count} comma-separated numbers")
+    return numbers
+
+
+def geo_filter(request):
+    """Location filter of a listing request, or None.
+
+    ``lat`` + ``lng`` (+ ``radius_km``) give ("near", (lng, lat), radius_km);
+    ``bbox=min_lng,min_lat,max_lng,max_lat`` gives ("box", corners).
+    Raises ValueError for malformed or conflicting parameters.
+    """
+    lat, lng, bbox = request.GET.get("lat"), request.GET.get("lng"), request.GET.get("bbox")
+    if bbox and (lat or lng):
+        raise ValueError("Use either lat/lng or bbox, not both")
+    if bbox:
+        min_lng, min_lat, max_lng, max_lat = parse_floats(bbox, 4, "bbox")
+        if not (valid_point(min_lng, min_lat) and valid_point(max_lng, max_lat)):
+            raise ValueError("bbox is out of range")
+        return "box", ((min_lng, min_lat), (max_lng, max_lat))
+    if lat or lng:
+        lng_value, lat_value = parse_floats(f"{lng},{lat}", 2, "lat and lng")
+        radius_km = parse_floats(request.GET.get("radius_km", str(DEFAULT_RADIUS_KM)), 1, "radius_km")[0]
+        if not valid_point(lng_value, lat_value) or not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f"lat/lng out of range or radius_km not in (0, {MAX_RADIUS_KM}]")
+        return "near", (lng_value, lat_value), radius_km
+    return None
+
+
+def date_window(request):
+    """``(first, last)`` dates of a listing's ``date_from``/``date_to``, or None.
+
+    Raises ValueError for malformed or too wide windows.
+    """
+    date_from, date_to = request.GET.get("date_from"), request.GET.get("date_to")
+    if not date_from and not date_to:
+        return None
+    try:
+        first = date.fromisoformat(date_from) if date_from else date.today()
+        last = date.fromisoformat(date_to) if date_to else first + timedelta(days=DEFAULT_WINDOW_DAYS)
+    except ValueError:
+        raise ValueError("date_from and date_to must be YYYY-MM-DD")
+    if not 0 <= (last - first).days <= MAX_WINDOW_DAYS:
+        raise ValueError(f"date_to must be within {MAX_WINDOW_DAYS} days after date_from")
+    return first, last
+
+
+def windowed_events(request, events, first, last):
+    """Raw event documents dated within the window, series occurrences included, by date"""
+    single = events.filter(recurrence=None, date__gte=first, date__lte=last).order_by("date", "time")
+    series = [
+        s for s in events.filter(recurrence__ne=None, date__lte=last)
+        if not s.recurrence.until or s.recurrence.until >= first
+    ]
+    # Booked occurrences are stored events; whether listed or not, they are not expanded again
+    materialized = {
+        (e.series_id, as_date(e.date))
+        for e in tolerant(Event.objects, request).filter(
+            series_id__in=[str(s.id) for s in series], date__gte=first, date__lte=last,
+        ).only("series_id", "date")
+    } if series else set()
+    return heapq.merge(
+        (e.to_mongo().to_dict() for e in single),
+        expand_series(series, first, last, materialized),
+        key=listing_key,
+    )
+
+
+def next_dates(request, events):
+    """Raw documents of a listing without a window, in its order.
+
+    A series template cannot be booked, so each series is listed as its next
+    unbooked date within ``DEFAULT_WINDOW_DAYS`` instead, or left out.
+    """
+    first = date.today()
+    last = first + timedelta(days=DEFAULT_WINDOW_DAYS)
+    for event in events:
+        if not event.recurrence:
+            yield event.to_mongo().to_dict()
+            continue
+        materialized = {
+            (e.series_id, as_date(e.date))
+            for e in tolerant(Event.objects, request).filter(
+                series_id=str(event.id), date__gte=first, date__lte=last,
+            ).only("series_id", "date")
+        }
+        occurrence = next(expand_series([event], first, last, materialized), None)
+        if occurrence is not None:
+            yield occurrence
+
+
+def events_queryset(request, by_distance=False):
+    """Listing queryset for fetch_events' filters (created_by=me needs an authenticated user).
+
+    With ``by_distance`` a lat/lng search is a $near query, sorted nearest
+    first; otherwise it is the equivalent $geoWithin, which aggregations accept.
+    """
+    status_filter = request.GET.get("status")
+    category = request.GET.get("category")
+    created_by_who = request.GET.get("created_by")
+
+    # Layouts are served by get_event_layout; keep them out of listings
+    events = Event.objects().exclude("hall_layout")
+
+    if created_by_who == "me":
+        events = events.filter(created_by=request.user.email)
+    else:
+        # "My events" must reflect the user's own writes; other listings may lag a little
+        events = tolerant(events, request)
+        if created_by_who:
+            events = events.filter(created_by=created_by_who)
+
+    if status_filter:
+        events = events.filter(status=status_filter)
+    if category:
+        events = events.filter(category=category)
+
+    location = geo_filter(request)
+    if location and location[0] == "box":
+        (min_lng, min_lat), (max_lng, max_lat) = location[1]
+        # A GeoJSON polygon: $box only matches legacy coordinate pairs
+        ring = [(min_lng, min_lat), (max_lng, min_lat), (max_lng, max_lat), (min_lng, max_lat), (min_lng, min_lat)]
+        events = events.filter(geo_point__geo_within={"type": "Polygon", "coordinates": [ring]})
+    elif location and by_distance:
+        _, point, radius_km = location
+        # $near sorts by distance itself; a default sort would override it
+        events = events.filter(geo_point__near=point, geo_point__max_distance=radius_km * 1000).order_by()
+    elif location:
+        _, point, radius_km = location
+        events = events.filter(geo_point__geo_within_sphere=[point, radius_km / EARTH_RADIUS_KM])
+
+    return events
+
+
+def events_validators(request):
+    event_id = request.GET.get("id")
+    if event_id:
+        # An occurrence is served from its series until it is materialized
+        stored_id = stored_event_id(event_id)
+        event = tolerant(Event.objects(id=stored_id), request).only("updated_at").first()
+        if event is None:
+            return None, None
+        return (stored_id, event.updated_at), event.updated_at
+
+    if request.GET.get("created_by") == "me" and not request.user.is_authenticated:
+        return None, None
+    # Windows without date_from start today, so the day is part of the version
+    version = settled_version("events")
+    if version is None:
+        return None, None
+    version = (version, date.today().isoformat())
+    if request.GET.get("created_by") == "me":
+        version += (str(request.user.id),)
+    return version, None
+
+
+def events_cache_control(request):
+    # "My events" depends on who asks; everything else is the same for every client
+    if request.GET.get("created_by") == "me":
+        return {"private": True, "no_cache": True}
+    return settings.EVENTS_CACHE_CONTROL
+
+
 @api_view(["GET"])
+@renderer_classes(COMPACT_RENDERERS)
+@throttle_classes([EventListThrottle])
+@conditional(events_validators, events_cache_control)
 def fetch_events(request):
     event_id = request.GET.get("id")
-    status_filter = request.GET.get("status")
-    created_by_who = request.GET.get("created_by")
 
     if event_id:
         try:
-            event = Event.objects.get(id=event_id)
+            stored_id = stored_event_id(event_id)
+            event = tolerant(Event.objects, request).get(id=stored_id)
             event_dict = event.to_mongo().to_dict()
+            occurrence = split_occurrence_id(event_id)
+            if occurrence and stored_id == occurrence[0]:
+                # A date of a series nobody has booked yet
+                if not event.recurrence or not is_occurrence(event, occurrence[1]):
+                    return Response([])
+                event_dict = occurrence_document(event_dict, occurrence[1])
+                event_dict["_id"] = event_id
             event_dict["id"] = str(event_dict.pop("_id"))
             return Response([event_dict])
         except Event.DoesNotExist:
             return Response([])
 
-    events = Event.objects()
+    if request.GET.get("created_by") == "me" and not request.user.is_authenticated:
+        return Response({"error": "Authentication required"}, status=401)
 
-    if created_by_who == "me":
-        if not request.user.is_authenticated:
-            return Response({"error": "Authentication required"}, status=401)
-        events = events.filter(created_by=request.user.email)
-    elif created_by_who:
-        events = events.filter(created_by=created_by_who)
-
-    if status_filter:
-        events = events.filter(status=status_filter)
+    try:
+        window = date_window(request)
+        # A date window lists by date, not by distance
+        events = events_queryset(request, by_distance=window is None)
+        location = geo_filter(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
 
     # Simple Pagination
     limit = int(request.GET.get("limit", 20))
-    events = events.limit(limit)
+    if window:
+        documents = islice(windowed_events(request, events, *window), limit)
+    elif request.GET.get("created_by") == "me":
+        # Organizers manage a series through its template
+        documents = (e.to_mongo().to_dict() for e in events.limit(limit))
+    else:
+        documents = islice(next_dates(request, events), limit)
 
     event_list = []
-    for e in events:
-        edict = e.to_mongo().to_dict()
+    for edict in documents:
         edict["id"] = str(edict.pop("_id"))
+        if location and location[0] == "near" and edict.get("geo_point"):
+            edict["distance_km"] = round(haversine_km(location[1], edict["geo_point"]["coordinates"]), 2)
         event_list.append(edict)
 
     return Response(event_list)
@@ -163,24 +484,58 @@ def fetch_events(request):
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_event(request):
     data = request.data
     try:
         # Numeric validation
         price = float(data.get("price", 0))
         capacity = int(data.get("capacity", 0))
-        if price < 0 or capacity < 0:
-            return Response({"error": "Price and capacity must be positive"}, status=400)
+        admission_rate_value = int(data.get("admission_rate") or 0)
+        if not math.isfinite(price) or price < 0 or capacity < 0 or admission_rate_value < 0:
+            return Response({"error": "Price, capacity and admission rate must be positive"}, status=400)
+
+        hall_layout = None
+        if data.get("hall_layout"):
+            try:
+                hall_layout = layout_from_dict(data["hall_layout"])
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+
+        demand_pricing = []
+        if data.get("demand_pricing"):
+            try:
+                demand_pricing = steps_from_list(data["demand_pricing"])
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+
+        recurrence = None
+        if data.get("recurrence"):
+            try:
+                recurrence = recurrence_from_dict(data["recurrence"])
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+
+        geo_point = None
+        if data.get("latitude") not in (None, "") and data.get("longitude") not in (None, ""):
+            lng, lat = float(data["longitude"]), float(data["latitude"])
+            if not valid_point(lng, lat):
+                return Response({"error": "Latitude or longitude out of range"}, status=400)
+            geo_point = [lng, lat]
 
         user = User.objects.get(id=request.user.id)
         event = Event(
             title=data.get("title"),
             description=data.get("description"),
             category=data.get("category"),
+            subcategory=data.get("subcategory"),
+            tags=[t for t in data.get("tags") or [] if isinstance(t, str) and t],
             date=data.get("date"),
             time=data.get("time"),
             location=data.get("location"),
             city=data.get("city"),
+            address=data.get("address"),
+            geo_point=geo_point,
             price=price,
             capacity=capacity,
             organizer_name=user.full_name,
@@ -188,9 +543,19 @@ def create_event(request):
             organizer_phone=user.phone,
             created_by=user.email,
             status=data.get("status", "Published"),
-            attendees_count=0
+            attendees_count=0,
+            hall_layout=hall_layout,
+            demand_pricing=demand_pricing,
+            recurrence=recurrence,
+            admission_rate=admission_rate_value or None,
         )
+        if hall_layout is not None and not capacity:
+            event.capacity = seat_index_for(event).capacity
         event.save()
+        if geo_point is None:
+            # The geocoder is an outside HTTP service; never wait on it here
+            enqueue("geocode_event", {"event_id": str(event.id)})
+        events_changed.send_robust(sender=Event, event=event)
         return Response({"success": True, "id": str(event.id)}, status=status.HTTP_201_CREATED)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -203,13 +568,14 @@ def delete_event(request, event_id):
         event = Event.objects.get(id=event_id)
 
         # Business Logic: Check if tickets are already sold
-        if Booking.objects(event_id=event_id, booking_status="Confirmed").count() > 0:
+        if EventBooking.objects(event_id=event_id, booking_status="Confirmed").count() > 0:
             return Response({"error": "Cannot delete event with active bookings"}, status=400)
 
         if event.created_by != request.user.email:
             return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
 
         event.delete()
+        events_changed.send_robust(sender=Event, event=event)
         return Response({"success": True, "message": "Deleted successfully"})
     except DoesNotExist:
         return Response({"error": "Not found"}, status=404)
@@ -219,6 +585,9 @@ def delete_event(request, event_id):
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([BookingThrottle])
+@idempotent
+@require_admission
 def create_booking(request):
     data = request.data
     try:
@@ -229,38 +598,127 @@ def create_booking(request):
             return Response({"error": "Missing booking details"}, status=400)
 
         # Prevent organizer from booking own event
-        event = Event.objects.get(id=event_id)
+        requested_id = event_id
+        event, stored = booking_event(event_id)
+        event_id = str(event.id)
         if event.created_by == request.user.email:
             return Response({"error": "Organizers cannot book their own events"}, status=400)
+        if event.recurrence:
+            return Response({"error": "Choose a date of this series to book"}, status=400)
+
+        # Validate seats against the hall and claim them in the seat inventory
+        index = seat_index_for(event)
+        ordinals, bad_seat = seat_ordinals(index, seats_data)
+        if bad_seat is not None:
+            return Response({"error": f"Seat {bad_seat} is not available in this hall"}, status=400)
+
+        # The total is priced on the server; the client's only has to match it
+        inventory = booking_inventory(event_id, index, stored)
+        offered = data.get("total_price")
+        try:
+            total_price = checkout_total(event, index, ordinals, inventory, offered)
+        except (TypeError, ValueError):
+            return Response({"error": "total_price must be a number"}, status=400)
+        except PriceChanged as e:
+            return Response({"error": str(e), "total_price": e.expected}, status=409)
 
-        # Check seat collisions
-        active_bookings = Booking.objects(event_id=event_id, booking_status="Confirmed")
-        taken_seats = {(s.row, s.column) for b in active_bookings for s in b.seats}
-
-        for s in seats_data:
-            if (s["row"], s["column"]) in taken_seats:
-                return Response({"error": f"Seat {s} is already taken"}, status=400)
-
-        booking = Booking(
-            event_id=event_id,
-            user_email=request.user.email,
-            user_name=getattr(request.user, "full_name", ""),
-            seats=[Seat(**s) for s in seats_data],
-            num_tickets=len(seats_data),
-            total_price=float(data.get("total_price", 0)),
-            booking_status="Confirmed"
-        )
-        booking.save()
+        if not stored:
+            event = store_occurrence(requested_id, index)
 
-        # Update event attendee count
-        event.attendees_count = (event.attendees_count or 0) + len(seats_data)
-        event.save()
+        # Seat claim, booking insert and attendee count update commit together
+        booking = build_booking(request, event, seats_data, total_price)
+        if not place_booking(event, booking, ordinals):
+            return Response({"error": "One or more seats are already taken"}, status=400)
 
         return Response({"success": True, "booking_id": str(booking.id)})
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@throttle_classes([BookingThrottle])
+@idempotent
+@require_admission
+def book_best_available(request, event_id):
+    """Find and book the best N adjacent free seats in one call"""
+    try:
+        quantity = int(request.data.get("quantity", 1))
+    except (TypeError, ValueError):
+        return Response({"error": "quantity must be a number"}, status=400)
+    if quantity < 1 or quantity > MAX_BEST_AVAILABLE:
+        return Response({"error": f"quantity must be between 1 and {MAX_BEST_AVAILABLE}"}, status=400)
+    section = request.data.get("section")
+
+    try:
+        requested_id = event_id
+        event, stored = booking_event(event_id)
+        event_id = str(event.id)
+        if event.created_by == request.user.email:
+            return Response({"error": "Organizers cannot book their own events"}, status=400)
+        if event.recurrence:
+            return Response({"error": "Choose a date of this series to book"}, status=400)
+
+        index = seat_index_for(event)
+        booking = None
+        # Another buyer may claim the chosen seats between search and claim; search again
+        for _ in range(BEST_AVAILABLE_ATTEMPTS):
+            inventory = booking_inventory(event_id, index, stored)
+            ordinals = find_best_seats(index, occupancy(index, inventory), quantity, section)
+            if ordinals is None:
+                return Response({"error": f"No {quantity} adjacent seats available"}, status=409)
+
+            seats_data = [dict(zip(("row", "column"), index.seat(o))) for o in ordinals]
+            total_price = checkout_total(event, index, ordinals, inventory)
+            if not stored:
+                event, stored = store_occurrence(requested_id, index), True
+            booking = build_booking(request, event, seats_data, total_price)
+            if place_booking(event, booking, ordinals):
+                break
+            booking = None
+        if booking is None:
+            return Response({"error": "Seats are selling fast, please try again"}, status=409)
+
+        return Response({
+            "success": True,
+            "booking_id": str(booking.id),
+            "seats": seats_data,
+            "total_price": total_price,
+        })
+    except DoesNotExist:
+        return Response({"error": "Event not found"}, status=404)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def event_queue(request, event_id):
+    """Join the waiting room (POST) or poll queue position with ?token= (GET)"""
+    user_key = str(request.user.id)
+
+    if request.method == "POST":
+        rate = admission_rate(event_id)
+        if not rate:
+            return Response({"admitted": True, "position": 0, "queue": False})
+        backend = get_queue_backend()
+        backend.open(event_id, rate, time.time())
+        seq = backend.join(event_id, user_key)
+        token = issue_queue_token(event_id, seq, user_key)
+    else:
+        token = request.query_params.get("token", "")
+        seq = read_queue_token(token, event_id, user_key)
+        if seq is None:
+            return Response({"error": "Invalid queue token"}, status=400)
+
+    data = queue_status(event_id, seq, user_key)
+    data["token"] = token
+    response = Response(data)
+    if not data["admitted"]:
+        response["Retry-After"] = str(min(data["estimated_wait"], QUEUE_POLL_MAX_SECONDS))
+    return response
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_user_bookings(request):
@@ -302,19 +760,134 @@ def upload_file(request):
     return Response({"file_url": file_url}, status=status.HTTP_201_CREATED)
 
 
+def unbooked_occurrence(event_id, stored_id):
+    """True for an occurrence id that has not been materialized (nothing booked yet)"""
+    occurrence = split_occurrence_id(event_id)
+    return occurrence is not None and stored_id == occurrence[0]
+
+
+def reserved_seats_validators(request, event_id):
+    stored_id = stored_event_id(event_id)
+    if unbooked_occurrence(event_id, stored_id):
+        return None, None
+    inventory = SeatInventory.objects(event_id=stored_id).only("version").first()
+    if inventory is None:
+        return None, None
+    return (event_id, inventory.version), None
+
+
+def layout_validators(request, event_id):
+    event = tolerant(Event.objects(id=stored_event_id(event_id)), request).only("updated_at").first()
+    if event is None:
+        return None, None
+    return (event_id, event.updated_at), event.updated_at
+
+
 @api_view(["GET"])
+@renderer_classes(COMPACT_RENDERERS + [SeatBitmapRenderer])
 @permission_classes([IsAuthenticated])
+@require_admission
+@conditional(reserved_seats_validators, {"private": True, "no_cache": True})
 def get_reserved_seats(request, event_id):
     """Returns a list of seats already booked for a specific event"""
-    bookings = Booking.objects(event_id=event_id, booking_status="Confirmed")
-    reserved = [
-        {"row": seat.row, "column": seat.column}
-        for booking in bookings
-        for seat in booking.seats
-    ]
+    stored_id = stored_event_id(event_id)
+    try:
+        event = Event.objects.only("hall_layout").get(id=stored_id)
+    except DoesNotExist:
+        return Response({"error": "Event not found"}, status=404)
+
+    index = seat_index_for(event)
+    if unbooked_occurrence(event_id, stored_id):
+        # Nothing is sold until the first booking materializes it; nothing is written here
+        if request.accepted_renderer.format == SeatBitmapRenderer.format:
+            return Response(index.packed(()))
+        return Response([])
+
+    inventory = get_inventory(stored_id, index)
+    if request.accepted_renderer.format == SeatBitmapRenderer.format:
+        return Response(packed_taken(index, inventory))
+
+    reserved = []
+    for ordinal in inventory.taken:
+        row, column = index.seat(ordinal)
+        reserved.append({"row": row, "column": column})
     return Response(reserved)
 
 
+@api_view(["GET"])
+@conditional(layout_validators, {"public": True, "max_age": 300})
+def get_event_layout(request, event_id):
+    """Hall layout of an event (sections, rows, seat types, price tiers)"""
+    try:
+        event = tolerant(Event.objects, request).only("hall_layout").get(id=stored_event_id(event_id))
+    except DoesNotExist:
+        return Response({"error": "Event not found"}, status=404)
+    return Response(seat_index_for(event).describe())
+
+
+@api_view(["GET"])
+def get_event_prices(request, event_id):
+    """Current seat prices of an event: per tier, per row and the demand multiplier"""
+    event_id = stored_event_id(event_id)
+    try:
+        event = tolerant(Event.objects, request).only(
+            "hall_layout", "price", "ticket_type", "demand_pricing"
+        ).get(id=event_id)
+    except DoesNotExist:
+        return Response({"error": "Event not found"}, status=404)
+
+    index = seat_index_for(event)
+    inventory = get_inventory(event_id, index) if event.demand_pricing else None
+    response = Response(describe_prices(event, index, inventory))
+    # Demand prices move with sales; checkout re-validates the total anyway
+    patch_cache_control(response, public=True, max_age=PRICES_MAX_AGE)
+    return response
+
+
+@api_view(["GET"])
+@renderer_classes(COMPACT_RENDERERS)
+def related_events(request, event_id):
+    """Upcoming published events most similar to this one, best first"""
+    try:
+        limit = min(max(int(request.GET.get("limit", 4)), 1), MAX_RELATED)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=400)
+
+    event = tolerant(Event.objects(id=event_id), request).exclude("hall_layout").first()
+    if event is None:
+        return Response({"error": "Event not found"}, status=404)
+
+    ids = related_event_ids(event)
+    # The stored list may include events that were unpublished or have passed since
+    found = {
+        str(e.id): e
+        for e in tolerant(Event.objects(id__in=ids, status="Published", date__gte=date.today()), request)
+        .exclude("hall_layout")
+    }
+    related = [found[i].to_json_safe() for i in ids if i in found][:limit]
+    response = Response(related)
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
+
+@api_view(["GET"])
+@renderer_classes(COMPACT_RENDERERS)
+@permission_classes([IsAuthenticated])
+def get_feed(request):
+    """Upcoming events picked for the current user"""
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), MAX_FEED)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=400)
+    try:
+        user = User.objects.get(id=request.user.id)
+    except DoesNotExist:
+        return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+    response = Response(personalized_feed(user, limit))
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_bookings(request):
@@ -322,11 +895,15 @@ def list_bookings(request):
     user_email = request.query_params.get("user_email")
     event_id = request.query_params.get("event_id")
 
-    bookings = Booking.objects()
-    if user_email:
-        bookings = bookings.filter(user_email=user_email)
-    if event_id:
-        bookings = bookings.filter(event_id=event_id)
+    if event_id and not user_email:
+        # bookings is sharded by owner; the per-event copy answers from one shard
+        bookings = EventBooking.objects(event_id=event_id)
+    else:
+        bookings = Booking.objects()
+        if user_email:
+            bookings = bookings.filter(user_email=user_email)
+        if event_id:
+            bookings = bookings.filter(event_id=event_id)
 
     data = [{
         "id": str(b.id),
@@ -339,12 +916,19 @@ def list_bookings(request):
     return Response(data)
 
 
+def booking_lookup(request, booking_id):
+    """Filter for one booking; users only see their own, which also pins the shard key"""
+    if getattr(request.user, "role", None) == "admin":
+        return {"id": booking_id}
+    return {"id": booking_id, "user_email": request.user.email}
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_booking(request, booking_id):
     """Retrieve details of a single booking"""
     try:
-        booking = Booking.objects.get(id=booking_id)
+        booking = Booking.objects.get(**booking_lookup(request, booking_id))
         return Response({
             "id": str(booking.id),
             "event_id": booking.event_id,
@@ -356,16 +940,254 @@ def get_booking(request, booking_id):
         return Response({"error": "Booking not found"}, status=404)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def cancel_booking(request, booking_id):
+    """Cancel a booking, release its seats and mark the refund as pending"""
+    try:
+        booking = Booking.objects.get(**booking_lookup(request, booking_id))
+        if booking.booking_status != "Confirmed":
+            return Response({"error": "Only confirmed bookings can be cancelled"}, status=400)
+
+        event = Event.objects.only("hall_layout", "date").get(id=booking.event_id)
+        if event.date and event.date < date.today():
+            return Response({"error": "Event has already taken place"}, status=400)
+
+        if not cancel_and_release(booking, event):
+            return Response({"error": "Only confirmed bookings can be cancelled"}, status=400)
+        return Response({
+            "success": True,
+            "booking_status": "Cancelled",
+            "refund_amount": booking.total_price or 0,
+        })
+    except DoesNotExist:
+        return Response({"error": "Booking not found"}, status=404)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_booking_tickets(request, booking_id):
+    """Signed QR tickets of a confirmed booking, one per seat"""
+    try:
+        booking = Booking.objects.get(**booking_lookup(request, booking_id))
+        if booking.booking_status != "Confirmed":
+            return Response({"error": "Only confirmed bookings have tickets"}, status=400)
+        event = Event.objects.only("hall_layout").get(id=booking.event_id)
+    except DoesNotExist:
+        return Response({"error": "Booking not found"}, status=404)
+    response = Response({
+        "booking_id": str(booking.id),
+        "event_id": booking.event_id,
+        "tickets": booking_tickets(booking, event),
+    })
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def door_board(request, event_id):
+    """``(board, None)`` for the event's organizer or an admin, else ``(None, error response)``"""
+    if not ObjectId.is_valid(event_id):
+        return None, Response({"error": "Event not found"}, status=404)
+    try:
+        board = get_board(event_id)
+    except DoesNotExist:
+        return None, Response({"error": "Event not found"}, status=404)
+    if board.organizer != request.user.email and getattr(request.user, "role", None) != "admin":
+        return None, Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+    return board, None
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def event_check_in(request, event_id):
+    """POST admits the scanned ``ticket``; GET returns door counts and loads the event's board"""
+    board, error = door_board(request, event_id)
+    if error is not None:
+        return error
+    if request.method == "GET":
+        return Response(board.stats())
+
+    try:
+        ticket_event_id, booking_id, ordinal = read_ticket(str(request.data.get("ticket", "")).strip())
+    except InvalidTicket:
+        return Response({"error": "Invalid ticket", "result": "invalid"}, status=400)
+    if ticket_event_id != event_id:
+        return Response({"error": "Ticket is for another event", "result": "wrong_event"}, status=409)
+
+    result = board.admit(booking_id, ordinal, by=request.user.email)
+    if result == "invalid":
+        return Response({"error": "Invalid ticket", "result": result}, status=400)
+    row, column = board.index.seat(ordinal)
+    return Response(
+        {"result": result, "booking_id": booking_id, "row": row, "column": column},
+        status=200 if result == "ok" else 409,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def check_in_snapshot(request, event_id):
+    """Signed binary snapshot of sold seats and admissions, for scanners working offline"""
+    board, error = door_board(request, event_id)
+    if error is not None:
+        return error
+    synced_at = board.synced_at
+    admitted = [ordinal for ordinal, bit in enumerate(board.bits) if bit]
+    data = build_snapshot(event_id, board.index, admitted, cursor=calendar.timegm(synced_at.utctimetuple()))
+    response = HttpResponse(data, content_type="application/octet-stream")
+    response["Content-Disposition"] = f'attachment; filename="checkin-{event_id}.bin"'
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def check_in_sync(request, event_id):
+    """Upload a scanner's offline admissions and get everything that changed since ``cursor``.
+
+    Body: ``{"cursor": <epoch seconds>, "admissions": [{"ticket", "checked_in_at"}]}``.
+    ``results`` has one entry per uploaded admission, as from the check-in endpoint;
+    ``sold`` lists ``[ordinal, booking id]`` of seats booked since the cursor.
+    """
+    board, error = door_board(request, event_id)
+    if error is not None:
+        return error
+    admissions = request.data.get("admissions") or []
+    if not isinstance(admissions, list) or len(admissions) > MAX_SYNC_ADMISSIONS:
+        return Response({"error": f"Send at most {MAX_SYNC_ADMISSIONS} admissions per sync"}, status=400)
+    try:
+        since = request.data.get("cursor")
+        since = datetime.utcfromtimestamp(int(since)) if since is not None else None
+        scans = [
+            (str(a.get("ticket", "")).strip(), datetime.utcfromtimestamp(float(a["checked_in_at"])))
+            for a in admissions
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError, OverflowError, OSError):
+        return Response({"error": "cursor and checked_in_at must be epoch seconds"}, status=400)
+
+    results = []
+    for token, checked_in_at in scans:
+        try:
+            ticket_event_id, booking_id, ordinal = read_ticket(token)
+        except InvalidTicket:
+            results.append("invalid")
+            continue
+        if ticket_event_id != event_id:
+            results.append("wrong_event")
+            continue
+        results.append(board.admit(booking_id, ordinal, by=request.user.email, at=checked_in_at))
+    # Other scanners see these on their next sync
+    board.flush()
+
+    cursor = int(time.time())
+    admitted, revoked = changes_since(event_id, since)
+    sold = sorted((ordinal, str(booking_id)) for ordinal, booking_id in sold_seats(event_id, board.index, since))
+    return Response({
+        "cursor": cursor,
+        "results": results,
+        "admitted": sorted(set(admitted)),
+        "revoked": sorted(revoked),
+        "sold": [list(pair) for pair in sold],
+    })
+
+
 @api_view(["PUT"])
 @permission_classes([IsAuthenticated])
 def update_booking(request, booking_id):
     """Update booking status or details"""
     try:
-        booking = Booking.objects.get(id=booking_id)
+        booking = Booking.objects.get(**booking_lookup(request, booking_id))
         data = request.data
-        if "booking_status" in data:
-            booking.booking_status = data["booking_status"]
-        booking.save()
+        if "booking_status" in data and data["booking_status"] != booking.booking_status:
+            # Status changes must go through cancellation so seats and counters follow
+            if data["booking_status"] != "Cancelled":
+                return Response({"error": "Bookings can only be cancelled"}, status=400)
+            event = Event.objects.only("hall_layout").get(id=booking.event_id)
+            if not cancel_and_release(booking, event):
+                return Response({"error": "Only confirmed bookings can be cancelled"}, status=400)
         return Response({"success": True})
     except DoesNotExist:
-        return Response({"error": "Booking not found"}, status=404)
\ No newline at end of file
+        return Response({"error": "Booking not found"}, status=404)
+
+
+# --- ADMIN VIEWS ---
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def slow_queries(request):
+    """Recent slow Mongo operations, grouped by query shape (``?group=none`` for raw records)"""
+    if getattr(request.user, "role", None) != "admin":
+        return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        limit = min(max(int(request.GET.get("limit", 1000)), 1), MAX_SLOW_QUERIES)
+        min_ms = float(request.GET.get("min_ms", 0))
+    except ValueError:
+        return Response({"error": "limit and min_ms must be numbers"}, status=400)
+
+    filters = {k: request.GET[k] for k in ("view", "collection", "command") if request.GET.get(k)}
+    records = [
+        r for r in read_records(limit)
+        if (r.get("ms") or 0) >= min_ms and all(r.get(k) == v for k, v in filters.items())
+    ]
+    if request.GET.get("group") == "none":
+        return Response(records)
+    return Response(group_by_shape(records))
+
+
+@api_view(["GET", "POST", "DELETE"])
+@permission_classes([IsAuthenticated])
+def profiler(request):
+    """POST starts a sampling session on every worker, GET returns its samples, DELETE stops it.
+
+    POST body: ``seconds``, ``rate`` (share of requests sampled), ``interval_ms``
+    and ``views`` (view function names; all of backend/views.py if empty).
+    GET takes ``?session=`` (default: the latest) and ``?output=collapsed``.
+    """
+    if getattr(request.user, "role", None) != "admin":
+        return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+    conf = profiling.conf()
+    if not conf["ENABLED"]:
+        return Response({"error": "Profiling is disabled on this deployment"}, status=409)
+    if not conf["SHARED_CACHE"]:
+        return Response({"error": "Profiling needs a cache shared by all workers (set REDIS_URL)"}, status=409)
+
+    if request.method == "DELETE":
+        profiling.stop()
+        return Response({"stopped": True})
+
+    if request.method == "POST":
+        data = request.data
+        try:
+            seconds = float(data.get("seconds", 30))
+            rate = float(data.get("rate", 0.1))
+            interval_ms = float(data.get("interval_ms", conf["INTERVAL_MS"]))
+        except (TypeError, ValueError):
+            return Response({"error": "seconds, rate and interval_ms must be numbers"}, status=400)
+        views = data.get("views") or []
+        if not 0 < seconds <= conf["MAX_SECONDS"]:
+            return Response({"error": f"seconds must be between 0 and {conf['MAX_SECONDS']}"}, status=400)
+        if not 0 < rate <= 1:
+            return Response({"error": "rate must be between 0 and 1"}, status=400)
+        if not 1 <= interval_ms <= MAX_PROFILE_INTERVAL_MS:
+            return Response({"error": f"interval_ms must be between 1 and {MAX_PROFILE_INTERVAL_MS}"}, status=400)
+        if not isinstance(views, list):
+            return Response({"error": "views must be a list of view names"}, status=400)
+        session = profiling.start(seconds, rate, interval_ms, views)
+        return Response(session, status=status.HTTP_201_CREATED)
+
+    session_id = request.GET.get("session")
+    if not session_id:
+        last = profiling.last_session()
+        if last is None:
+            return Response({"error": "No profiling session yet"}, status=404)
+        session_id = last["id"]
+    result = profiling.results(session_id)
+    if request.GET.get("output") == "collapsed":
+        return HttpResponse(profiling.collapsed(result["stacks"]), content_type="text/plain; charset=utf-8")
+    return Response({
+        "session": session_id,
+        "workers": result["workers"],
+        "requests": result["requests"],
+        "samples": sum(result["stacks"].values()),
+        "top": profiling.top_functions(result["stacks"]),
+    })
@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from mongoengine import connect
+from corsheaders.defaults import default_headers
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,14 +53,29 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "corsheaders",
+    "backend",
 ]
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("backend.authentication.MongoJWTAuthentication",)
+    "DEFAULT_AUTHENTICATION_CLASSES": ("backend.authentication.MongoJWTAuthentication",),
+    "DEFAULT_THROTTLE_CLASSES": ("backend.throttling.TokenBucketThrottle",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "backend.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+}
+
+# Token buckets per throttle scope (see backend/throttling.py):
+# capacity is the allowed burst, refill_rate the sustained requests per second
+TOKEN_BUCKETS = {
+    "default": {"capacity": 120, "refill_rate": 2.0},
+    "events": {"capacity": 60, "refill_rate": 5.0},
+    "booking": {"capacity": 10, "refill_rate": 0.2},
 }
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "backend.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -68,8 +83,19 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "backend.routing.ReadYourWritesMiddleware",
+    "backend.slowlog.SlowQueryMiddleware",
+    "backend.profiling.ProfilingMiddleware",
 ]
 
+# Brotli/gzip response compression (see backend/middleware.py)
+COMPRESSION = {
+    "MIN_SIZE": 860,  # bytes; smaller responses are not worth compressing
+    "BROTLI_QUALITY": 5,
+    "GZIP_LEVEL": 6,
+    "CACHE_BYTES": 8 * 1024 * 1024,  # compressed GET bodies kept for reuse
+}
+
 
 ROOT_URLCONF = "eventbookingapp.urls"
 
@@ -102,15 +128,102 @@ WSGI_APPLICATION = "eventbookingapp.wsgi.application"
 # }
 
 
-connect(
-    db=os.environ.get("MONGO_DB_NAME"),
-    username=os.environ.get("MONGO_USER"),
-    password=os.environ.get("MONGO_PASSWORD"),
-    host=os.environ.get("MONGO_HOST"),
-    alias="default",
-    ssl=True,
+# Registered (not connected) when the backend app loads; the client and its
+# pool open on first use or in the post-fork warmup (see backend/startup.py)
+MONGODB = {
+    "db": os.environ.get("MONGO_DB_NAME"),
+    "username": os.environ.get("MONGO_USER"),
+    "password": os.environ.get("MONGO_PASSWORD"),
+    "host": os.environ.get("MONGO_HOST"),
+    "ssl": True,
+    # Connections the warmup opens up front, so the first requests don't pay for them
+    "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+}
+
+# mongoengine creates each collection's indexes on its first use in every
+# worker. Deployments set this to 0 and run `manage.py ensure_indexes` instead.
+MONGO_AUTO_CREATE_INDEXES = os.environ.get("MONGO_AUTO_CREATE_INDEXES", "1") == "1"
+
+# Booking writes run as multi-document transactions (needs a replica set);
+# set MONGO_TRANSACTIONS=0 for a standalone development server
+MONGO_TRANSACTIONS = os.environ.get("MONGO_TRANSACTIONS", "1") == "1"
+
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+
+# Shared buckets need a shared cache; otherwise keep them in process
+TOKEN_BUCKET_STORE = (
+    "backend.throttling.CacheBucketStore" if REDIS_URL
+    else "backend.throttling.LocalBucketStore"
 )
 
+# Waiting room for events with an admission_rate (see backend/admission.py)
+ADMISSION_QUEUE = {
+    "BACKEND": (
+        "backend.admission.RedisQueueBackend" if REDIS_URL
+        else "backend.admission.InMemoryQueueBackend"
+    ),
+    "OPTIONS": {"url": REDIS_URL} if REDIS_URL else {},
+    "BURST": 50,  # buyers let straight in when a queue opens
+    "PASS_TTL": 600,  # seconds an admission pass stays valid
+}
+
+
+# Geocoding of event addresses for nearby search (see backend/geocoding.py);
+# e.g. GEOCODER_BACKEND=backend.geocoding.NominatimGeocoder
+GEOCODER = {
+    "BACKEND": os.environ.get("GEOCODER_BACKEND", "backend.geocoding.NullGeocoder"),
+    "OPTIONS": {},
+    "CACHE_SECONDS": 30 * 24 * 60 * 60,
+}
+
+
+# Listings, search and recommendations may read from secondaries at most
+# MAX_STALENESS_SECONDS behind (see backend/routing.py); needs a replica set
+READ_ROUTING = {
+    "ENABLED": os.environ.get("MONGO_SECONDARY_READS", "0") == "1",
+    "MAX_STALENESS_SECONDS": 90,
+    "STICKY_SECONDS": 120,  # a user's reads stay on the primary this long after they write
+}
+
+
+# Change-stream invalidation (see backend/invalidation.py). Run one
+# `manage.py watch_changes` per deployment; workers get its messages on BUS.
+INVALIDATION = {
+    "BUS": "backend.invalidation.RedisBus" if REDIS_URL else "backend.invalidation.LocalBus",
+    "OPTIONS": {"url": REDIS_URL} if REDIS_URL else {},
+    # Authenticated users are cached per worker this long (0 disables)
+    "USER_CACHE_SECONDS": 15 * 60 if REDIS_URL else 0,
+}
+
+
+# Shard keys for `manage.py shard_collections` (see backend/sharding.py).
+# ZONES pins key ranges of range-sharded collections to shards, e.g.
+# [{"name": "eu", "shards": ["shard-eu"], "ranges": [{"collection": ..., "min": {...}, "max": {...}}]}]
+SHARDING = {
+    "COLLECTIONS": {
+        "bookings": {"user_email": "hashed"},
+        "event_bookings": {"event_id": "hashed"},
+        "seat_inventory": {"event_id": "hashed"},
+        "events": {"_id": "hashed"},
+        "related_events": {"event_id": "hashed"},
+        "idempotency_keys": {"user_id": "hashed"},
+    },
+    "ZONES": [],
+}
+
+
+# Cache-Control of public event listings and details (validated with ETags)
+EVENTS_CACHE_CONTROL = {"public": True, "max_age": 30, "stale_while_revalidate": 60}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -157,3 +270,68 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key", "x-admission-pass")
+CORS_EXPOSE_HEADERS = ("retry-after", "idempotent-replayed")
+
+
+# Booking confirmations and cancellations are sent by `manage.py run_jobs`
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "tickets@eventbooking.local")
+
+
+# E-tickets and door check-in (see backend/tickets.py and backend/checkin.py).
+# Keep FALLBACK_KEYS after rotating SIGNING_KEY so issued tickets still scan.
+TICKETS = {
+    "SIGNING_KEY": os.environ.get("TICKET_SIGNING_KEY") or None,
+    "FALLBACK_KEYS": [k for k in os.environ.get("TICKET_SIGNING_FALLBACK_KEYS", "").split(",") if k],
+    # Offline scanners verify check-in snapshots with this key
+    "SNAPSHOT_KEY": os.environ.get("CHECKIN_SNAPSHOT_KEY") or None,
+    "CACHE_SECONDS": 7 * 24 * 60 * 60,
+    # run_jobs renders tickets ahead of the first request into the default
+    # cache; only worth it when the web workers share that cache (Redis)
+    "PRERENDER": bool(REDIS_URL),
+    "SYNC_SECONDS": 5,
+}
+
+
+# Mongo commands slower than THRESHOLD_MS are logged with their query shape
+# and an explain sample (see backend/slowlog.py); set SLOW_QUERY_MS to enable
+SLOW_QUERIES = {
+    "ENABLED": os.environ.get("SLOW_QUERY_MS") is not None,
+    "THRESHOLD_MS": int(os.environ.get("SLOW_QUERY_MS", "100")),
+    "EXPLAIN": True,
+    "EXPLAIN_INTERVAL_SECONDS": 10 * 60,  # per query shape
+    "LOG_FILE": os.environ.get("SLOW_QUERY_LOG", str(BASE_DIR / "slow_queries.log")),
+    "BACKUP_COUNT": 5,
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"message": {"format": "%(message)s"}},
+    "handlers": {
+        "slow_queries": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": SLOW_QUERIES["LOG_FILE"],
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": SLOW_QUERIES["BACKUP_COUNT"],
+            "delay": True,  # the file is created by the first slow query
+            "formatter": "message",
+        },
+    },
+    "loggers": {
+        "backend.slowlog": {"handlers": ["slow_queries"], "level": "WARNING", "propagate": False},
+    },
+}
+
+
+# Sampling profiler sessions started from /api/admin/profile/ (see
+# backend/profiling.py); off unless PROFILING=1
+PROFILING = {
+    "ENABLED": os.environ.get("PROFILING", "0") == "1",
+    # Sessions and samples pass through the default cache, so every worker
+    # has to share it (Redis); with per-process caches the endpoint says 409
+    "SHARED_CACHE": bool(REDIS_URL),
+    "MAX_SECONDS": 300,
+    "INTERVAL_MS": 10,
+}
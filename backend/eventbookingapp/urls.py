@@ -20,31 +20,61 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 from backend.views import (
+    health,
     login_view,
     register_view,
     get_current_user,
     update_current_user,
+    get_feed,
+    favorite_event,
     fetch_events,
     create_booking,
+    book_best_available,
+    event_queue,
     get_user_bookings,
+    cancel_booking,
+    get_booking_tickets,
+    event_check_in,
+    check_in_snapshot,
+    check_in_sync,
     get_reserved_seats,
+    get_event_layout,
+    get_event_prices,
+    related_events,
     create_event,
     upload_file,
     delete_event,
+    slow_queries,
+    profiler,
 )
 
 urlpatterns = [
+    path("api/health/", health),
     path("api/register/", register_view),
     path("api/login/", login_view),
     path("api/me/", get_current_user),
     path("api/me/update/", update_current_user),
+    path("api/me/feed/", get_feed),
+    path("api/me/favorites/<str:event_id>/", favorite_event),
     path("api/events/", fetch_events),
     path("api/events/<str:event_id>/reserved-seats/", get_reserved_seats),
+    path("api/events/<str:event_id>/layout/", get_event_layout),
+    path("api/events/<str:event_id>/prices/", get_event_prices),
+    path("api/events/<str:event_id>/best-available/", book_best_available),
+    path("api/events/<str:event_id>/queue/", event_queue),
+    path("api/events/<str:event_id>/related/", related_events),
+    path("api/events/<str:event_id>/check-in/", event_check_in),
+    path("api/events/<str:event_id>/check-in/snapshot/", check_in_snapshot),
+    path("api/events/<str:event_id>/check-in/sync/", check_in_sync),
     path("api/events/create/", create_event),
     path("api/events/delete/<str:event_id>/", delete_event, name="delete_event"),
     path("api/bookings/", create_booking),
     path("api/bookings/get/", get_user_bookings),
+    path("api/bookings/<str:booking_id>/cancel/", cancel_booking),
+    path("api/bookings/<str:booking_id>/tickets/", get_booking_tickets),
     path("api/upload/", upload_file, name="upload-file"),
+    path("api/admin/slow-queries/", slow_queries),
+    path("api/admin/profile/", profiler),
 ]
 
 if settings.DEBUG:
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eventbookingapp.settings')
 
 application = get_wsgi_application()
+
+# Load the views now rather than on the first request; under gunicorn's
+# preload_app this happens once, before the workers fork
+from backend.startup import prepare  # noqa: E402
+
+prepare()
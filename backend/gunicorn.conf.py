@@ -0,0 +1,18 @@
+"""gunicorn settings: load the app once in the master, warm up each worker after fork.
+
+    gunicorn eventbookingapp.wsgi --config gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Imports happen in the master; workers fork with them already loaded
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Mongo clients and Redis threads must not cross a fork: open them in the worker
+    from backend.startup import warm_up
+
+    warm_up()
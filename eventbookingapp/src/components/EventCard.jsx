@@ -30,14 +30,14 @@ export default function EventCard({ event, onFavoriteChange }) {
         const data = await res.json();
         setUser(data);
 
-        setIsFavorite(data.favorite_events?.includes(event._id) || false);
+        setIsFavorite(data.favorite_events?.includes(event.id) || false);
       } catch {
         setUser(null);
       }
     };
 
     fetchUser();
-  }, [event._id]);
+  }, [event.id]);
 
   const toggleFavorite = async (e) => {
     e.preventDefault();
@@ -53,19 +53,13 @@ export default function EventCard({ event, onFavoriteChange }) {
     setIsTogglingFavorite(true);
 
     try {
-      const currentFavorites = user?.favorite_events || [];
-      const updatedFavorites = isFavorite
-        ? currentFavorites.filter((id) => id !== event._id)
-        : [...currentFavorites, event._id];
-
-      const res = await fetch("http://127.0.0.1:8000/api/me/update/", {
-        method: "PATCH",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-        body: JSON.stringify({ favorite_events: updatedFavorites }),
-      });
+      const res = await fetch(
+        `http://127.0.0.1:8000/api/me/favorites/${event.id}/`,
+        {
+          method: isFavorite ? "DELETE" : "POST",
+          headers: { Authorization: `Bearer ${token}` },
+        }
+      );
 
       if (!res.ok) throw new Error("Failed to update favorites");
 
@@ -1,16 +1,32 @@
 import React from "react";
 
-const ROWS = 8;
-const COLS = 10;
+const DEFAULT_ROWS = 8;
+const DEFAULT_COLS = 10;
+
+const DEFAULT_LAYOUT = {
+  sections: [
+    {
+      name: "Main",
+      rows: Array.from({ length: DEFAULT_ROWS }).map((_, i) => ({
+        row: i + 1,
+        label: String(i + 1),
+        seats: DEFAULT_COLS,
+        blocked: [],
+      })),
+    },
+  ],
+};
 
 export default function HallMatrix({
+  layout,
   reservedSeats = [],
   selectedSeats = [],
   setSelectedSeats,
 }) {
+  const hall = layout?.sections?.length ? layout : DEFAULT_LAYOUT;
+  const reservedKeys = new Set(reservedSeats.map((s) => `${s.row}:${s.column}`));
 
-  const isReserved = (row, col) =>
-    reservedSeats.some(s => s.row === row && s.column === col);
+  const isReserved = (row, col) => reservedKeys.has(`${row}:${col}`);
 
   const isSelected = (row, col) =>
     selectedSeats.some(s => s.row === row && s.column === col);
@@ -28,34 +44,45 @@ export default function HallMatrix({
   };
 
   return (
-    <div className="space-y-2 mt-8">
-      {Array.from({ length: ROWS }).map((_, rowIndex) => (
-        <div key={rowIndex} className="flex gap-2 justify-center">
-          {Array.from({ length: COLS }).map((_, colIndex) => {
-
-            const row = rowIndex + 1;
-            const col = colIndex + 1;
-
-            const reserved = isReserved(row, col);
-            const selected = isSelected(row, col);
-
-            return (
-              <div
-                key={colIndex}
-                onClick={() => toggleSeat(row, col)}
-                className={`
-                  w-8 h-8 rounded cursor-pointer transition
-                  ${
-                    reserved
-                      ? "bg-gray-600 cursor-not-allowed"
-                      : selected
-                      ? "bg-green-500"
-                      : "bg-[#c89295] hover:bg-[#ea2a33]"
-                  }
-                `}
-              />
-            );
-          })}
+    <div className="space-y-6 mt-8 overflow-x-auto">
+      {hall.sections.map((section) => (
+        <div key={section.name} className="space-y-2">
+          {hall.sections.length > 1 && (
+            <p className="text-center text-sm text-white/60">{section.name}</p>
+          )}
+          {section.rows.map(({ row, label, seats, blocked = [] }) => (
+            <div key={row} className="flex gap-2 justify-center items-center">
+              <span className="w-6 text-xs text-white/40 text-right">{label}</span>
+              {Array.from({ length: seats }).map((_, colIndex) => {
+
+                const col = colIndex + 1;
+
+                if (blocked.includes(col)) {
+                  return <div key={colIndex} className="w-8 h-8" />;
+                }
+
+                const reserved = isReserved(row, col);
+                const selected = isSelected(row, col);
+
+                return (
+                  <div
+                    key={colIndex}
+                    onClick={() => toggleSeat(row, col)}
+                    className={`
+                      w-8 h-8 rounded cursor-pointer transition
+                      ${
+                        reserved
+                          ? "bg-gray-600 cursor-not-allowed"
+                          : selected
+                          ? "bg-green-500"
+                          : "bg-[#c89295] hover:bg-[#ea2a33]"
+                      }
+                    `}
+                  />
+                );
+              })}
+            </div>
+          ))}
         </div>
       ))}
     </div>
@@ -23,20 +23,66 @@ export default function EventDetails() {
 
   const [reservedSeats, setReservedSeats] = useState([]);
   const [selectedSeats, setSelectedSeats] = useState([]);
+  const [admissionPass, setAdmissionPass] = useState(null);
+  const [queuePosition, setQueuePosition] = useState(null);
   const token = localStorage.getItem("token");
 
+  // Events with a waiting room answer 403 until the buyer is admitted:
+  // join the queue, poll as Retry-After asks, and keep the pass it hands out
+  const waitForAdmission = async () => {
+    const queueUrl = `http://127.0.0.1:8000/api/events/${eventId}/queue/`;
+    const headers = { Authorization: `Bearer ${token}` };
+    let res = await fetch(queueUrl, { method: "POST", headers });
+    let data = await res.json();
+    while (res.ok && !data.admitted) {
+      setQueuePosition(data.position);
+      const wait = Number(res.headers.get("Retry-After")) || 5;
+      await new Promise((resolve) => setTimeout(resolve, wait * 1000));
+      res = await fetch(`${queueUrl}?token=${encodeURIComponent(data.token)}`, {
+        headers,
+      });
+      data = await res.json();
+    }
+    setQueuePosition(null);
+    if (!res.ok) throw new Error(data.error || "Failed to join the queue");
+    const pass = data.pass || null;
+    setAdmissionPass(pass);
+    return pass;
+  };
+
+  const authHeaders = (pass) => ({
+    Authorization: `Bearer ${token}`,
+    ...(pass ? { "X-Admission-Pass": pass } : {}),
+  });
+
+  // Retries a request once with a fresh pass if the waiting room turned it away
+  const fetchAdmitted = async (url, options = {}) => {
+    let res = await fetch(url, {
+      ...options,
+      headers: { ...options.headers, ...authHeaders(admissionPass) },
+    });
+    if (res.status === 403) {
+      const data = await res.clone().json();
+      if (data.queue) {
+        const pass = await waitForAdmission();
+        res = await fetch(url, {
+          ...options,
+          headers: { ...options.headers, ...authHeaders(pass) },
+        });
+      }
+    }
+    return res;
+  };
+
   useEffect(() => {
     if (!eventId || !token) return;
 
     const fetchReservedSeats = async () => {
       try {
-        const res = await fetch(
-          `http://127.0.0.1:8000/api/events/${eventId}/reserved-seats/`,
-          {
-            headers: { Authorization: `Bearer ${token}` },
-          }
+        const res = await fetchAdmitted(
+          `http://127.0.0.1:8000/api/events/${eventId}/reserved-seats/`
         );
-        console.log(res);
+        if (!res.ok) return;
         const data = await res.json();
         setReservedSeats(data);
       } catch (err) {
@@ -77,15 +123,47 @@ export default function EventDetails() {
     enabled: !!eventId,
   });
 
+  const { data: hallLayout } = useQuery({
+    queryKey: ["hallLayout", eventId],
+    queryFn: async () => {
+      const res = await fetch(
+        `http://127.0.0.1:8000/api/events/${eventId}/layout/`
+      );
+      if (!res.ok) return null;
+      return res.json();
+    },
+    enabled: !!eventId,
+  });
+
+  const { data: prices, refetch: refetchPrices } = useQuery({
+    queryKey: ["prices", eventId],
+    queryFn: async () => {
+      const res = await fetch(
+        `http://127.0.0.1:8000/api/events/${eventId}/prices/`
+      );
+      if (!res.ok) return null;
+      return res.json();
+    },
+    enabled: !!eventId,
+  });
+
+  // The server prices the booking; this only has to show the same total
+  const seatPrice = (seat) => prices?.rows?.[seat.row - 1] ?? event.price;
+  const totalPrice =
+    event && event.ticket_type !== "Free"
+      ? Math.round(
+          selectedSeats.reduce((sum, seat) => sum + seatPrice(seat), 0) * 100
+        ) / 100
+      : 0;
+
   const { data: relatedEvents = [] } = useQuery({
-    queryKey: ["relatedEvents", event?.category],
+    queryKey: ["relatedEvents", eventId],
     queryFn: async () => {
-      if (!event) return [];
       const res = await fetch(
-        `http://127.0.0.1:8000/api/events/?status=Published&category=${event.category}`
+        `http://127.0.0.1:8000/api/events/${eventId}/related/?limit=4`
       );
-      const data = await res.json();
-      return data.filter((e) => e._id !== event._id).slice(0, 4);
+      if (!res.ok) return [];
+      return res.json();
     },
     enabled: !!event,
   });
@@ -96,19 +174,18 @@ export default function EventDetails() {
       return;
     }
     try {
-      const newFavorites = isFavorite
-        ? user.favorite_events.filter((id) => id !== event._id)
-        : [...(user.favorite_events || []), event._id];
-
-      await fetch("http://127.0.0.1:8000/api/me/", {
-        method: "PUT",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-        body: JSON.stringify({ favorite_events: newFavorites }),
-      });
+      const res = await fetch(
+        `http://127.0.0.1:8000/api/me/favorites/${eventId}/`,
+        {
+          method: isFavorite ? "DELETE" : "POST",
+          headers: { Authorization: `Bearer ${token}` },
+        }
+      );
+      if (!res.ok) throw new Error("Failed to update favorites");
 
+      const newFavorites = isFavorite
+        ? (user.favorite_events || []).filter((id) => id !== eventId)
+        : [...(user.favorite_events || []), eventId];
       setIsFavorite(!isFavorite);
       setUser((prev) => ({ ...prev, favorite_events: newFavorites }));
     } catch (err) {
@@ -122,12 +199,14 @@ export default function EventDetails() {
       return;
     }
     setIsBooking(true);
+    // Lets the server recognise a resubmitted booking and book it only once
+    const idempotencyKey = crypto.randomUUID();
     try {
-      await fetch("http://127.0.0.1:8000/api/bookings/", {
+      const res = await fetchAdmitted("http://127.0.0.1:8000/api/bookings/", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
+          "Idempotency-Key": idempotencyKey,
         },
         body: JSON.stringify({
           event_id: event.id,
@@ -139,12 +218,20 @@ export default function EventDetails() {
           event_time: event.time,
           event_location: `${event.location}, ${event.city}`,
           num_tickets: numTickets,
-          total_price:
-            event.ticket_type === "Free"
-              ? 0
-              : selectedSeats.length * event.price,
+          total_price: totalPrice,
         }),
       });
+      if (!res.ok) {
+        const data = await res.json();
+        if (res.status === 409 && data.total_price !== undefined) {
+          refetchPrices();
+          alert(`Prices have changed, the total is now $${data.total_price.toFixed(2)}.`);
+        } else {
+          alert(data.error || "Failed to book event.");
+        }
+        setIsBooking(false);
+        return;
+      }
 
       alert("Booking confirmed!");
       queryClient.invalidateQueries(["event", eventId]);
@@ -275,6 +362,7 @@ export default function EventDetails() {
                 </div>
               )}
               <HallMatrix
+                layout={hallLayout}
                 reservedSeats={reservedSeats}
                 selectedSeats={selectedSeats}
                 setSelectedSeats={setSelectedSeats}
@@ -289,12 +377,23 @@ export default function EventDetails() {
             <CardContent className="p-8 space-y-6">
               <p className="text-white/60">Price per ticket</p>
               <p className="text-4xl font-bold text-[#ea2a33]">
-                {event.ticket_type === "Free" ? "Free" : `$${event.price}`}
+                {event.ticket_type === "Free"
+                  ? "Free"
+                  : `$${prices?.default ?? event.price}`}
               </p>
               {event.ticket_type !== "Free" && (
                 <>
+                  {prices && Object.keys(prices.tiers).length > 0 && (
+                    <div className="text-sm text-white/60">
+                      {Object.entries(prices.tiers).map(([tier, price]) => (
+                        <p key={tier}>
+                          {tier}: ${price.toFixed(2)}
+                        </p>
+                      ))}
+                    </div>
+                  )}
                   <p className="text-sm text-white/60">
-                    Total: ${(event.price * selectedSeats.length).toFixed(2)}
+                    Total: ${totalPrice.toFixed(2)}
                   </p>
                 </>
               )}
@@ -303,8 +402,18 @@ export default function EventDetails() {
                 disabled={isBooking}
                 className="w-full bg-[#ea2a33] hover:bg-[#ea2a33]/90 text-white text-lg py-6 accent-glow"
               >
-                {isBooking ? "Processing..." : "Book Now"}
+                {queuePosition !== null
+                  ? `In queue: #${queuePosition}`
+                  : isBooking
+                  ? "Processing..."
+                  : "Book Now"}
               </Button>
+              {queuePosition !== null && (
+                <p className="text-sm text-white/60">
+                  This event has a waiting room. Keep this page open, you
+                  will be let in automatically.
+                </p>
+              )}
               <div className="pt-4 border-t border-white/10">
                 <div className="flex justify-between text-sm text-white/60">
                   <span>Attending</span>
@@ -330,11 +439,11 @@ export default function EventDetails() {
       {relatedEvents.length > 0 && (
         <div className="mt-20">
           <h2 className="text-3xl font-bold text-white mb-8">
-            More {event.category} Events
+            You Might Also Like
           </h2>
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
             {relatedEvents.map((relatedEvent) => (
-              <EventCard key={relatedEvent._id} event={relatedEvent} />
+              <EventCard key={relatedEvent.id} event={relatedEvent} />
             ))}
           </div>
         </div>